@@ -4,39 +4,26 @@ import pandas as pd
 import streamlit as st
 from utils import *
 import os
-# chatbot libraries
-import requests
-from bs4 import BeautifulSoup
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.prompts import PromptTemplate
-from langchain.chains import LLMChain
-from langchain_community.tools import DuckDuckGoSearchResults
-from langchain.prompts import PromptTemplate
-from langchain.chains import LLMChain
-from langchain.agents import initialize_agent, AgentType
-from langchain_community.tools import ShellTool
-from langchain.agents import load_tools
+import time
+# the chatbot libraries (langchain and friends) are imported lazily in get_agent()
 GOOGLE_API_KEY = "Google API key"
-llm = ChatGoogleGenerativeAI(model="gemini-pro", google_api_key=GOOGLE_API_KEY)
-os.environ['SERPAPI_API_KEY'] ='SERAPAPI API key'
-tools = load_tools(["serpapi","llm-math"], llm=llm)
-
-# here we just make the agent
-global agent
-agent = initialize_agent(tools, llm, agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION, verbose=True)
+SERPAPI_API_KEY = 'SERAPAPI API key'
 
 
 # ---------------------------------------------- Data Operations ---------------------------------------------
 def Data_ops_page():
     # Connect to SQLite database
-    conn = create_connection('admin.db')
+    conn = create_connection()
 
     # Sidebar for operations
     st.sidebar.title("Database Operations")
-    operation = st.sidebar.selectbox("Choose an operation", ["Add Row", "Edit Row", "Delete Row"])
+    operation = st.sidebar.selectbox("Choose an operation", ["Add Row", "Edit Row", "Delete Row", "Bulk Edit"])
 
     # Get table names
     table_names = get_table_names_dataops(conn)
+    if not table_names:
+        st.info("This database has no tables yet. Create one on the Table Operations page or import a file.")
+        return
     table_name = st.sidebar.selectbox("Select Table", table_names)
 
     if operation == "Add Row":
@@ -62,14 +49,13 @@ def Data_ops_page():
 
     elif operation == "Edit Row":
         st.subheader(f"Edit a row in {table_name}")
-        data = fetch_table_data(conn, table_name)
-        
-        # Use a select box to choose a row to edit
-        row_to_edit = st.selectbox("Select row to edit", data.index)
+        located = Row_locator(conn, table_name, 'edit')
+        if located is None:
+            return
+        key_columns, key_values, original_row = located
         
         # Create a form for editing the selected row
         form = st.form(key='edit_form')
-        original_row = data.loc[row_to_edit]
         edited_inputs = {}
         
         columns = get_columns_and_types(conn, table_name)
@@ -84,27 +70,107 @@ def Data_ops_page():
         
         submit_button = form.form_submit_button("Save Changes")
         if submit_button:
-            # Create a list to hold the new values, using original if the input is empty
-            new_values = [
-                edited_inputs[col] if edited_inputs[col] else original_row[col]
-                for col in original_row.index
-            ]
-            update_query = f"UPDATE {table_name} SET {', '.join([f'{col} = ?' for col in data.columns])} WHERE rowid = ?"
-            execute_query(conn, update_query, (*new_values, row_to_edit + 1))  # rowid is 1-based
+            # Keep the original value wherever the input was left empty
+            new_values = {
+                col: edited_inputs[col] if edited_inputs[col] else original_row[col]
+                for col in edited_inputs
+            }
+            update_row(conn, table_name, key_columns, key_values, new_values)
             st.success("Row updated successfully!")
 
     elif operation == "Delete Row":
         st.subheader(f"Delete a row from {table_name}")
-        data = fetch_table_data(conn, table_name)
-        row_to_delete = st.selectbox("Select row to delete", data.index)
+        located = Row_locator(conn, table_name, 'delete')
+        if located is None:
+            return
+        key_columns, key_values, _ = located
         
         if st.button("Delete Row"):
-            delete_query = f"DELETE FROM {table_name} WHERE rowid = ?"
-            execute_query(conn, delete_query, (row_to_delete + 1 ,))  # rowid is 1-based
+            delete_row(conn, table_name, key_columns, key_values)
             st.success("Row deleted successfully!")
 
-    # Close the database connection
-    conn.close()
+    elif operation == "Bulk Edit":
+        st.subheader(f"Edit rows of {table_name} in a grid")
+        Bulk_edit(conn, table_name)
+
+# Grid editing of one page of rows; all inserts, updates and deletes are committed together in one transaction
+def Bulk_edit(conn, table_name):
+    key_columns = get_page_key(conn, table_name)
+    page_size = st.sidebar.select_slider("Rows per page", [25, 50, 100, 250, 500, 1000], value=100, key='bulk_page_size')
+
+    # The loaded page is kept as a snapshot: edits are diffed against it and it is what conflicts are checked against
+    snapshot = st.session_state.get('bulk_snapshot')
+    previous, following, reload = st.columns(3)
+    go_previous = previous.button("Previous page")
+    go_next = following.button("Next page")
+    go_reload = reload.button("Reload (discard changes)")
+    request = None
+    if snapshot is None or snapshot['table'] != table_name or snapshot['page_size'] != page_size:
+        request = ('first', None)
+    elif go_previous and snapshot['keys']:
+        request = ('prev', snapshot['keys'][0])
+    elif go_next and snapshot['keys']:
+        request = ('next', snapshot['keys'][-1])
+    elif go_reload:
+        request = ('at', snapshot['keys'][0] if snapshot['keys'] else None)
+    if request is not None:
+        keys, data = fetch_page_with_keys(conn, table_name, key_columns, request[1], page_size, request[0])
+        if not keys and request[0] in ('next', 'prev') and snapshot is not None:
+            st.info("No more rows in that direction.")
+        else:
+            version = snapshot['version'] + 1 if snapshot else 0
+            snapshot = {'table': table_name, 'page_size': page_size, 'keys': keys, 'data': data, 'version': version}
+            st.session_state.bulk_snapshot = snapshot
+
+    # The _row column ties every grid row back to its key; added rows leave it empty
+    grid = snapshot['data'].copy()
+    grid.insert(0, '_row', range(len(grid)))
+    edited = st.data_editor(grid, num_rows="dynamic", disabled=['_row'], hide_index=True, key=f"bulk_editor_{snapshot['version']}")
+
+    changes = diff_page_edits(snapshot['keys'], snapshot['data'], edited)
+    st.caption(f"{len(changes['inserted'])} inserted, {len(changes['updated'])} updated and {len(changes['deleted'])} deleted row(s) pending.")
+    if st.button("Commit changes"):
+        if not any(changes.values()):
+            st.info("There are no changes to commit.")
+            return
+        try:
+            applied = apply_page_edits(conn, table_name, key_columns, changes)
+        except EditConflictError as e:
+            st.error(f"Nothing was saved: {e} Reload the page and redo your edits.")
+            return
+        # Reload the page so the grid shows what is in the database now
+        snapshot['table'] = None
+        st.session_state.bulk_snapshot = snapshot
+        st.success(f"Committed {applied['inserted']} inserted, {applied['updated']} updated and {applied['deleted']} deleted row(s) in one transaction.")
+
+# Finds the row to edit/delete through the rowid/primary key or a column search, without reading the whole table
+# Returns (key columns, key values, row) for the selected row, or None while nothing is selected.
+def Row_locator(conn, table_name, key_prefix):
+    key_columns = get_page_key(conn, table_name)
+    columns = get_columns_and_types(conn, table_name)['name'].tolist()
+    affinities = get_column_affinities(conn, table_name)
+
+    search_by = st.radio("Find the row by", [f"Key ({', '.join(key_columns)})", "Column value"], horizontal=True, key=f"{key_prefix}_search_by")
+    if search_by == "Column value":
+        search_column = st.selectbox("Column", columns, key=f"{key_prefix}_column")
+        match = st.radio("Match", ["starts with", "equals"], horizontal=True, key=f"{key_prefix}_match")
+        typed = st.text_input("Value", key=f"{key_prefix}_value")
+        if not typed:
+            return None
+        value = typed if match == "starts with" else parse_key_value(typed, affinities.get(search_column))
+        keys, rows = search_rows(conn, table_name, key_columns, search_column, value, match)
+    else:
+        typed = st.text_input(f"{', '.join(key_columns)} (separate values with commas)", key=f"{key_prefix}_key")
+        if not typed:
+            return None
+        keys, rows = find_rows_by_key(conn, table_name, key_columns, parse_key_values(typed.split(','), key_columns, affinities))
+
+    if rows.empty:
+        st.info("No matching rows.")
+        return None
+    st.dataframe(rows)
+    choice = st.selectbox("Select row", range(len(keys)), format_func=lambda i: ", ".join(str(v) for v in keys[i]), key=f"{key_prefix}_row")
+    return key_columns, keys[choice], rows.iloc[choice]
 
 
 # ---------------------------------------------- Table Operations --------------------------------------------
@@ -178,21 +244,533 @@ def Table_ops_page():
         col_name = st.text_input("Column Name to Remove")
         if st.button("Remove Column"):
             if table_name and col_name:
-                remove_column(table_name, col_name)
-                st.success(f"Column '{col_name}' removed from table '{table_name}'.")
+                # Rebuilding a big table takes a while, so it runs as a background job (see the Jobs panel)
+                def remove_column_job(job):
+                    dropped = remove_column(table_name, col_name, conn=job.conn, progress=job.tick)
+                    job.message = f"Column '{col_name}' removed from '{table_name}'."
+                    if dropped:
+                        job.message += f" Dropped {', '.join(dropped)}, which used it."
+
+                submit_job(f"Remove column '{col_name}' from '{table_name}'", remove_column_job)
+                st.info(f"Removing column '{col_name}' from table '{table_name}' in the background.")
             else:
                 st.error("Please provide valid table name and column name.")
 
 
+# --------------------------------------------- Column Profiling ---------------------------------------------
+
+def Profiling_page():
+    st.title("Column Profiling")
+    conn = create_connection()
+
+    table_names = get_table_names_dataops(conn)
+    if not table_names:
+        st.info("This database has no tables yet. Create one on the Table Operations page or import a file.")
+        return
+    table_name = st.sidebar.selectbox("Select Table", table_names)
+    if not table_name:
+        st.info("The database has no tables yet.")
+        return
+
+    # Large tables are sampled and use approximate distinct counts unless asked otherwise
+    estimated_rows = approximate_row_count(conn, table_name)
+    large = estimated_rows > PROFILE_SAMPLE_THRESHOLD
+    sample_rows = None
+    if st.sidebar.checkbox("Sample rows", value=large):
+        sample_rows = int(st.sidebar.number_input("Sample size", min_value=1000, value=PROFILE_SAMPLE_ROWS, step=10000))
+    approximate = st.sidebar.checkbox("Approximate distinct counts", value=large)
+    refresh = st.sidebar.button("Recompute")
+
+    with st.spinner("Profiling..."):
+        profile = profile_table(conn, table_name, sample_rows, approximate, refresh=refresh)
+    source = f"a sample of {profile['rows']:,} of about {estimated_rows:,} rows" if profile['sampled'] else f"{profile['rows']:,} rows"
+    st.caption(f"Profile of {source}, computed in {profile['seconds']:.2f}s"
+               + (" (cached until the database changes)" if profile['cached'] else "")
+               + (", distinct counts are approximate" if approximate else ""))
+    st.dataframe(profile['columns'])
+
+    # Top values and histogram of one column
+    column_name = st.selectbox("Column details", profile['columns']['column'])
+    if column_name:
+        details = profile_column(conn, table_name, column_name, sample_rows, refresh=refresh)
+        st.subheader("Top values")
+        st.dataframe(details['top_values'])
+        if details['histogram'] is not None:
+            st.subheader("Histogram")
+            st.bar_chart(details['histogram'].set_index('from')['count'])
+
+
+# --------------------------------------------- Index Management ---------------------------------------------
+
+def Index_management_page():
+    st.title("Index Management")
+    conn = create_connection()
+
+    table_names = get_table_names_dataops(conn)
+    if not table_names:
+        st.info("This database has no tables yet. Create one on the Table Operations page or import a file.")
+        return
+    table_name = st.sidebar.selectbox("Select Table", table_names)
+    if not table_name:
+        st.info("The database has no tables yet.")
+        return
+    columns = get_columns_and_types(conn, table_name)['name'].tolist()
+
+    # Existing indexes
+    st.subheader(f"Indexes on {table_name}")
+    indexes = list_indexes(conn, table_name)
+    st.dataframe(indexes)
+
+    # Create an index
+    st.subheader("Create Index")
+    form = st.form(key='create_index_form')
+    index_columns = form.multiselect("Columns", columns)
+    expressions = form.text_input("Expressions (optional, comma separated)", placeholder="lower(name)")
+    unique = form.checkbox("Unique")
+    where = form.text_input("Partial index condition (optional)", placeholder="price IS NOT NULL")
+    index_name = form.text_input("Index name (optional)")
+    if form.form_submit_button("Create Index"):
+        terms = index_columns + [expr.strip() for expr in expressions.split(',') if expr.strip()]
+        if not terms:
+            st.error("Please pick at least one column or expression.")
+        else:
+            name = index_name or "idx_" + "_".join([table_name, *index_columns]) + ("_expr" if len(terms) > len(index_columns) else "")
+            try:
+                create_index(conn, name, table_name, terms, unique=unique, where=where or None)
+                st.success(f"Index '{name}' created.")
+            except sqlite3.Error as e:
+                st.error(f"Error creating index: {e}")
+
+    # Drop an index (automatic indexes belong to PRIMARY KEY/UNIQUE constraints and can't be dropped)
+    st.subheader("Drop Index")
+    droppable = [name for name, origin in zip(indexes['name'], indexes['origin']) if origin == 'c']
+    index_to_drop = st.selectbox("Index", droppable)
+    if st.button("Drop Index") and index_to_drop:
+        drop_index(conn, index_to_drop)
+        st.success(f"Index '{index_to_drop}' dropped.")
+
+    # Query plans
+    st.subheader("Query Plans")
+    queries = observed_queries(get_database_file(conn))
+    if queries:
+        choice = st.selectbox("Queries run by the app", range(len(queries)), format_func=lambda i: f"{queries[i]['query']}  (x{queries[i]['count']})")
+        st.dataframe(explain_query_plan(conn, queries[choice]['query'], queries[choice]['params']))
+    custom_query = st.text_area("Explain a query", placeholder=f"SELECT * FROM {table_name} WHERE ...")
+    if custom_query:
+        try:
+            st.dataframe(explain_query_plan(conn, custom_query))
+        except sqlite3.Error as e:
+            st.error(f"Error explaining query: {e}")
+
+    # Index advisor
+    st.subheader("Suggested Indexes")
+    suggestions = suggest_indexes(conn)
+    if not suggestions:
+        st.write("No full-table scans seen in the lookups the app has run so far.")
+    for i, suggestion in enumerate(suggestions):
+        st.code(suggestion['statement'], language='sql')
+        st.caption(f"Seen {suggestion['count']} time(s): {suggestion['query']}")
+        if st.button("Create this index", key=f"suggestion_{i}"):
+            create_index(conn, suggestion['index_name'], suggestion['table'], suggestion['columns'])
+            st.success(f"Index '{suggestion['index_name']}' created.")
+
+
+# --------------------------------------------- Performance ---------------------------------------------------
+
+def Performance_page():
+    st.title("Performance")
+    records = get_query_log()
+    st.caption(f"{len(records)} statements logged, the last {QUERY_LOG_SIZE} are kept.")
+
+    # Narrow the log down to some pages
+    pages = st.sidebar.multiselect("Pages", sorted({r['page'] for r in records if r['page']}))
+    if pages:
+        records = [r for r in records if r['page'] in pages]
+
+    st.subheader("Latency per statement")
+    st.dataframe(query_stats(records))
+
+    st.subheader("Slow query log")
+    threshold = st.number_input("Slow query threshold (ms)", min_value=0.0, value=SLOW_QUERY_MS, step=10.0)
+    slow = pd.DataFrame(slow_queries(threshold, records), columns=['time', 'duration_ms', 'rows_returned', 'rows_affected', 'page', 'sql'])
+    slow['time'] = pd.to_datetime(slow['time'], unit='s')
+    st.dataframe(slow)
+
+    st.download_button("Export log as JSON lines", export_query_log_jsonl(records), "query_log.jsonl", "application/json")
+    if st.button("Clear log"):
+        clear_query_log()
+        st.rerun()
+
+
+# --------------------------------------------- SQL Console -------------------------------------------------
+
+def Sql_console_page():
+    st.title("SQL Console")
+    st.caption("Other databases of the workspace are attached under their alias.")
+
+    # Limits enforced by the query governor
+    timeout = st.sidebar.number_input("Time budget (seconds)", min_value=0.5, value=QUERY_TIME_BUDGET, step=1.0)
+    max_rows = int(st.sidebar.number_input("Max rows", min_value=1, value=QUERY_MAX_ROWS, step=1000))
+    read_only = st.sidebar.checkbox("Read-only", value=True)
+
+    query = st.text_area("SQL", height=150, placeholder="SELECT * FROM ...")
+    if st.button("Run") and query.strip():
+        # Queries run on a worker thread, so the page stays responsive and can cancel them
+        def console_job(job):
+            attach_workspace(job.conn)
+            result = {"frames": [], "stats": {}}
+            job.result = result
+            for frame in run_governed(job.conn, query, timeout=timeout, max_rows=max_rows, read_only=read_only,
+                                      cancel=lambda: job.cancel_requested, stats=result["stats"]):
+                result["frames"].append(frame)
+                job.message = f"{result['stats']['rows']:,} rows so far"
+            return result
+
+        st.session_state.console_job = submit_job("SQL console query", console_job, exclusive=not read_only).id
+
+    job = get_job(st.session_state.get('console_job'))
+    if job is None:
+        # Never started, or cleared from the Jobs panel
+        st.session_state.pop('console_job', None)
+    else:
+        st.fragment(Sql_console_results, run_every=0.5 if job.active else None)(job.id, job.active)
+
+# Shows the rows of the console's query as they arrive (refreshed every half second while it runs)
+def Sql_console_results(job_id, was_active):
+    job = get_job(job_id)
+    if job is None:
+        # Cleared from the Jobs panel since the last refresh
+        st.session_state.pop('console_job', None)
+        if was_active:
+            st.rerun()
+        return
+    result = job.result or {"frames": [], "stats": {}}
+    stats = result["stats"]
+    if job.active:
+        elapsed = time.time() - (job.started or job.created)
+        st.caption(f"Running for {elapsed:.1f}s, {stats.get('rows', 0):,} rows so far")
+        if st.button("Cancel query"):
+            job.cancel()
+    elif was_active:
+        # Stop refreshing
+        st.rerun()
+    elif job.status == 'done':
+        if stats.get('rows_affected') is not None:
+            st.success(f"{stats['rows_affected']:,} rows affected in {stats['seconds']:.2f}s.")
+        else:
+            st.caption(f"{stats['rows']:,} rows in {stats['seconds']:.2f}s"
+                       + (", more rows were left out by the row limit" if stats['truncated'] else ""))
+    elif job.status == 'cancelled':
+        st.warning("The query was cancelled.")
+    else:
+        st.error(job.error)
+
+    frames = list(result["frames"])
+    if frames:
+        st.dataframe(pd.concat(frames, ignore_index=True))
+    elif stats.get('columns'):
+        st.dataframe(pd.DataFrame(columns=stats['columns']))
+
+
+# --------------------------------------------- Maintenance -------------------------------------------------
+
+def Maintenance_page():
+    st.title("Storage Maintenance")
+    conn = create_connection()
+    db_file = get_active_database()
+
+    summary = storage_summary(conn)
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("File size", f"{summary['file_bytes'] / 1e6:.2f} MB")
+    col2.metric("WAL size", f"{summary['wal_bytes'] / 1e6:.2f} MB")
+    col3.metric("Free pages", f"{summary['freelist_count']:,}", f"{100 * summary['freelist_count'] / max(summary['page_count'], 1):.1f}% of the file", delta_color="off")
+    col4.metric("Auto vacuum", summary['auto_vacuum'])
+
+    # Per-table and per-index sizes read every page of the file, so they are computed by a background job
+    st.subheader("Size per table and index")
+    if st.button("Analyze storage"):
+        st.session_state.storage_job = submit_job("Analyze storage", lambda job: storage_by_object(job.conn, progress=job.tick)).id
+    storage_job = get_job(st.session_state.get('storage_job'))
+    if storage_job is not None and storage_job.status == 'done' and storage_job.db_file == db_file:
+        st.caption(f"Measured {time.strftime('%H:%M:%S', time.localtime(storage_job.finished))}")
+        st.dataframe(storage_job.result)
+    elif storage_job is not None and storage_job.active:
+        st.caption("Measuring...")
+
+    # Maintenance operations, also run as background jobs (see the Jobs panel)
+    st.subheader("Maintenance")
+    operation = st.selectbox("Operation", list(MAINTENANCE_OPERATIONS), format_func=MAINTENANCE_OPERATIONS.get)
+    target = pages = None
+    if operation == 'vacuum_into':
+        target = st.text_input("Output file", placeholder="backup.db")
+    elif operation == 'incremental_vacuum':
+        pages = st.number_input("Pages to free (0 frees all)", min_value=0, value=0)
+    if st.button("Run"):
+        def maintenance_job(job):
+            result = run_maintenance(job.conn, operation, target=target, pages=pages, progress=job.tick)
+            job.message = f"{result['before']['file_bytes'] / 1e6:.2f} MB -> {result['after']['file_bytes'] / 1e6:.2f} MB in {result['seconds']:.2f}s"
+            return result
+
+        job = submit_job(MAINTENANCE_OPERATIONS[operation].split(" (")[0], maintenance_job)
+        st.session_state.setdefault('maintenance_jobs', []).append(job.id)
+
+    # Before/after of the operations run in this session
+    history = []
+    for job_id in st.session_state.get('maintenance_jobs', []):
+        job = get_job(job_id)
+        if job is None:
+            continue
+        result = job.result or {}
+        history.append({
+            "operation": job.name,
+            "database": job.db_file,
+            "status": job.status if job.status != 'failed' else job.error,
+            "size before (MB)": round(result['before']['file_bytes'] / 1e6, 2) if result else None,
+            "size after (MB)": round(result['after']['file_bytes'] / 1e6, 2) if result else None,
+            "free pages before": result['before']['freelist_count'] if result else None,
+            "free pages after": result['after']['freelist_count'] if result else None,
+            "seconds": round(result['seconds'], 3) if result else None,
+            "detail": result.get('detail'),
+        })
+    if history:
+        st.dataframe(pd.DataFrame(history[::-1]))
+
+
+# --------------------------------------------- Workspace ---------------------------------------------------
+
+def Workspace_page():
+    st.title("Workspace")
+    databases = load_workspace()
+
+    # Registered databases
+    st.subheader("Databases")
+    rows = []
+    for alias, db_file in databases.items():
+        exists = os.path.exists(db_file)
+        rows.append({
+            "alias": alias,
+            "path": db_file,
+            "size (MB)": round(os.path.getsize(db_file) / 1e6, 2) if exists else None,
+            "tables": len(get_table_names(db_file)) if exists else None,
+            "active": os.path.abspath(db_file) == os.path.abspath(get_active_database()),
+        })
+    st.dataframe(pd.DataFrame(rows))
+
+    form = st.form(key='register_database_form')
+    db_file = form.text_input("Database file", placeholder="sales.db")
+    alias = form.text_input("Alias (optional)", placeholder="sales")
+    create = form.checkbox("Create the file if it doesn't exist")
+    if form.form_submit_button("Add Database") and db_file:
+        try:
+            alias = register_database(db_file, alias or None, create=create)
+            st.success(f"Database '{db_file}' added as '{alias}'.")
+            st.rerun()
+        except (ValueError, sqlite3.Error) as e:
+            st.error(f"Error adding database: {e}")
+
+    removable = [alias for alias, db_file in databases.items() if os.path.abspath(db_file) != os.path.abspath(DB_PATH)]
+    alias_to_remove = st.selectbox("Remove from workspace (the file is kept)", removable)
+    if st.button("Remove Database") and alias_to_remove:
+        unregister_database(alias_to_remove)
+        st.rerun()
+
+    # Queries across databases
+    st.subheader("Query across databases")
+    st.caption("The active database is `main`, the others are attached under their alias, e.g. `SELECT * FROM sales.orders`.")
+    query = st.text_area("Read-only query")
+    if st.button("Run Query") and query:
+        try:
+            st.dataframe(query_workspace(get_active_database(), query))
+        except sqlite3.Error as e:
+            st.error(f"Error running query: {e}")
+
+    # Copy tables between databases
+    st.subheader("Copy a table")
+    aliases = list(databases)
+    source_alias = st.selectbox("From database", aliases)
+    source_tables = get_table_names(databases[source_alias]) if source_alias and os.path.exists(databases[source_alias]) else []
+    table_name = st.selectbox("Table", source_tables)
+    target_alias = st.selectbox("To database", aliases)
+    target_table = st.text_input("Target table name", value=table_name or "")
+    where = st.text_input("Row filter (SQL WHERE condition, optional)", placeholder="created_at >= '2024-01-01'")
+    modes = {"Create a new table": "create", "Append to an existing table": "append", "Replace an existing table": "replace"}
+    mode = st.radio("Mode", list(modes))
+    if st.button("Copy Table") and table_name and target_table:
+        source_db = databases[source_alias]
+
+        def copy_job(job):
+            rows = copy_table_between(job.conn, source_db, table_name, target_table, where=where or None, mode=modes[mode], progress=job.tick)
+            job.message = f"{rows:,} rows copied"
+            return rows
+
+        # The copy runs as a background job on the target database (see the Jobs panel)
+        submit_job(f"Copy '{source_alias}.{table_name}' to '{target_alias}.{target_table}'", copy_job, databases[target_alias])
+        st.info("The copy runs in the background.")
+
+
 # --------------------------------------------- The table viewer ---------------------------------------------
 
 # Function to fetch table names
 def get_table_names(db_file):
-    conn = sqlite3.connect(db_file)
-    query = "SELECT name FROM sqlite_master WHERE type='table';"
-    tables = pd.read_sql_query(query, conn)
-    conn.close()
-    return tables['name'].tolist()
+    return list(get_schema_catalog(get_connection(db_file))["tables"])
+
+# Function to turn a typed key value into a number when it looks like one
+# Values for TEXT columns (see get_column_affinities) stay text, so a key like "007" is still found.
+def parse_key_value(text, affinity=None):
+    text = text.strip()
+    if affinity == "TEXT":
+        return text
+    for cast in (int, float):
+        try:
+            return cast(text)
+        except ValueError:
+            pass
+    return text
+
+# Function to parse typed key values, each one following the affinity of its column
+def parse_key_values(values, columns, affinities):
+    return tuple(parse_key_value(v, affinities.get(columns[i]) if i < len(columns) else None) for i, v in enumerate(values))
+
+# Sidebar controls for the viewer's column filters, returned in the form compile_filters() expects
+def Viewer_filters(columns, affinities):
+    filters = []
+    st.sidebar.subheader("Filters")
+    num_filters = st.sidebar.number_input("Number of filters", min_value=0, max_value=10, value=0)
+    for i in range(num_filters):
+        column = st.sidebar.selectbox(f"Filter {i+1} column", columns, key=f"filter_col_{i}")
+        op = st.sidebar.selectbox(f"Filter {i+1} operator", FILTER_OPERATORS, key=f"filter_op_{i}")
+        if op in ("is null", "is not null"):
+            value = None
+        elif op == "between":
+            low = st.sidebar.text_input(f"Filter {i+1} from", key=f"filter_low_{i}")
+            high = st.sidebar.text_input(f"Filter {i+1} to", key=f"filter_high_{i}")
+            if not (low and high):
+                continue
+            value = (parse_key_value(low, affinities.get(column)), parse_key_value(high, affinities.get(column)))
+        elif op == "in":
+            typed = st.sidebar.text_input(f"Filter {i+1} values (comma separated)", key=f"filter_values_{i}")
+            if not typed:
+                continue
+            value = [parse_key_value(v, affinities.get(column)) for v in typed.split(',')]
+        else:
+            typed = st.sidebar.text_input(f"Filter {i+1} value", key=f"filter_value_{i}", help="Use % as a wildcard with like")
+            if not typed:
+                continue
+            value = typed if op == "like" else parse_key_value(typed, affinities.get(column))
+        filters.append({"column": column, "op": op, "value": value})
+    return filters
+
+# Paginated viewer: every page is a keyset seek on rowid/primary key, so any page costs the same
+# Filters and sorting are compiled to SQL and run by SQLite (using indexes where it can).
+# Returns the filter condition and its parameters so the export can use them.
+def Table_paginated_viewer(db_name, table_name):
+    conn = create_connection(db_name)
+    key_columns = get_page_key(conn, table_name)
+    columns = get_columns_and_types(conn, table_name)['name'].tolist()
+
+    # Filters and sort order
+    affinities = get_column_affinities(conn, table_name)
+    where, params, filter_columns = compile_filters(Viewer_filters(columns, affinities))
+    st.sidebar.subheader("Sort")
+    sort_column = st.sidebar.selectbox("Sort by", ["(key order)"] + columns)
+    sort_descending = st.sidebar.checkbox("Descending")
+    order_by = [] if sort_column == "(key order)" else [(sort_column, sort_descending)]
+
+    # Reset the position whenever another table, filter or sort order is picked
+    view = (table_name, where, tuple(params), tuple(order_by))
+    if st.session_state.get('viewer_view') != view:
+        st.session_state.viewer_view = view
+        st.session_state.viewer_request = ('first', None)
+        st.session_state.viewer_bounds = (None, None)
+
+    # Row counts
+    count_col, exact_col = st.columns(2)
+    if where:
+        if count_col.button("Count matching rows"):
+            count_col.metric("Matching rows", f"{count_matching_rows(conn, table_name, where, params):,}")
+    else:
+        count_col.metric("Rows (approx.)", f"{approximate_row_count(conn, table_name):,}")
+        if exact_col.button("Exact count"):
+            exact_col.metric("Rows (exact)", f"{count_rows(conn, table_name):,}")
+
+    # Page size and jump controls (to a key, or to a value of the sort column)
+    page_size = st.sidebar.select_slider("Rows per page", [25, 50, 100, 250, 500, 1000], value=100)
+    jump_label = sort_column if order_by else ', '.join(key_columns)
+    jump_to = st.sidebar.text_input(f"Jump to {jump_label}", help="Separate values with commas for composite keys")
+    if st.sidebar.button("Go") and jump_to:
+        values = parse_key_values([jump_to], [sort_column], affinities) if order_by else parse_key_values(jump_to.split(','), key_columns, affinities)
+        st.session_state.viewer_request = ('at', values)
+
+    # Navigation buttons
+    first_page, prev_page, next_page, last_page = st.columns(4)
+    first_key, last_key = st.session_state.viewer_bounds
+    if first_page.button("First"):
+        st.session_state.viewer_request = ('first', None)
+    if prev_page.button("Previous") and first_key is not None:
+        st.session_state.viewer_request = ('prev', first_key)
+    if next_page.button("Next") and last_key is not None:
+        st.session_state.viewer_request = ('next', last_key)
+    if last_page.button("Last"):
+        st.session_state.viewer_request = ('last', None)
+
+    direction, key_values = st.session_state.viewer_request
+    page_options = dict(where=where, params=params, order_by=order_by, filter_columns=filter_columns)
+    data, page_first, page_last = fetch_page(conn, table_name, key_columns, key_values, page_size, direction, **page_options)
+
+    # Stay on the current page when moving past either end of the table
+    if data.empty and direction in ('next', 'prev') and first_key is not None:
+        st.info("No more rows in that direction.")
+        st.session_state.viewer_request = ('at', first_key)
+        data, page_first, page_last = fetch_page(conn, table_name, key_columns, first_key, page_size, 'at', **page_options)
+
+    st.session_state.viewer_bounds = (page_first, page_last)
+    if page_first is not None:
+        st.caption(f"Showing {', '.join([*(col for col, _ in order_by), *key_columns])} {page_first} to {page_last}")
+    st.dataframe(data)
+    return where, params
+
+# Export straight from the database: a background job streams the rows in chunks to a file in EXPORT_DIR
+# `where`/`params` are the viewer's filters, an extra condition can be typed in.
+def Table_export_section(db_name, table_name, where=None, params=()):
+    with st.expander("Export"):
+        if where:
+            st.caption("The viewer's filters are applied to the export.")
+        row_filter = st.text_input("Row filter (SQL WHERE condition, optional)", placeholder="price > 10 AND size = 'L'")
+        export_format = st.radio("Format", ["CSV", "Parquet", "Arrow IPC"], horizontal=True)
+        compress = export_format == "CSV" and st.checkbox("Compress with gzip")
+        conditions = [f"({condition})" for condition in (where, row_filter) if condition]
+
+        # Parquet and Arrow files are written one record batch at a time, like CSV chunks
+        def write_export(out_file, progress=None):
+            if export_format == "CSV":
+                return export_table_csv(db_name, table_name, out_file, where=" AND ".join(conditions) or None, params=params,
+                                        compress=compress, progress=progress)
+            return export_table_arrow(db_name, table_name, out_file, "parquet" if export_format == "Parquet" else "arrow",
+                                      where=" AND ".join(conditions) or None, params=params, progress=progress)
+
+        if export_format == "CSV":
+            file_name = f"{table_name}.csv.gz" if compress else f"{table_name}.csv"
+            mime = "application/gzip" if compress else "text/csv"
+        elif export_format == "Parquet":
+            file_name, mime = f"{table_name}.parquet", "application/vnd.apache.parquet"
+        else:
+            file_name, mime = f"{table_name}.arrow", "application/vnd.apache.arrow.file"
+
+        # Exports are written to a file on disk by a background job, the Jobs panel then shows where it is
+        if st.button(f"Export as {export_format}"):
+            def export_job(job):
+                path = new_export_path(file_name)
+                try:
+                    with open(path, "wb") as out_file:
+                        rows = write_export(out_file, progress=job.tick)
+                except BaseException:
+                    os.remove(path)
+                    raise
+                job.download = {"path": path, "file_name": file_name, "mime": mime}
+                job.message = f"{rows:,} rows exported to {path}"
+
+            submit_job(f"Export '{table_name}' to {file_name}", export_job, db_name)
+            st.info("The export runs in the background, the file is listed in the Jobs panel.")
 
 def Table_viewer_page():
 
@@ -201,13 +779,18 @@ def Table_viewer_page():
 
 
     # Input: database and table details
-    db_name = "admin.db"
+    db_name = get_active_database()
     table_names = get_table_names(db_name)
     table_name = st.sidebar.selectbox("Select Table", table_names)
+    view_mode = st.sidebar.radio("View mode", ["Paginated", "Full table"])
 
+    where, params = None, ()
+    if view_mode == "Paginated":
+        if table_name:
+            where, params = Table_paginated_viewer(db_name, table_name)
 
     # Button to load data
-    if st.button("Load Data"):
+    elif st.button("Load Data"):
         try:
             # Load data from database
             data = load_data_from_db(db_name, table_name)
@@ -216,88 +799,190 @@ def Table_viewer_page():
             # Display the data in the app
             st.write("### Data Preview:")
             st.dataframe(data)
-            
-            # Option to download data as CSV
-            csv = data.to_csv(index=False)
-            st.download_button("Download data as CSV", csv, f"{table_name}.csv", "text/csv")
 
         except Exception as e:
             st.error(f"Error loading data: {e}")
 
+    if table_name:
+        Table_export_section(db_name, table_name, where, params)
+
     # Option to display raw SQL query results (if needed)
     st.write("You can modify the table name or database name in the input fields to load other tables.")
 
 
 # ============================================= DB assistant page ====================================
 
+# Builds the agent once per process, the first time the assistant page asks for it.
+# The langchain stack is imported in here so the other pages never pay for it on a rerun.
+@st.cache_resource(show_spinner="Loading the database assistant...")
+def get_agent():
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    from langchain.agents import initialize_agent, AgentType, load_tools
+
+    llm = ChatGoogleGenerativeAI(model="gemini-pro", google_api_key=GOOGLE_API_KEY)
+    os.environ['SERPAPI_API_KEY'] = SERPAPI_API_KEY
+    tools = load_tools(["serpapi","llm-math"], llm=llm)
+
+    # here we just make the agent
+    return initialize_agent(tools, llm, agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION, verbose=True)
+
+# The ReAct agent with search and math tools; it doesn't stream, its answer comes as one chunk
+def agent_backend(prompt, options):
+    yield get_agent().run(prompt)
+
+register_assistant_backend("agent", agent_backend)
+
+# Models behind the two choices of the assistant's sidebar
+ASSISTANT_MODELS = {'small(fast) model': 'gemini-1.5-flash', 'Large(accurate) model': 'gemini-pro'}
+
 def db_assistant_page():
     with st.sidebar:
         st.title('Data base assistant')
         st.subheader('Models and parameters')
-        selected_model = st.sidebar.selectbox('Choose the model you need', ['small(fast) model','Large(accurate) model'], key='selected_model')
-        if selected_model == 'small(fast) model':
-            llm = 'not added yet'
-        elif selected_model == 'Large(accurate) model':
-            llm = 'not added yet'
-        
+        backends = list(ASSISTANT_BACKENDS)
+        default_backend = os.environ.get("SQLITE_GUI_ASSISTANT_BACKEND", "gemini")
+        backend = st.sidebar.selectbox('Backend', backends, index=backends.index(default_backend) if default_backend in backends else 0, key='assistant_backend')
+        selected_model = st.sidebar.selectbox('Choose the model you need', list(ASSISTANT_MODELS), key='selected_model')
+
         temperature = st.sidebar.slider('temperature', min_value=0.01, max_value=5.0, value=0.1, step=0.01)
         top_p = st.sidebar.slider('top_p', min_value=0.01, max_value=1.0, value=0.9, step=0.01)
         max_length = st.sidebar.slider('max_length', min_value=64, max_value=4096, value=512, step=8)
-        
+        options = {"model": ASSISTANT_MODELS[selected_model], "api_key": GOOGLE_API_KEY,
+                   "temperature": temperature, "top_p": top_p, "max_tokens": max_length}
+
 
     # Store LLM generated responses
     if "messages" not in st.session_state.keys():
         st.session_state.messages = [{"role": "assistant", "content": "How may I assist you today?"}]
 
     # Display or clear chat messages
-    for message in st.session_state.messages:
+    for i, message in enumerate(st.session_state.messages):
         with st.chat_message(message["role"]):
             st.write(message["content"])
+            Assistant_sql(message.get("sql", []), f"history_{i}")
 
     def clear_chat_history():
         st.session_state.messages = [{"role": "assistant", "content": "How may I assist you today?"}]
     st.sidebar.button('Clear Chat History', on_click=clear_chat_history)
 
-    # Function for generating LLaMA2 response
-    def generate_llama2_response(prompt_input):
-        global agent
-        output = agent.run(prompt_input)
-        return output
-
     # User-provided prompt
     if prompt := st.chat_input():
         st.session_state.messages.append({"role": "user", "content": prompt})
         with st.chat_message("user"):
             st.write(prompt)
 
-    # Generate a new response if last message is not from assistant
+    # Generate a new response if last message is not from assistant, showing the tokens as they arrive
     if st.session_state.messages[-1]["role"] != "assistant":
+        stats = {}
         with st.chat_message("assistant"):
-            with st.spinner("Thinking..."):
-                response = generate_llama2_response(prompt)
-                placeholder = st.empty()
-                full_response = ''
-                for item in response:
-                    full_response += item
-                    placeholder.markdown(full_response)
-                placeholder.markdown(full_response)
-        message = {"role": "assistant", "content": full_response}
+            try:
+                full_response = st.write_stream(stream_answer(create_connection(), st.session_state.messages[-1]["content"], backend, options, stats))
+            except Exception as e:
+                full_response = f"The assistant failed: {e}"
+                st.error(full_response)
+            if stats.get("first_chunk_seconds") is not None:
+                st.caption("From the answer cache" if stats["cached"] else f"First token after {stats['first_chunk_seconds']:.2f}s")
+            Assistant_sql(stats.get("sql", []), "new")
+        message = {"role": "assistant", "content": full_response, "sql": stats.get("sql", [])}
         st.session_state.messages.append(message)
 
+# Shows the SQL of an answer, with a button to run it read-only on the active database
+def Assistant_sql(queries, key_prefix):
+    for i, query in enumerate(queries):
+        if st.button("Run this query (read-only)", key=f"assistant_sql_{key_prefix}_{i}"):
+            try:
+                st.dataframe(query_workspace(get_active_database(), query, max_rows=1000))
+            except sqlite3.Error as e:
+                st.error(f"Error running query: {e}")
+
+
+# --------------------------------------------- Background jobs ---------------------------------------------
+
+def Jobs_panel():
+    jobs = list_jobs()
+    if not jobs:
+        return
+    # While jobs are running the panel refreshes itself every second
+    active = any(job.active for job in jobs)
+    with st.sidebar:
+        st.fragment(Jobs_panel_contents, run_every=1 if active else None)(active)
+
+def Jobs_panel_contents(was_active):
+    jobs = list_jobs()
+    st.subheader("Jobs")
+    for job in reversed(jobs):
+        st.write(f"**{job.name}** ({job.status})")
+        if job.status == 'running':
+            if job.fraction is not None:
+                st.progress(job.fraction, text=job.message or None)
+            else:
+                st.caption(job.message or f"{job.steps:,} steps")
+        elif job.status == 'failed':
+            st.error(job.error)
+        elif job.status == 'done':
+            if job.message:
+                st.caption(job.message)
+            # Streamlit reads a download button's file into memory, bigger files are linked to where they are served from disk
+            if job.download and os.path.exists(job.download['path']):
+                if os.path.getsize(job.download['path']) <= EXPORT_DOWNLOAD_BYTES:
+                    st.download_button("Download", lambda path=job.download['path']: read_file_bytes(path), job.download['file_name'],
+                                       job.download['mime'], key=f"job_download_{job.id}")
+                elif EXPORT_URL:
+                    st.link_button("Download", f"{EXPORT_URL}/{os.path.basename(job.download['path'])}")
+                else:
+                    st.caption("Too big to download here, start the app with `streamlit run serve.py` to download it.")
+            elif job.download:
+                st.caption("The export file was removed.")
+        if job.active and st.button("Cancel", key=f"job_cancel_{job.id}"):
+            job.cancel()
+
+    if any(not job.active for job in jobs) and st.button("Clear finished jobs", help="Their export files are deleted too."):
+        clear_finished_jobs()
+        st.rerun()
+    # Rerun the whole page once the last job is over, so it shows what the jobs changed
+    if was_active and not any(job.active for job in jobs):
+        st.rerun()
+
+
+# Function to read a file for a download button, closing it afterwards
+def read_file_bytes(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
 
 # ===================================== main app ====================================
 
 
 def app():
-    page = st.sidebar.selectbox('Pages:', ('Table Viewer', 'Table Operations', 'Data Operations', 'Database Assistant'))
+    page = st.sidebar.selectbox('Pages:', ('Table Viewer', 'Table Operations', 'Data Operations', 'Column Profiling', 'Index Management', 'Performance', 'Maintenance', 'Workspace', 'SQL Console', 'Database Assistant'))
+    set_query_page(page)
+
+    # Every page works on the database picked here
+    databases = load_workspace()
+    alias = st.sidebar.selectbox('Database:', list(databases), key='active_database')
+    set_active_database(databases[alias])
+
     if page == 'Table Viewer':
         Table_viewer_page()
     elif page == 'Table Operations':
         Table_ops_page()
     elif page == 'Data Operations':
         Data_ops_page()
+    elif page == 'Column Profiling':
+        Profiling_page()
+    elif page == 'Index Management':
+        Index_management_page()
+    elif page == 'Performance':
+        Performance_page()
+    elif page == 'Maintenance':
+        Maintenance_page()
+    elif page == 'Workspace':
+        Workspace_page()
+    elif page == 'SQL Console':
+        Sql_console_page()
     else:
         db_assistant_page()
+    Jobs_panel()
 
 
 
@@ -0,0 +1,74 @@
+# Startup-time benchmark: how long a fresh interpreter takes to import the app.
+# Streamlit re-executes app.py on every interaction, so anything slow at import time is paid on every rerun
+# and on every cold start. Exits with status 1 when the median import time is over --max-seconds or
+# when importing the app pulls in a module that should only load lazily (the LLM stack).
+#
+# usage: python benchmarks/startup.py [--runs 5] [--max-seconds 3.0] [--top 10]
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must not be imported just by loading the app
+LAZY_MODULES = ("langchain", "langchain_community", "langchain_google_genai")
+
+CHECK_LAZY = (
+    "import sys, app; "
+    f"print(','.join(sorted({{m.split('.')[0] for m in sys.modules}} & set({LAZY_MODULES!r}))))"
+)
+
+
+# Function to time one import of the app in a new interpreter
+def time_import():
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "import app"], cwd=ROOT, check=True, capture_output=True)
+    return time.perf_counter() - start
+
+# Function to list the slowest modules imported directly by the app, using python -X importtime
+def slowest_imports(top):
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app"], cwd=ROOT, check=True, capture_output=True, text=True)
+    timings = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line[len("import time:"):].split("|")
+        depth = (len(module) - len(module.lstrip()) - 1) // 2
+        if depth == 1:  # imported by app.py itself
+            timings.append((int(cumulative), module.strip()))
+    return sorted(timings, reverse=True)[:top]
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure how long importing the app takes.")
+    parser.add_argument("--runs", type=int, default=5, help="number of fresh imports to time")
+    parser.add_argument("--max-seconds", type=float, default=3.0, help="fail when the median import takes longer")
+    parser.add_argument("--top", type=int, default=10, help="number of slowest imports made by app.py to show")
+    args = parser.parse_args()
+
+    # The first run warms the OS file cache and isn't counted
+    time_import()
+    timings = [time_import() for _ in range(args.runs)]
+    median = statistics.median(timings)
+    print(f"import app: median {median:.3f}s, min {min(timings):.3f}s, max {max(timings):.3f}s over {args.runs} runs")
+
+    if args.top:
+        print("slowest imports made by app.py (cumulative):")
+        for microseconds, module in slowest_imports(args.top):
+            print(f"  {microseconds / 1e6:8.3f}s  {module}")
+
+    failed = False
+    eager = subprocess.run([sys.executable, "-c", CHECK_LAZY], cwd=ROOT, check=True, capture_output=True, text=True).stdout.strip()
+    if eager:
+        print(f"FAIL: importing the app loads {eager}, which should only be imported when it is used")
+        failed = True
+    if median > args.max_seconds:
+        print(f"FAIL: median import time {median:.3f}s is over the {args.max_seconds:.3f}s budget")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+# Benchmark suite for the data paths of the app, run without Streamlit on synthetic data.
+# Generates (and caches) a SQLite database and a CSV file per size/column mix (and an xlsx workbook of the same rows
+# when an xlsx case runs), runs every case in a fresh
+# process so its peak RSS is its own, and compares the timings against a stored baseline.
+#
+# usage: python benchmarks/suite.py [--sizes 10k,1m,10m] [--columns int:2,real:2,text:3,date:1]
+#                                   [--cases load,page,...] [--save-baseline] [--tolerance 0.25]
+# Exits with status 1 when a case is slower than the baseline by more than the tolerance.
+import argparse
+import concurrent.futures
+import hashlib
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+DEFAULT_WORKDIR = os.path.join(ROOT, "benchmarks", ".data")
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+CASES = ["load", "page", "export", "create", "import", "import_cached", "import_xlsx", "import_xlsx_cached", "reimport",
+         "upsert", "remove_column"]
+XLSX_CASES = ("import_xlsx", "import_xlsx_cached")
+# Rows a worksheet holds besides its header row
+XLSX_MAX_ROWS = 1_048_575
+SIZES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000, "10m": 10_000_000}
+GENERATE_CHUNK = 500_000
+WORDS = ["alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "hotel", "india", "juliet"]
+
+
+# Function to parse a column mix such as "int:2,real:2,text:3,date:1"
+def parse_columns(spec):
+    mix = {}
+    for part in spec.split(","):
+        kind, _, count = part.partition(":")
+        if kind not in ("int", "real", "text", "date"):
+            raise argparse.ArgumentTypeError(f"unknown column kind '{kind}'")
+        mix[kind] = int(count or 1)
+    return mix
+
+# Function to generate `n` synthetic rows starting at id `start`, the same every time for the same seed
+def synthetic_frame(mix, start, n, seed=42):
+    import numpy as np
+    import pandas as pd
+    rng = np.random.default_rng([seed, start])
+    data = {"id": np.arange(start, start + n)}
+    for i in range(mix.get("int", 0)):
+        data[f"int_{i}"] = rng.integers(0, 1_000_000, n)
+    for i in range(mix.get("real", 0)):
+        data[f"real_{i}"] = rng.random(n) * 1000
+    for i in range(mix.get("text", 0)):
+        words = np.array(WORDS)[rng.integers(0, len(WORDS), n)]
+        data[f"text_{i}"] = pd.Series(words, dtype=object) + "_" + pd.Series(rng.integers(0, 100_000, n)).astype(str)
+    for i in range(mix.get("date", 0)):
+        days = pd.to_timedelta(rng.integers(0, 3650, n), unit="D")
+        data[f"date_{i}"] = (pd.Timestamp("2015-01-01") + days).strftime("%Y-%m-%d")
+    return pd.DataFrame(data)
+
+# Function to create the cached database and CSV for a size/column mix, returning their paths
+def ensure_dataset(workdir, rows, mix):
+    import sqlite3
+    tag = hashlib.sha1(json.dumps([rows, mix], sort_keys=True).encode()).hexdigest()[:10]
+    db_path = os.path.join(workdir, f"bench_{rows}_{tag}.db")
+    csv_path = os.path.join(workdir, f"bench_{rows}_{tag}.csv")
+    if os.path.exists(db_path) and os.path.exists(csv_path):
+        return db_path, csv_path
+
+    os.makedirs(workdir, exist_ok=True)
+    print(f"generating {rows:,} rows ({mix}) in {workdir} ...", flush=True)
+    conn = sqlite3.connect(db_path + ".tmp")
+    try:
+        columns = synthetic_frame(mix, 0, 1).columns
+        types = {"id": "INTEGER PRIMARY KEY"}
+        types.update({col: {"int": "INTEGER", "real": "REAL"}.get(col.split("_")[0], "TEXT") for col in columns if col != "id"})
+        conn.execute(f"CREATE TABLE bench ({', '.join(f'{col} {types[col]}' for col in columns)});")
+        with open(csv_path + ".tmp", "w", newline="") as csv_file:
+            for start in range(0, rows, GENERATE_CHUNK):
+                frame = synthetic_frame(mix, start, min(GENERATE_CHUNK, rows - start))
+                conn.executemany(f"INSERT INTO bench VALUES ({', '.join('?' * len(columns))});", frame.itertuples(index=False, name=None))
+                frame.to_csv(csv_file, index=False, header=start == 0)
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(db_path + ".tmp", db_path)
+    os.replace(csv_path + ".tmp", csv_path)
+    return db_path, csv_path
+
+# Function to name the workbook of a dataset, next to its CSV
+def xlsx_path_of(csv_path):
+    return os.path.splitext(csv_path)[0] + ".xlsx"
+
+# Function to create the cached workbook of a dataset from its CSV, one sheet with the same rows
+# Only done when an xlsx case runs: openpyxl writes far fewer rows per second than the CSV writer.
+def ensure_xlsx(csv_path):
+    import openpyxl
+    import pandas as pd
+    xlsx_path = xlsx_path_of(csv_path)
+    if os.path.exists(xlsx_path):
+        return xlsx_path
+
+    print(f"generating {xlsx_path} ...", flush=True)
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet("bench")
+    for i, frame in enumerate(pd.read_csv(csv_path, chunksize=GENERATE_CHUNK)):
+        if i == 0:
+            sheet.append(list(frame.columns))
+        for row in frame.itertuples(index=False, name=None):
+            sheet.append(row)
+    tmp_path = os.path.splitext(xlsx_path)[0] + ".tmp.xlsx"
+    workbook.save(tmp_path)
+    os.replace(tmp_path, xlsx_path)
+    return xlsx_path
+
+# Function to change one value in 1% of the rows of a frame
+def _changed_frame(frame):
+    import pandas as pd
+    changed = frame.sample(frac=0.01, random_state=1).index
+    value_column = [col for col in frame.columns if col != "id"][0]
+    if pd.api.types.is_numeric_dtype(frame[value_column]):
+        frame.loc[changed, value_column] += 1
+    else:
+        frame.loc[changed, value_column] += "x"
+    return frame
+
+# Function to run one case in the current process; returns the rows processed and the seconds taken
+def _run_case(case, db_path, csv_path, rows, scratch):
+    import pandas as pd
+    import utils
+
+    # Cases that write get their own copy of the database, and every case starts with an empty upload cache
+    utils.UPLOAD_CACHE_DIR = os.path.join(scratch, "uploads")
+    work_db = os.path.join(scratch, "work.db")
+    shutil.copy(db_path, work_db)
+    conn = utils.open_connection(work_db)
+
+    start = time.perf_counter()
+    if case == "load":
+        processed = len(utils.load_data_from_db(work_db, "bench"))
+    elif case == "page":
+        # 200 pages spread over the whole table, deep pages included
+        processed = 0
+        for i in range(200):
+            data, _, _ = utils.fetch_page(conn, "bench", ["rowid"], (i * rows // 200,), 100, "at")
+            processed += len(data)
+    elif case == "export":
+        with open(os.path.join(scratch, "export.csv"), "wb") as out_file:
+            processed = utils.export_table_csv(work_db, "bench", out_file)
+    elif case == "create":
+        frame = pd.read_csv(csv_path)
+        start = time.perf_counter()
+        utils.create_table_from_df(conn, frame, "bench_created", "id")
+        processed = utils.upsert_data(conn, frame, "bench_created", "id")["inserted"]
+    elif case == "import":
+        upload = utils.LocalUpload(csv_path)
+        summary = utils.import_upload(conn, upload, "bench_imported", "id", create_table=True)
+        processed = summary["inserted"]
+    elif case == "import_cached":
+        # Import the same file a second time, read back from the upload cache instead of parsed
+        utils.import_upload(conn, utils.LocalUpload(csv_path), "bench_first", "id", create_table=True)
+        start = time.perf_counter()
+        summary = utils.import_upload(conn, utils.LocalUpload(csv_path), "bench_imported", "id", create_table=True)
+        processed = summary["inserted"]
+    elif case == "import_xlsx":
+        upload = utils.LocalUpload(xlsx_path_of(csv_path))
+        summary = utils.import_upload(conn, upload, "bench_imported", "id", create_table=True)
+        processed = summary["inserted"]
+    elif case == "import_xlsx_cached":
+        # Import the same workbook a second time, read back from the upload cache instead of parsed
+        utils.import_upload(conn, utils.LocalUpload(xlsx_path_of(csv_path)), "bench_first", "id", create_table=True)
+        start = time.perf_counter()
+        summary = utils.import_upload(conn, utils.LocalUpload(xlsx_path_of(csv_path)), "bench_imported", "id", create_table=True)
+        processed = summary["inserted"]
+    elif case == "reimport":
+        # Incremental re-import of the CSV after 1% of its rows changed; only those should be written
+        utils.import_upload(conn, utils.LocalUpload(csv_path), "bench_imported", "id", create_table=True, incremental=True)
+        frame = _changed_frame(pd.read_csv(csv_path))
+        changed_csv = os.path.join(scratch, "changed.csv")
+        frame.to_csv(changed_csv, index=False)
+        start = time.perf_counter()
+        summary = utils.import_upload(conn, utils.LocalUpload(changed_csv), "bench_imported", "id", incremental=True)
+        processed = sum(summary.values())
+    elif case == "upsert":
+        # Re-import the same rows with 1% changed and 1% new
+        frame = _changed_frame(pd.read_csv(csv_path))
+        new_rows = frame.sample(frac=0.01, random_state=2).assign(id=lambda f: f["id"] + rows)
+        frame = pd.concat([frame, new_rows], ignore_index=True)
+        start = time.perf_counter()
+        summary = utils.upsert_data(conn, frame, "bench", "id")
+        processed = sum(summary.values())
+    elif case == "remove_column":
+        column = [col["name"] for col in utils.get_schema_catalog(conn)["tables"]["bench"]["columns"]][-1]
+        utils.remove_column("bench", column, conn=conn)
+        processed = rows
+    else:
+        raise ValueError(f"unknown case '{case}'")
+    seconds = time.perf_counter() - start
+    conn.close()
+    return processed, seconds
+
+# Entry point of the worker process: runs a case and adds the process' peak RSS
+def run_case(case, db_path, csv_path, rows):
+    with tempfile.TemporaryDirectory(prefix="sqlite_gui_bench_") as scratch:
+        processed, seconds = _run_case(case, db_path, csv_path, rows, scratch)
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {"rows": processed, "seconds": seconds, "peak_rss_mb": peak_rss_mb}
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the app's data paths on synthetic data.")
+    parser.add_argument("--sizes", default="10k", help=f"comma separated sizes: {', '.join(SIZES)} or a number of rows")
+    parser.add_argument("--columns", type=parse_columns, default=parse_columns("int:2,real:2,text:3,date:1"), help="column mix, e.g. int:2,real:2,text:3,date:1")
+    parser.add_argument("--cases", default=",".join(CASES), help=f"comma separated cases: {', '.join(CASES)}")
+    parser.add_argument("--workdir", default=DEFAULT_WORKDIR, help="where generated datasets are cached")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline file to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown against the baseline (0.25 = 25%%)")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    sizes = [SIZES.get(size.lower()) or int(size) for size in args.sizes.split(",")]
+    cases = args.cases.split(",")
+    mix_tag = ",".join(f"{kind}:{count}" for kind, count in sorted(args.columns.items()))
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+
+    results = {}
+    regressions = []
+    print(f"{'case':<20}{'rows':>12}{'seconds':>10}{'rows/s':>14}{'peak RSS':>12}{'vs baseline':>14}")
+    for rows in sizes:
+        db_path, csv_path = ensure_dataset(args.workdir, rows, args.columns)
+        for case in cases:
+            if case in XLSX_CASES:
+                if rows > XLSX_MAX_ROWS:
+                    print(f"{case:<20}{rows:>12,}  skipped, a worksheet holds at most {XLSX_MAX_ROWS:,} rows", flush=True)
+                    continue
+                ensure_xlsx(csv_path)
+            # A fresh process per case, so peak RSS and caches aren't shared between cases
+            with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+                result = pool.submit(run_case, case, db_path, csv_path, rows).result()
+            key = f"{case}@{rows}@{mix_tag}"
+            results[key] = result
+
+            comparison = ""
+            if key in baseline:
+                ratio = result["seconds"] / baseline[key]["seconds"]
+                comparison = f"{ratio:.2f}x"
+                if ratio > 1 + args.tolerance:
+                    comparison += " SLOWER"
+                    regressions.append(key)
+            throughput = result["rows"] / result["seconds"] if result["seconds"] else float("inf")
+            print(f"{case:<20}{rows:>12,}{result['seconds']:>10.3f}{throughput:>14,.0f}{result['peak_rss_mb']:>10.0f}MB{comparison:>14}", flush=True)
+
+    if args.json:
+        with open(args.json, "w") as json_file:
+            json.dump(results, json_file, indent=2)
+    if args.save_baseline:
+        baseline.update(results)
+        with open(args.baseline, "w") as baseline_file:
+            json.dump(baseline, baseline_file, indent=2, sort_keys=True)
+        print(f"baseline saved to {args.baseline}")
+    if regressions:
+        print(f"FAIL: slower than the baseline by more than {args.tolerance:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+# Command line interface to the app's data operations, for scripts and cron jobs (no Streamlit needed).
+# Works on the same database as the app (SQLITE_GUI_DB, admin.db by default) unless --db is given.
+#
+# usage: python cli.py [--db FILE] import FILE... --key COLUMN [--table NAME] [--sheets all|NAME,...] [--workers N]
+#                                      [--incremental] [--delete-missing] [--strict] [--layout auto] [--dates iso]
+#        python cli.py [--db FILE] upsert FILE... --key COLUMN [...]    (like import, but never creates tables)
+#        python cli.py [--db FILE] export TABLE OUT_FILE [--where SQL]  (.csv, .csv.gz, .parquet or .arrow)
+#        python cli.py [--db FILE] drop-column TABLE COLUMN
+#        python cli.py [--db FILE] vacuum [--into FILE]
+# Exits with status 1 when an operation (or any of the files of an import) failed.
+import argparse
+import sys
+import time
+
+from utils import *
+
+
+# Function to import or upsert files, printing a line per file/sheet as the writer finishes it
+def import_command(args, create_table):
+    start = time.perf_counter()
+
+    def report(fraction, result):
+        path, sheet, table, summary = result
+        source = f"{path} [{sheet}]" if sheet else path
+        if isinstance(summary, Exception):
+            print(f"{source} -> {table}: FAILED: {summary}", flush=True)
+        else:
+            counts = ", ".join(f"{count} {key}" for key, count in summary.items())
+            print(f"{source} -> {table}: {counts}", flush=True)
+
+    sheets = args.sheets if args.sheets in (None, "all") else args.sheets.split(",")
+    table_options = {"strict": args.strict, "layout": args.layout, "dates": args.dates}
+    results = import_files(args.db, args.files, args.key, table_name=args.table, sheets=sheets, workers=args.workers,
+                           create_table=create_table, progress=report, table_options=table_options,
+                           incremental=args.incremental, delete_missing=args.delete_missing)
+    failed = sum(isinstance(summary, Exception) for *_, summary in results)
+    print(f"{len(results) - failed} of {len(results)} imported in {time.perf_counter() - start:.1f}s")
+    return 1 if failed else 0
+
+# Function to export a table, picking the format from the file extension
+def export_command(args):
+    out_path = args.out_file.lower()
+    if out_path.endswith((".parquet", ".arrow", ".feather")):
+        rows = export_table_arrow(args.db, args.table, args.out_file, fmt="parquet" if out_path.endswith(".parquet") else "arrow", where=args.where)
+    else:
+        with open(args.out_file, "wb") as out_file:
+            rows = export_table_csv(args.db, args.table, out_file, where=args.where, compress=out_path.endswith(".gz"))
+    print(f"{rows} rows of '{args.table}' written to {args.out_file}")
+    return 0
+
+# Function to remove a column from a table
+def drop_column_command(args):
+    conn = open_connection(args.db)
+    try:
+        dropped = remove_column(args.table, args.column, conn=conn)
+    finally:
+        conn.close()
+    print(f"Column '{args.column}' removed from '{args.table}'." + (f" Dropped {', '.join(dropped)}, which used it." if dropped else ""))
+    return 0
+
+# Function to VACUUM the database, in place or into a new file
+def vacuum_command(args):
+    conn = open_connection(args.db)
+    try:
+        result = run_maintenance(conn, "vacuum_into" if args.into else "vacuum", target=args.into)
+    finally:
+        conn.close()
+    before, after = result["before"], result["after"]
+    print(f"{result['operation']} took {result['seconds']:.1f}s: {before['file_bytes'] / 1e6:.2f} MB -> {after['file_bytes'] / 1e6:.2f} MB"
+          + (f" ({result['detail']})" if result["detail"] else ""))
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the app's data operations from the command line.")
+    parser.add_argument("--db", default=DB_PATH, help=f"database file (default: {DB_PATH})")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    for name, help_text in (("import", "import files, creating missing tables"), ("upsert", "upsert files into existing tables")):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument("files", nargs="+", help="Excel (.xlsx), CSV or Parquet files")
+        command.add_argument("--key", required=True, help="primary key column")
+        command.add_argument("--table", help="target table (default: the sheet name, or the file name without extension)")
+        command.add_argument("--sheets", help="'all', or comma separated sheet names (default: the active sheet)")
+        command.add_argument("--workers", type=int, help="processes parsing files in parallel (default: one per core)")
+        command.add_argument("--incremental", action="store_true", help="only write rows that changed since the last import")
+        command.add_argument("--delete-missing", action="store_true", help="delete rows whose key isn't in the file")
+        command.add_argument("--strict", action="store_true", help="create STRICT tables")
+        command.add_argument("--layout", choices=list(TABLE_LAYOUTS), default="auto", help="layout of created tables")
+        command.add_argument("--dates", choices=list(DATE_STORAGE), default="iso", help="how created tables store dates")
+
+    command = commands.add_parser("export", help="export a table to CSV, Parquet or Arrow IPC")
+    command.add_argument("table")
+    command.add_argument("out_file", help="output file; .csv, .csv.gz, .parquet or .arrow")
+    command.add_argument("--where", help="SQL condition selecting the rows to export")
+
+    command = commands.add_parser("drop-column", help="remove a column from a table")
+    command.add_argument("table")
+    command.add_argument("column")
+
+    command = commands.add_parser("vacuum", help="rebuild the database file")
+    command.add_argument("--into", help="write the vacuumed copy to this new file instead")
+
+    args = parser.parse_args()
+    try:
+        if args.command in ("import", "upsert"):
+            status = import_command(args, create_table=args.command == "import")
+        elif args.command == "export":
+            status = export_command(args)
+        elif args.command == "drop-column":
+            status = drop_column_command(args)
+        else:
+            status = vacuum_command(args)
+    except (sqlite3.Error, ValueError, OSError) as error:
+        print(f"error: {error}", file=sys.stderr)
+        status = 1
+    sys.exit(status)
+
+
+if __name__ == "__main__":
+    main()
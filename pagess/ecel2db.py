@@ -1,108 +1,99 @@
 import streamlit as st
 import pandas as pd
-import sqlite3
-
-# Function to map pandas dtypes to SQLite types
-def map_dtype(dtype):
-    if pd.api.types.is_numeric_dtype(dtype):
-        return "REAL"
-    elif pd.api.types.is_string_dtype(dtype):
-        return "TEXT"
-    elif pd.api.types.is_datetime64_any_dtype(dtype):
-        return "TEXT"  # Dates as text (can be converted back to datetime later)
+from utils import *
+
+# Function to start importing an upload in the background, remembering the job for this session
+def submit_import_job(uploaded_file, table_name, primary_key, create_table=False, table_options=None, incremental=False,
+                      delete_missing=False, file_sha256=None):
+    def import_job(job):
+        summary = import_upload(job.conn, uploaded_file, table_name, primary_key, create_table=create_table,
+                                progress=lambda fraction: job.progress(fraction, f"Importing into '{table_name}'..."),
+                                table_options=table_options, incremental=incremental, delete_missing=delete_missing,
+                                file_sha256=file_sha256)
+        job.message = f"Inserted {summary['inserted']}, updated {summary['updated']} and left {summary['unchanged']} rows unchanged."
+        if delete_missing:
+            job.message += f" Deleted {summary['deleted']} rows missing from the file."
+        return summary
+
+    st.session_state.import_job = submit_job(f"Import {uploaded_file.name} into '{table_name}'", import_job).id
+
+# Shows the progress of an import job (main() refreshes it every second while the job runs)
+def Import_job_status(job_id, was_active):
+    job = get_job(job_id)
+    if job is None:
+        # Cleared from the Jobs panel since the last refresh
+        st.session_state.pop('import_job', None)
+        if was_active:
+            st.rerun()
+        return
+    if job.active:
+        st.progress(job.fraction or 0.0, text=job.message or "Waiting to start...")
+        if st.button("Cancel import"):
+            job.cancel()
+        return
+    if was_active:
+        # Stop refreshing
+        st.rerun()
+    if job.status == 'done':
+        st.success(job.message)
+    elif job.status == 'cancelled':
+        st.warning("The import was cancelled. Batches written before that are kept, the one in progress was rolled back.")
     else:
-        return "TEXT"
-
-# Function to check if a table exists in SQLite
-def check_table_exists(conn, table_name):
-    query = "SELECT name FROM sqlite_master WHERE type='table' AND name=?;"
-    result = conn.execute(query, (table_name,)).fetchone()
-    return result is not None
-
-# Function to update existing rows or insert new rows based on the primary key
-def upsert_data(conn, df, table_name, primary_key):
-    # Fetch the existing data in the table
-    existing_data = pd.read_sql(f"SELECT * FROM {table_name}", conn)
-
-    for index, row in df.iterrows():
-        # Check if the primary key value exists in the existing data
-        primary_key_value = row[primary_key]
-        existing_row = existing_data[existing_data[primary_key] == primary_key_value]
-
-        if not existing_row.empty:
-            # Update the row if it exists and data differs
-            update_required = False
-            for col in df.columns:
-                if row[col] != existing_row.iloc[0][col]:
-                    update_required = True
-                    break
-
-            if update_required:
-                update_query = f"UPDATE {table_name} SET {', '.join([f'{col}=?' for col in df.columns])} WHERE {primary_key}=?"
-                conn.execute(update_query, tuple(row) + (primary_key_value,))
-                st.write(f"Row with {primary_key}={primary_key_value} updated.")
-        else:
-            # Insert the row if it doesn't exist
-            insert_query = f"INSERT INTO {table_name} ({', '.join(df.columns)}) VALUES ({', '.join('?' * len(df.columns))})"
-            conn.execute(insert_query, tuple(row))
-            st.write(f"Row with {primary_key}={primary_key_value} inserted.")
-
-# Function to create a new table based on the dataframe and primary key selection
-def create_table_from_df(conn, df, table_name, primary_key):
-    # Build the SQL column definitions
-    columns = [f"{col} {map_dtype(df[col].dtype)}" for col in df.columns]
-    
-    # Define the primary key column
-    if primary_key in df.columns:
-        columns = [f"{col} PRIMARY KEY" if col == primary_key else col for col in columns]
-    
-    # Join the column definitions into a CREATE TABLE statement
-    columns_def = ", ".join(columns)
-    create_table_query = f"CREATE TABLE {table_name} ({columns_def});"
-    
-    # Execute the query
-    conn.execute(create_table_query)
-    st.success(f"Table '{table_name}' created successfully with primary key '{primary_key}'.")
+        st.error(f"Import failed: {job.error}")
+
+# Shows the inferred column types of the preview and asks how the new table should be laid out
+def Table_layout_options(df):
+    with st.expander("Column types and table layout"):
+        dates = st.selectbox("Store dates as:", list(DATE_STORAGE), format_func=DATE_STORAGE.get)
+        layout = st.selectbox("Layout:", list(TABLE_LAYOUTS), format_func=TABLE_LAYOUTS.get,
+                              help="Automatic uses WITHOUT ROWID for narrow tables keyed on a non-integer column.")
+        strict = st.checkbox("STRICT table", disabled=not STRICT_TABLES_SUPPORTED,
+                             help="Rejects values that don't match the column type instead of storing them as they are.")
+        types = infer_column_types(df, dates=dates)
+        st.caption("Types inferred from the preview; the import infers them again from its first batch.")
+        st.dataframe(pd.DataFrame([{"column": col, "holds": info["kind"], "type": info["type"]} for col, info in types.items()]),
+                     hide_index=True)
+    return {"strict": strict, "layout": layout, "dates": dates}
 
 # Main app function
 def main():
     st.title("Excel to SQLite Database")
 
     # File uploader
-    uploaded_file = st.file_uploader("Upload Excel file", type=["xlsx"])
+    uploaded_file = st.file_uploader("Upload Excel, CSV or Parquet file", type=["xlsx", "csv", "parquet"])
 
     if uploaded_file:
-        # Read the uploaded Excel file
-        df = pd.read_excel(uploaded_file)
+        # Only the first rows are parsed here, the full file is streamed when importing. The hash and preview are
+        # kept for this upload, so widget changes don't read the file again.
+        upload = st.session_state.get('upload')
+        if upload is None or upload["file_id"] != uploaded_file.file_id:
+            file_sha256 = upload_sha256(uploaded_file)
+            upload = {"file_id": uploaded_file.file_id, "sha256": file_sha256, "preview": read_upload_preview(uploaded_file, file_sha256=file_sha256)}
+            st.session_state.upload = upload
+        df = upload["preview"]
 
         # Display the uploaded data
-        st.write("Preview of uploaded data:")
+        st.write(f"Preview of uploaded data (first {len(df)} rows):")
         st.dataframe(df)
 
         # Connect to the SQLite database
-        db_file = "admin.db"
-        conn = sqlite3.connect(db_file)
-
-        # Get the list of tables in the database
-        table_names = pd.read_sql_query("SELECT name FROM sqlite_master WHERE type='table';", conn)
-        
-        # Check if there's a matching table based on column names
-        matching_table = None
-        for table_name in table_names['name']:
-            existing_columns = [col[1] for col in conn.execute(f"PRAGMA table_info({table_name});")]
-            new_columns = df.columns.tolist()
-
-            if set(existing_columns) == set(new_columns):
-                matching_table = table_name
-                break
+        conn = get_connection()
+
+        # Check if there's a matching table based on column names (looked up in the cached schema catalog)
+        matching_tables = find_tables_with_columns(conn, df.columns)
+        matching_table = matching_tables[0] if matching_tables else None
 
         if matching_table:
             # If a matching table is found, ask for the primary key to use for updates
-            st.write(f"Table '{matching_table}' matches the columns of the Excel file.")
+            st.write(f"Table '{matching_table}' matches the columns of the uploaded file.")
             primary_key = st.selectbox("Select the primary key for the existing table:", df.columns)
+            incremental = st.checkbox("Only write new and changed rows", value=True,
+                                      help="Compares a hash of every row with the one stored by the previous import.")
+            delete_missing = st.checkbox("Delete rows missing from the file")
 
             if st.button("Update Table"):
-                upsert_data(conn, df, matching_table, primary_key)
+                submit_import_job(uploaded_file, matching_table, primary_key, incremental=incremental, delete_missing=delete_missing,
+                                  file_sha256=upload["sha256"])
         else:
             # If no matching table, ask the user to enter a table name and choose a primary key
             st.write("No matching table found. You can create a new table.")
@@ -113,15 +104,21 @@ def main():
             else:
                 # Ask the user to choose a primary key from the dataframe columns
                 primary_key = st.selectbox("Select the primary key for the new table:", df.columns)
-                
+                table_options = Table_layout_options(df)
+                incremental = st.checkbox("Store row hashes for incremental re-imports", value=True)
+
                 # Create the new table and insert the data
                 if st.button("Create Table and Insert Data"):
-                    create_table_from_df(conn, df, table_name, primary_key)
-                    upsert_data(conn, df, table_name, primary_key)
-
-        # Commit changes and close the connection
-        conn.commit()
-        conn.close()
+                    submit_import_job(uploaded_file, table_name, primary_key, create_table=True, table_options=table_options,
+                                      incremental=incremental, file_sha256=upload["sha256"])
+
+    # Imports run as background jobs, so the page stays usable while they do
+    job = get_job(st.session_state.get('import_job'))
+    if job is None:
+        # Never started, or cleared from the Jobs panel
+        st.session_state.pop('import_job', None)
+    else:
+        st.fragment(Import_job_status, run_every=1 if job.active else None)(job.id, job.active)
 
 if __name__ == "__main__":
     main()
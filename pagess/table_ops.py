@@ -71,8 +71,10 @@ def table_ops_page():
         col_name = st.text_input("Column Name to Remove")
         if st.button("Remove Column"):
             if table_name and col_name:
-                remove_column(table_name, col_name)
+                dropped = remove_column(table_name, col_name)
                 st.success(f"Column '{col_name}' removed from table '{table_name}'.")
+                if dropped:
+                    st.info(f"Dropped {', '.join(dropped)}, which used it.")
             else:
                 st.error("Please provide valid table name and column name.")
 
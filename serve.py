@@ -0,0 +1,28 @@
+import os
+from urllib.parse import urlsplit
+
+# Launcher of the app that also serves the export files from disk: streamlit run serve.py
+# Streamlit keeps a download button's data in memory, so the Jobs panel links exports bigger than
+# SQLITE_GUI_EXPORT_DOWNLOAD_MB to this route instead, where they are streamed from EXPORT_DIR.
+os.environ.setdefault("SQLITE_GUI_EXPORT_URL", "/api/exports")
+
+import streamlit as st
+from starlette.responses import FileResponse, PlainTextResponse
+from starlette.routing import Route
+
+from utils import EXPORT_URL, export_file_path
+
+
+# Sends one export file as an attachment, read from disk in chunks
+async def export_file(request):
+    path = export_file_path(request.path_params["name"])
+    if path is None:
+        return PlainTextResponse("No such export, it may have been removed.", status_code=404)
+    return FileResponse(path, filename=os.path.basename(path))
+
+
+app = st.App(os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py"),
+             routes=[Route(urlsplit(EXPORT_URL).path + "/{name}", export_file)])
+
+if __name__ == "__main__":
+    app.run()
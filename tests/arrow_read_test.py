@@ -0,0 +1,47 @@
+import io
+import os
+import tempfile
+import unittest
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import utils
+
+
+class ArrowBatchesTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_file = os.path.join(self.tmp.name, "test.db")
+        self.conn = utils.open_connection(self.db_file)
+        self.conn.executescript("""
+            CREATE TABLE t (n INTEGER, d NUMERIC, m);
+            INSERT INTO t VALUES (1, 5, 1), (2, 6, 2), (2.75, 5.5, 'x'), (4, 7.5, 3);
+        """)
+
+    def tearDown(self):
+        self.conn.close()
+        self.tmp.cleanup()
+
+    def test_later_batches_widen_the_schema_instead_of_truncating(self):
+        batches = list(utils.iter_record_batches(self.conn, "SELECT * FROM t;", batch_size=2, table_name="t"))
+        self.assertEqual(batches[0].schema.types, [pa.int64(), pa.int64(), pa.int64()])
+        self.assertEqual(batches[-1].schema.types, [pa.float64(), pa.float64(), pa.string()])
+        self.assertEqual(batches[1].column(0).to_pylist(), [2.75, 4.0])
+
+    def test_dataframe_keeps_real_values_of_an_integer_column(self):
+        df = utils.read_dataframe(self.conn, "SELECT * FROM t;", table_name="t")
+        self.assertEqual(df["n"].tolist(), [1.0, 2.0, 2.75, 4.0])
+        self.assertEqual(df["m"].tolist(), ["1", "2", "x", "3"])
+
+    def test_parquet_export_starts_over_with_the_wider_schema(self):
+        out_file = io.BytesIO()
+        rows = utils.export_table_arrow(self.db_file, "t", out_file, "parquet", batch_size=2)
+        self.assertEqual(rows, 4)
+        table = pq.read_table(io.BytesIO(out_file.getvalue()))
+        self.assertEqual(table.column("d").to_pylist(), [5.0, 6.0, 5.5, 7.5])
+        self.assertEqual(table.column("n").to_pylist(), [1.0, 2.0, 2.75, 4.0])
+
+
+if __name__ == "__main__":
+    unittest.main()
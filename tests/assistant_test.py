@@ -0,0 +1,31 @@
+import unittest
+from unittest import mock
+
+import utils
+
+
+class GeminiClientTest(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(utils, "_new_gemini_client", side_effect=lambda *key: object())
+        self.new_client = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(utils._gemini_clients.clear)
+        utils._gemini_clients.clear()
+
+    def test_client_is_built_once_per_model_and_settings(self):
+        options = {"model": "gemini-pro", "api_key": "k", "temperature": 0.2}
+        client = utils.gemini_client(options)
+        self.assertIs(utils.gemini_client(dict(options)), client)
+        self.assertIsNot(utils.gemini_client({**options, "temperature": 0.7}), client)
+        self.assertEqual(self.new_client.call_count, 2)
+
+    def test_oldest_clients_are_dropped_over_the_limit(self):
+        for temperature in range(utils.MAX_GEMINI_CLIENTS + 2):
+            utils.gemini_client({"temperature": temperature})
+        self.assertEqual(len(utils._gemini_clients), utils.MAX_GEMINI_CLIENTS)
+        utils.gemini_client({"temperature": 0})
+        self.assertEqual(self.new_client.call_count, utils.MAX_GEMINI_CLIENTS + 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+import utils
+
+
+class SharedConnectionsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_file = os.path.join(self.tmp.name, "test.db")
+
+    def tearDown(self):
+        utils.close_connections()
+        self.tmp.cleanup()
+
+    def test_connections_of_exited_threads_are_closed(self):
+        opened = []
+        thread = threading.Thread(target=lambda: opened.append(utils.get_connection(self.db_file)))
+        thread.start()
+        thread.join()
+
+        conn = utils.get_connection(self.db_file)
+        self.assertIs(utils.get_connection(self.db_file), conn)
+        with self.assertRaises(sqlite3.ProgrammingError):
+            opened[0].execute("SELECT 1;")
+        self.assertEqual(len(utils._connections), 1)
+
+    def test_switching_database_closes_the_previous_connection(self):
+        other_file = os.path.join(self.tmp.name, "other.db")
+        utils.set_active_database(self.db_file)
+        conn = utils.get_connection()
+        utils.set_active_database(other_file)
+        with self.assertRaises(sqlite3.ProgrammingError):
+            conn.execute("SELECT 1;")
+        self.assertEqual(utils.get_database_file(utils.get_connection()), os.path.abspath(other_file))
+        utils.set_active_database(utils.DB_PATH)
+
+
+if __name__ == "__main__":
+    unittest.main()
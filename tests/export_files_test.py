@@ -0,0 +1,52 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import utils
+
+
+class ExportFilesTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        patcher = mock.patch.multiple(utils, EXPORT_DIR=self.tmp.name, EXPORT_MAX_AGE=3600, EXPORT_MAX_BYTES=250)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def export(self, name, size, age=0):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, "wb") as f:
+            f.write(b"x" * size)
+        os.utime(path, (time.time() - age, time.time() - age))
+        return path
+
+    def test_old_exports_then_the_oldest_over_the_size_limit_are_removed(self):
+        self.export("old.csv", 10, age=7200)
+        self.export("a.csv", 100, age=30)
+        self.export("b.csv", 100, age=20)
+        self.export("c.csv", 100, age=10)
+        path = utils.new_export_path("t.csv")
+        self.assertEqual(sorted(os.listdir(self.tmp.name)), sorted(["b.csv", "c.csv", os.path.basename(path)]))
+        self.assertTrue(path.endswith("-t.csv"))
+
+    def test_clearing_a_job_deletes_its_export(self):
+        path = self.export("t.csv", 10)
+        job = utils.submit_job("export", lambda job: setattr(job, "download", {"path": path}), db_file=os.path.join(self.tmp.name, "t.db"))
+        job.future.result()
+        utils.clear_finished_jobs()
+        self.assertIsNone(utils.get_job(job.id))
+        self.assertFalse(os.path.exists(path))
+
+    def test_only_files_right_in_the_export_folder_are_served(self):
+        self.export("t.csv", 10)
+        self.assertEqual(utils.export_file_path("t.csv"), os.path.join(self.tmp.name, "t.csv"))
+        for name in ("../t.csv", "missing.csv", "", ".hidden"):
+            self.assertIsNone(utils.export_file_path(name))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import utils
+
+
+class IncrementalImportTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache_dir = utils.UPLOAD_CACHE_DIR
+        utils.UPLOAD_CACHE_DIR = os.path.join(self.tmp.name, "cache")
+        self.conn = utils.open_connection(os.path.join(self.tmp.name, "test.db"))
+
+    def tearDown(self):
+        self.conn.close()
+        utils.UPLOAD_CACHE_DIR = self.cache_dir
+        self.tmp.cleanup()
+
+    def import_csv(self, text, **options):
+        path = os.path.join(self.tmp.name, "items.csv")
+        with open(path, "w") as f:
+            f.write(text)
+        with utils.LocalUpload(path) as upload:
+            create_table = not utils.check_table_exists(self.conn, "items")
+            return utils.import_upload(self.conn, upload, "items", "id", create_table=create_table, **options)
+
+    def rows(self):
+        return self.conn.execute("SELECT id, name FROM items ORDER BY id;").fetchall()
+
+    def test_delete_missing_removes_rows_not_in_the_upload(self):
+        self.import_csv("id,name\n1,a\n2,b\n3,c\n", incremental=True)
+        summary = self.import_csv("id,name\n1,a\n3,C\n", incremental=True, delete_missing=True)
+        self.assertEqual(summary, {"inserted": 0, "updated": 1, "unchanged": 1, "deleted": 1})
+        self.assertEqual(self.rows(), [(1, "a"), (3, "C")])
+        keys = self.conn.execute(f"SELECT key FROM {utils.ROW_FINGERPRINTS_TABLE} ORDER BY key;").fetchall()
+        self.assertEqual(keys, [(1,), (3,)])
+
+    def test_delete_missing_ignores_null_keys_in_the_upload(self):
+        # A table made outside the app, whose key may be NULL
+        self.conn.execute("CREATE TABLE items (id TEXT PRIMARY KEY, name TEXT);")
+        self.import_csv("id,name\na,1\nb,2\nc,3\n")
+        summary = self.import_csv("id,name\na,1\n,4\n", delete_missing=True)
+        self.assertEqual(summary["deleted"], 2)
+        self.assertEqual(self.conn.execute("SELECT id FROM items WHERE id IS NOT NULL;").fetchall(), [("a",)])
+
+    def test_fingerprint_tables_are_not_listed_as_user_tables(self):
+        self.import_csv("id,name\n1,a\n", incremental=True)
+        self.assertEqual(list(utils.get_schema_catalog(self.conn)["tables"]), ["items"])
+
+    def test_rows_changed_elsewhere_only_cost_their_own_writes(self):
+        self.import_csv("id,name\n1,a\n2,b\n3,c\n", incremental=True)
+        self.conn.execute("INSERT INTO items VALUES (9, 'outside');")
+        self.conn.execute("DELETE FROM items WHERE id = 2;")
+        self.conn.commit()
+
+        for text in ("id,name\n1,a\n2,b\n3,C\n", "id,name\n1,a\n2,b\n3,D\n"):
+            with mock.patch.object(utils, "upsert_data", wraps=utils.upsert_data) as upsert:
+                summary = self.import_csv(text, incremental=True)
+            # Only the deleted row and the edited one are written, every import
+            self.assertEqual(sum(len(call.args[1]) for call in upsert.call_args_list), 2 if text.endswith("C\n") else 1)
+        self.assertEqual(summary, {"inserted": 0, "updated": 1, "unchanged": 2, "deleted": 0})
+        self.assertEqual(self.rows(), [(1, "a"), (2, "b"), (3, "D"), (9, "outside")])
+
+    def test_unchanged_file_is_skipped(self):
+        self.import_csv("id,name\n1,a\n2,b\n", incremental=True)
+        summary = self.import_csv("id,name\n1,a\n2,b\n", incremental=True)
+        self.assertEqual(summary, {"inserted": 0, "updated": 0, "unchanged": 2, "deleted": 0})
+
+
+if __name__ == "__main__":
+    unittest.main()
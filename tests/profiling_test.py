@@ -0,0 +1,35 @@
+import os
+import tempfile
+import unittest
+
+import utils
+
+
+class SampledProfileTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.conn = utils.open_connection(os.path.join(self.tmp.name, "test.db"))
+        self.conn.execute("CREATE TABLE t (v INTEGER);")
+        self.conn.executemany("INSERT INTO t VALUES (?);", ((i % 100,) for i in range(20000)))
+        self.conn.commit()
+
+    def tearDown(self):
+        self.conn.close()
+        self.tmp.cleanup()
+
+    def test_sample_of_periodic_data_sees_most_values(self):
+        # One probe every 20 rowids: probes at a fixed phase would only ever see 5 of the 100 values
+        profile = utils.profile_table(self.conn, "t", sample_rows=1000)
+        self.assertTrue(profile["sampled"])
+        self.assertEqual(profile["rows"], 1000)
+        self.assertGreater(profile["columns"]["distinct"][0], 90)
+
+    def test_sample_is_the_same_until_the_table_changes(self):
+        first = utils.profile_column(self.conn, "t", "v", sample_rows=1000)
+        again = utils.profile_column(self.conn, "t", "v", sample_rows=1000, refresh=True)
+        self.assertEqual(first["top_values"].to_dict(), again["top_values"].to_dict())
+        self.assertEqual(first["histogram"]["count"].sum(), 1000)
+
+
+if __name__ == "__main__":
+    unittest.main()
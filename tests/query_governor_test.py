@@ -0,0 +1,55 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+import utils
+
+
+class QueryGovernorTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.conn = utils.open_connection(os.path.join(self.tmp.name, "test.db"))
+        self.conn.executescript("""
+            PRAGMA auto_vacuum = INCREMENTAL;
+            CREATE TABLE t (id INTEGER PRIMARY KEY, name TEXT);
+            INSERT INTO t VALUES (1, 'a'), (2, 'b');
+        """)
+
+    def tearDown(self):
+        self.conn.close()
+        self.tmp.cleanup()
+
+    def run_query(self, query, **kwargs):
+        stats = {}
+        frames = list(utils.run_governed(self.conn, query, stats=stats, **kwargs))
+        return frames, stats
+
+    def test_read_only_allows_pragmas_that_read(self):
+        for query in ("PRAGMA table_info(t);", "PRAGMA user_version;", "PRAGMA main.page_count;", "PRAGMA integrity_check;"):
+            with self.subTest(query=query):
+                frames, stats = self.run_query(query)
+                self.assertGreater(stats["rows"], 0)
+
+    def test_read_only_refuses_pragmas_that_act_without_an_argument(self):
+        for query in ("PRAGMA optimize;", "PRAGMA incremental_vacuum;", "PRAGMA wal_checkpoint;", "PRAGMA user_version = 3;"):
+            with self.subTest(query=query):
+                with self.assertRaisesRegex(sqlite3.DatabaseError, "Read-only mode"):
+                    self.run_query(query)
+
+    def test_write_returning_rows_is_committed(self):
+        frames, stats = self.run_query("INSERT INTO t (name) VALUES ('c'), ('d') RETURNING id;", read_only=False, max_rows=1)
+        self.assertEqual(stats["rows"], 1)
+        self.assertTrue(stats["truncated"])
+        self.assertFalse(self.conn.in_transaction)
+        self.assertEqual(self.conn.execute("SELECT count(*) FROM t;").fetchone()[0], 4)
+
+    def test_write_stopped_part_way_is_rolled_back(self):
+        query = "INSERT INTO t (name) SELECT 'x' FROM (WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) SELECT i FROM n);"
+        with self.assertRaises(utils.QueryStoppedError):
+            self.run_query(query, read_only=False, timeout=0.2)
+        self.assertEqual(self.conn.execute("SELECT count(*) FROM t;").fetchone()[0], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+import utils
+
+
+class RemoveColumnTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.conn = utils.open_connection(os.path.join(self.tmp.name, "test.db"))
+
+    def tearDown(self):
+        self.conn.close()
+        self.tmp.cleanup()
+
+    def table_sql(self, name):
+        return self.conn.execute("SELECT sql FROM sqlite_master WHERE name = ?;", (name,)).fetchone()[0]
+
+    def test_rebuild_keeps_rowids_generated_columns_and_autoincrement(self):
+        self.conn.executescript("""
+            CREATE TABLE g (id INTEGER PRIMARY KEY AUTOINCREMENT, a TEXT UNIQUE, b TEXT COLLATE NOCASE CHECK (length(b) < 10),
+                            c TEXT GENERATED ALWAYS AS (upper(b)) VIRTUAL);
+            INSERT INTO g (id, a, b) VALUES (1, 'x', 'one'), (2, 'y', 'two'), (3, 'z', 'three');
+            DELETE FROM g WHERE id IN (1, 3);
+        """)
+        # "a" is UNIQUE, so ALTER TABLE DROP COLUMN refuses it and the table is rebuilt
+        utils.remove_column("g", "a", conn=self.conn)
+
+        sql = self.table_sql("g")
+        self.assertIn("AUTOINCREMENT", sql)
+        self.assertIn("COLLATE NOCASE", sql)
+        self.assertIn("CHECK (length(b) < 10)", sql)
+        self.assertIn("GENERATED ALWAYS AS (upper(b))", sql)
+        self.assertNotIn('"a"', sql.replace('"g"', ''))
+        self.assertEqual(self.conn.execute("SELECT rowid, id, b, c FROM g;").fetchall(), [(2, 2, "two", "TWO")])
+        self.assertEqual(self.conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'g';").fetchone(), (3,))
+
+    def test_rebuild_keeps_rowids_of_tables_without_integer_key(self):
+        self.conn.executescript("""
+            CREATE TABLE r (k TEXT PRIMARY KEY, v TEXT);
+            INSERT INTO r VALUES ('a', '1'), ('b', '2'), ('c', '3');
+            DELETE FROM r WHERE k = 'a';
+        """)
+        utils.remove_column("r", "k", conn=self.conn)
+        self.assertEqual(self.conn.execute("SELECT rowid, v FROM r ORDER BY rowid;").fetchall(), [(2, "2"), (3, "3")])
+
+    def test_without_rowid_primary_key_column_is_refused_before_any_change(self):
+        self.conn.execute("CREATE TABLE w (k TEXT PRIMARY KEY, v TEXT) WITHOUT ROWID;")
+        before = self.table_sql("w")
+        with self.assertRaisesRegex(ValueError, "WITHOUT ROWID"):
+            utils.remove_column("w", "k", conn=self.conn)
+        self.assertEqual(self.table_sql("w"), before)
+
+    def test_column_used_by_another_column_is_refused(self):
+        self.conn.execute("CREATE TABLE u (a INTEGER UNIQUE, b INTEGER GENERATED ALWAYS AS (a * 2));")
+        self.conn.execute("INSERT INTO u (a) VALUES (1);")
+        with self.assertRaises(ValueError):
+            utils.remove_column("u", "a", conn=self.conn)
+        self.assertEqual(self.conn.execute("SELECT a, b FROM u;").fetchall(), [(1, 2)])
+
+    def test_only_indexes_and_triggers_using_the_column_are_dropped(self):
+        self.conn.executescript("""
+            CREATE TABLE t (id INTEGER PRIMARY KEY, a TEXT UNIQUE, b TEXT);
+            CREATE TABLE log (msg TEXT);
+            CREATE INDEX t_b ON t (b);
+            CREATE INDEX t_b_literal ON t (b) WHERE b <> 'a';
+            CREATE TRIGGER t_uses_a AFTER INSERT ON t BEGIN INSERT INTO log VALUES (new.a); END;
+            CREATE TRIGGER t_literal AFTER INSERT ON t BEGIN INSERT INTO log VALUES ('a'); END;
+        """)
+        dropped = utils.remove_column("t", "a", conn=self.conn)
+        self.assertEqual(dropped, ["t_uses_a"])
+        names = {name for name, in self.conn.execute("SELECT name FROM sqlite_master WHERE type IN ('index', 'trigger');")}
+        self.assertEqual(names, {"t_b", "t_b_literal", "t_literal"})
+
+    def test_foreign_keys_to_a_parent_column_of_the_same_name_are_kept(self):
+        self.conn.executescript("""
+            CREATE TABLE parent (a INTEGER PRIMARY KEY);
+            CREATE TABLE child (id INTEGER PRIMARY KEY, a INTEGER UNIQUE, p INTEGER, FOREIGN KEY (p) REFERENCES parent (a));
+        """)
+        utils.remove_column("child", "a", conn=self.conn)
+        self.assertEqual([fk[3:5] for fk in self.conn.execute("PRAGMA foreign_key_list(child);")], [("p", "a")])
+
+    def test_existing_table_named_like_the_copy_is_kept(self):
+        self.conn.executescript("""
+            CREATE TABLE orders (id INTEGER PRIMARY KEY, a TEXT UNIQUE, b TEXT);
+            CREATE TABLE orders_temp (note TEXT);
+            INSERT INTO orders_temp VALUES ('mine');
+        """)
+        utils.remove_column("orders", "a", conn=self.conn)
+        self.assertEqual(self.conn.execute("SELECT note FROM orders_temp;").fetchall(), [("mine",)])
+        names = {name for name, in self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'table';")}
+        self.assertEqual(names, {"orders", "orders_temp"})
+
+    def test_views_on_the_table_are_kept(self):
+        self.conn.executescript("""
+            CREATE TABLE t (id INTEGER PRIMARY KEY, a TEXT UNIQUE, b TEXT);
+            CREATE VIEW v AS SELECT id, b FROM t;
+            INSERT INTO t VALUES (1, 'x', 'y');
+        """)
+        utils.remove_column("t", "a", conn=self.conn)
+        self.assertEqual(self.conn.execute("SELECT * FROM v;").fetchall(), [(1, "y")])
+
+    def test_column_used_by_a_view_is_refused(self):
+        self.conn.executescript("""
+            CREATE TABLE t (id INTEGER PRIMARY KEY, a TEXT UNIQUE, b TEXT);
+            CREATE VIEW v AS SELECT a FROM t;
+        """)
+        before = self.table_sql("t")
+        with self.assertRaisesRegex(ValueError, "view 'v'"):
+            utils.remove_column("t", "a", conn=self.conn)
+        self.assertEqual(self.table_sql("t"), before)
+        self.assertEqual(self.conn.execute("PRAGMA legacy_alter_table;").fetchone(), (0,))
+
+    def test_native_drop_column(self):
+        self.conn.executescript("CREATE TABLE n (id INTEGER PRIMARY KEY, a TEXT, b TEXT); INSERT INTO n VALUES (5, 'x', 'y');")
+        self.assertEqual(utils.remove_column("n", "a", conn=self.conn), [])
+        self.assertEqual(self.conn.execute("SELECT * FROM n;").fetchall(), [(5, "y")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+import utils
+
+
+class RowSearchTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.conn = utils.open_connection(os.path.join(self.tmp.name, "test.db"))
+        self.conn.executescript("""
+            CREATE TABLE items (code TEXT PRIMARY KEY, qty INTEGER, price REAL, note) WITHOUT ROWID;
+            INSERT INTO items VALUES ('007', 12, 1.5, 'x'), ('7', 120, 12.25, 'y'), ('100', 7, 3.0, 'z');
+        """)
+
+    def tearDown(self):
+        self.conn.close()
+        self.tmp.cleanup()
+
+    def codes(self, column, value, match):
+        keys, rows = utils.search_rows(self.conn, "items", ["code"], column, value, match)
+        return sorted(key[0] for key in keys)
+
+    def test_column_affinities(self):
+        self.assertEqual(utils.get_column_affinities(self.conn, "items"),
+                         {"rowid": "INTEGER", "code": "TEXT", "qty": "INTEGER", "price": "REAL", "note": "BLOB"})
+        self.assertEqual(utils.column_affinity("DECIMAL(10,2)"), "NUMERIC")
+        self.assertEqual(utils.column_affinity("VARCHAR(20)"), "TEXT")
+
+    def test_columns_of_views_and_missing_tables(self):
+        self.conn.execute("CREATE VIEW cheap AS SELECT code, price FROM items WHERE price < 5;")
+        self.assertEqual(utils.get_columns_and_types(self.conn, "cheap")["name"].tolist(), ["code", "price"])
+        self.assertTrue(utils.get_columns_and_types(self.conn, "missing").empty)
+        self.assertTrue(utils.get_columns_and_types(self.conn, None).empty)
+
+    def test_text_key_keeps_leading_zeros(self):
+        self.assertEqual(self.codes("code", "007", "equals"), ["007"])
+        self.assertEqual(self.codes("code", "00", "starts with"), ["007"])
+
+    def test_prefix_search_on_numeric_columns_matches_their_text(self):
+        self.assertEqual(self.codes("qty", "12", "starts with"), ["007", "7"])
+        self.assertEqual(self.codes("price", "12.", "starts with"), ["7"])
+        self.assertEqual(self.codes("qty", 7, "equals"), ["100"])
+
+
+class BulkEditTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_file = os.path.join(self.tmp.name, "test.db")
+        self.conn = utils.open_connection(self.db_file)
+        self.conn.executescript("""
+            CREATE TABLE t (name TEXT, qty INTEGER, note TEXT DEFAULT 'new');
+            INSERT INTO t (name, qty, note) VALUES ('a', 1, NULL), ('b', 2, 'x'), ('c', 3, 'y');
+        """)
+        self.key_columns = utils.get_page_key(self.conn, "t")
+        self.keys, self.original = utils.fetch_page_with_keys(self.conn, "t", self.key_columns, None, 100, "first")
+
+    def tearDown(self):
+        self.conn.close()
+        self.tmp.cleanup()
+
+    # Function to mimic the grid: every loaded row with its position, then the added rows
+    def grid(self, rows, added=()):
+        edited = self.original.copy()
+        edited.insert(0, "_row", range(len(edited)))
+        edited = edited.iloc[rows].copy()
+        added = pd.DataFrame([{"_row": None, **row} for row in added], columns=edited.columns)
+        return pd.concat([edited, added], ignore_index=True) if len(added) else edited
+
+    def rows(self):
+        return self.conn.execute("SELECT rowid, name, qty, note FROM t ORDER BY rowid;").fetchall()
+
+    def test_diff_and_apply_inserts_updates_and_deletes_together(self):
+        edited = self.grid([0, 1], added=[{"name": "d", "qty": 4}])
+        edited.loc[1, "qty"] = 20
+        changes = utils.diff_page_edits(self.keys, self.original, edited)
+        self.assertEqual(changes["inserted"], [{"name": "d", "qty": 4, "note": None}])
+        self.assertEqual([(key, changed) for key, changed, _ in changes["updated"]], [((2,), {"qty": 20})])
+        self.assertEqual([key for key, _ in changes["deleted"]], [(3,)])
+
+        applied = utils.apply_page_edits(self.conn, "t", self.key_columns, changes)
+        self.assertEqual(applied, {"inserted": 1, "updated": 1, "deleted": 1})
+        # The added row only names the filled in columns, so the column default applies
+        self.assertEqual(self.rows(), [(1, "a", 1, None), (2, "b", 20, "x"), (3, "d", 4, "new")])
+
+    def test_row_changed_by_someone_else_is_a_conflict_and_nothing_is_written(self):
+        other = utils.open_connection(self.db_file)
+        other.execute("UPDATE t SET note = 'theirs' WHERE name = 'a';")
+        other.commit()
+        other.close()
+        before = self.rows()
+
+        edited = self.grid([0, 1, 2], added=[{"name": "d", "qty": 4}])
+        edited.loc[0, "qty"] = 10
+        edited.loc[1, "qty"] = 20
+        with self.assertRaises(utils.EditConflictError):
+            utils.apply_page_edits(self.conn, "t", self.key_columns, utils.diff_page_edits(self.keys, self.original, edited))
+        self.assertEqual(self.rows(), before)
+        self.assertFalse(self.conn.in_transaction)
+
+    def test_deleting_a_row_deleted_by_someone_else_is_a_conflict(self):
+        self.conn.execute("DELETE FROM t WHERE name = 'c';")
+        self.conn.commit()
+        changes = utils.diff_page_edits(self.keys, self.original, self.grid([0, 1]))
+        with self.assertRaises(utils.EditConflictError):
+            utils.apply_page_edits(self.conn, "t", self.key_columns, changes)
+
+    def test_null_values_that_were_not_edited_still_match(self):
+        edited = self.grid([0, 1, 2])
+        edited.loc[0, "name"] = "A"
+        utils.apply_page_edits(self.conn, "t", self.key_columns, utils.diff_page_edits(self.keys, self.original, edited))
+        self.assertEqual(self.rows()[0], (1, "A", 1, None))
+
+
+if __name__ == "__main__":
+    unittest.main()
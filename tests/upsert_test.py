@@ -0,0 +1,51 @@
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+import utils
+
+
+class UpsertTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.conn = utils.open_connection(os.path.join(self.tmp.name, "test.db"))
+        self.conn.executescript("""
+            CREATE TABLE keyed (id INTEGER PRIMARY KEY, name TEXT);
+            CREATE TABLE plain (id TEXT, name TEXT);
+            INSERT INTO keyed VALUES (1, 'a'), (2, 'b');
+            INSERT INTO plain VALUES ('1', 'a'), ('2', 'b');
+        """)
+
+    def tearDown(self):
+        self.conn.close()
+        self.tmp.cleanup()
+
+    def test_counts_inserted_updated_and_unchanged_rows(self):
+        df = pd.DataFrame({"id": [1, 2, 3], "name": ["a", "B", "c"]})
+        for table in ("keyed", "plain"):
+            with self.subTest(table=table):
+                summary = utils.upsert_data(self.conn, df, table, "id")
+                self.assertEqual(summary, {"inserted": 1, "updated": 1, "unchanged": 1})
+                rows = self.conn.execute(f"SELECT CAST(id AS INTEGER), name FROM {table} ORDER BY 1;").fetchall()
+                self.assertEqual(rows, [(1, "a"), (2, "B"), (3, "c")])
+
+    def test_repeated_key_counts_once_and_its_last_row_wins(self):
+        df = pd.DataFrame({"id": [3, 3, 2, 2], "name": ["x", "y", "b", "z"]})
+        for table in ("keyed", "plain"):
+            with self.subTest(table=table):
+                summary = utils.upsert_data(self.conn, df, table, "id")
+                self.assertEqual(summary, {"inserted": 1, "updated": 1, "unchanged": 0})
+                rows = self.conn.execute(f"SELECT CAST(id AS INTEGER), name FROM {table} ORDER BY 1;").fetchall()
+                self.assertEqual(rows, [(1, "a"), (2, "z"), (3, "y")])
+
+    def test_keys_equal_after_type_affinity_are_one_key(self):
+        df = pd.DataFrame({"id": [4, "4"], "name": ["x", "y"]})
+        summary = utils.upsert_data(self.conn, df, "plain", "id")
+        self.assertEqual(summary, {"inserted": 1, "updated": 0, "unchanged": 0})
+        self.assertEqual(self.conn.execute("SELECT name FROM plain WHERE id = '4';").fetchall(), [("y",)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,49 +1,937 @@
+import atexit
+import collections
+import concurrent.futures
+import contextlib
+import csv
+import gzip
+import hashlib
+import io
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import random
+import re
 import sqlite3
-import streamlit as st
+import tempfile
+import threading
+import time
 import pandas as pd
 
 
 
+# ============================================= Connection management ======================================
+
+# Database file used by the app, override it with the SQLITE_GUI_DB environment variable
+DB_PATH = os.environ.get("SQLITE_GUI_DB", "admin.db")
+
+# PRAGMAs applied to every connection when it is opened
+# Each one can be overridden with an environment variable, e.g. SQLITE_GUI_SYNCHRONOUS=FULL
+PRAGMA_SETTINGS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -64000,        # negative means KiB, so about 64 MB of page cache
+    "mmap_size": 268435456,      # 256 MB memory-mapped I/O
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,        # milliseconds to wait on a locked database
+}
+for _pragma in PRAGMA_SETTINGS:
+    PRAGMA_SETTINGS[_pragma] = os.environ.get(f"SQLITE_GUI_{_pragma.upper()}", PRAGMA_SETTINGS[_pragma])
+
+# Database each session works on (see the Workspace page), DB_PATH until one is picked
+_active_databases = {}
+
+# Open connections, one per (streamlit session or thread, database file)
+_connections = {}
+_connections_lock = threading.Lock()
+
+# Function to open a new connection with the tuning PRAGMAs applied
+def open_connection(db_file=None, check_same_thread=True):
+    factory = InstrumentedConnection if INSTRUMENT_QUERIES else sqlite3.Connection
+    conn = sqlite3.connect(db_file or get_active_database(), check_same_thread=check_same_thread, factory=factory)
+    for pragma, value in PRAGMA_SETTINGS.items():
+        conn.execute(f"PRAGMA {pragma} = {value};")
+    return conn
+
+# Function to identify the caller: the streamlit session when running in the app, the thread otherwise
+def _connection_owner():
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx(suppress_warning=True)
+        if ctx is not None:
+            return ctx.session_id
+    except ImportError:
+        pass
+    return threading.get_ident()
+
+# Function to get the database file the caller works on
+def get_active_database():
+    return _active_databases.get(_connection_owner(), DB_PATH)
+
+# Function to switch the caller to another database file, closing its connections to the previous one
+def set_active_database(db_file):
+    owner = _connection_owner()
+    previous = _active_databases.get(owner, DB_PATH)
+    _active_databases[owner] = db_file
+    if os.path.abspath(previous) != os.path.abspath(db_file):
+        close_connections(owner)
+
+# Function to tell whether the owner of shared connections is still around: a connected session or a running thread
+def _owner_alive(owner):
+    if isinstance(owner, str):
+        try:
+            from streamlit.runtime import Runtime
+        except ImportError:
+            return True
+        return not Runtime.exists() or Runtime.instance().is_active_session(owner)
+    return any(thread.ident == owner for thread in threading.enumerate())
+
+# Function to get the caller's shared connection, opening it on first use
+# Streamlit reruns run on new threads, so session connections are not tied to a thread.
+def get_connection(db_file=None):
+    db_file = db_file or get_active_database()
+    key = (_connection_owner(), os.path.abspath(db_file))
+    with _connections_lock:
+        conn = _connections.get(key)
+        if conn is not None:
+            try:
+                conn.total_changes
+            except sqlite3.ProgrammingError:
+                # Someone closed it, open a fresh one
+                conn = None
+        if conn is None:
+            # Sessions that ended and threads that exited never say so, their connections are closed here
+            for dead_key in [k for k in _connections if not _owner_alive(k[0])]:
+                _connections.pop(dead_key).close()
+            conn = open_connection(db_file, check_same_thread=False)
+            _connections[key] = conn
+    return conn
+
+# Function to close the shared connections of one owner, or all of them (e.g. before deleting a database file)
+def close_connections(owner=None):
+    with _connections_lock:
+        for key in [k for k in _connections if owner is None or k[0] == owner]:
+            _connections.pop(key).close()
+
+# Closing the connections at exit checkpoints the WAL into the database file
+atexit.register(close_connections)
+
+
+# ============================================= Query instrumentation ======================================
+
+# Every statement run through a connection from open_connection() is timed and logged, unless SQLITE_GUI_INSTRUMENT=0
+INSTRUMENT_QUERIES = os.environ.get("SQLITE_GUI_INSTRUMENT", "1") != "0"
+
+# Default threshold of the slow query log, in milliseconds
+SLOW_QUERY_MS = float(os.environ.get("SQLITE_GUI_SLOW_QUERY_MS", 100))
+
+# Most recent statements (process-wide), oldest ones are dropped first
+QUERY_LOG_SIZE = 5000
+_query_log = collections.deque(maxlen=QUERY_LOG_SIZE)
+
+# The page that is running, for the current thread
+_query_context = threading.local()
+
+# Function to tag the statements run by this thread with the page that runs them
+def set_query_page(page):
+    _query_context.page = page
+
+# Function to turn a statement into its normalized form: literals become ?, whitespace is collapsed
+def normalize_query(sql):
+    sql = re.sub(r"'(?:[^']|'')*'", "?", sql)
+    sql = re.sub(r"\b\d+(?:\.\d+)?\b", "?", sql)
+    sql = re.sub(r"\(\s*\?(?:\s*,\s*\?)+\s*\)", "(?, ...)", sql)
+    return " ".join(sql.split())
+
+# Function to add a statement to the query log
+def record_query(sql, duration_ms, rows_affected=None):
+    record = {
+        "time": time.time(),
+        "query": normalize_query(sql),
+        "sql": sql[:1000],
+        "duration_ms": duration_ms,
+        "rows_returned": 0,
+        "rows_affected": rows_affected,
+        "page": getattr(_query_context, "page", ""),
+    }
+    _query_log.append(record)
+    return record
+
+# Cursor that times execute/executemany/executescript and counts the rows fetched afterwards
+class InstrumentedCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        return self._timed(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._timed(super().executemany, sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self._timed(lambda sql, _: super(InstrumentedCursor, self).executescript(sql), sql_script, None)
+
+    def _timed(self, method, sql, parameters):
+        start = time.perf_counter()
+        try:
+            return method(sql, parameters)
+        finally:
+            duration_ms = (time.perf_counter() - start) * 1000
+            self._record = record_query(sql, duration_ms, self.rowcount if self.rowcount >= 0 else None)
+
+    # Rows are produced while fetching, so fetch time is added to the statement's duration
+    def _fetched(self, rows, start):
+        record = getattr(self, "_record", None)
+        if record is not None:
+            record["duration_ms"] += (time.perf_counter() - start) * 1000
+            record["rows_returned"] += rows
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(0 if row is None else 1, start)
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._fetched(len(rows), start)
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(len(rows), start)
+        return rows
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._fetched(0, start)
+            raise
+        self._fetched(1, start)
+        return row
+
+# Connection whose cursors (including the ones behind conn.execute and pandas.read_sql) are instrumented
+# Commits and rollbacks are timed here too. No trace callback is used: it would run once per row of an executemany.
+class InstrumentedConnection(sqlite3.Connection):
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def commit(self):
+        self._timed_end("COMMIT", super().commit)
+
+    def rollback(self):
+        self._timed_end("ROLLBACK", super().rollback)
+
+    # Ending a transaction can take a while (e.g. the WAL write of a big COMMIT); nothing is logged without one
+    def _timed_end(self, sql, method):
+        if not self.in_transaction:
+            return method()
+        start = time.perf_counter()
+        try:
+            return method()
+        finally:
+            record_query(sql, (time.perf_counter() - start) * 1000)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+# Function to get a copy of the query log, oldest first
+def get_query_log():
+    return list(_query_log)
+
+# Function to clear the query log
+def clear_query_log():
+    _query_log.clear()
+
+# Function to summarize the timed statements of the log: count, p50/p95/max latency and rows per normalized query
+def query_stats(records=None):
+    log = pd.DataFrame([r for r in (records if records is not None else get_query_log()) if r["duration_ms"] is not None],
+                       columns=["query", "duration_ms", "rows_returned", "rows_affected", "page"])
+    if log.empty:
+        return pd.DataFrame(columns=["query", "count", "p50_ms", "p95_ms", "max_ms", "total_ms", "rows_returned", "pages"])
+    grouped = log.groupby("query")
+    stats = pd.DataFrame({
+        "count": grouped["duration_ms"].count(),
+        "p50_ms": grouped["duration_ms"].quantile(0.5),
+        "p95_ms": grouped["duration_ms"].quantile(0.95),
+        "max_ms": grouped["duration_ms"].max(),
+        "total_ms": grouped["duration_ms"].sum(),
+        "rows_returned": grouped["rows_returned"].sum(),
+        "pages": grouped["page"].agg(lambda pages: ", ".join(sorted({p for p in pages if p}))),
+    }).reset_index()
+    return stats.sort_values("total_ms", ascending=False, ignore_index=True)
+
+# Function to list the statements that took at least `threshold_ms`, slowest first
+def slow_queries(threshold_ms=SLOW_QUERY_MS, records=None):
+    slow = [r for r in (records if records is not None else get_query_log()) if r["duration_ms"] is not None and r["duration_ms"] >= threshold_ms]
+    return sorted(slow, key=lambda r: -r["duration_ms"])
+
+# Function to write the query log as JSON lines
+def export_query_log_jsonl(records=None):
+    return "".join(json.dumps(r, default=str) + "\n" for r in (records if records is not None else get_query_log()))
+
+
+# ============================================= Schema catalog =============================================
+
+# Cached schema of each database file, rebuilt only when PRAGMA schema_version changes
+_schema_catalogs = {}
+_schema_catalogs_lock = threading.Lock()
+
+# Function to find the file behind a connection, used as the catalog cache key ('' for in-memory databases)
+def get_database_file(conn):
+    return conn.execute("PRAGMA database_list;").fetchone()[2]
+
+# Trailing table options of a CREATE TABLE statement, e.g. ") STRICT, WITHOUT ROWID"
+_TABLE_OPTIONS = re.compile(r"\)\s*((?:STRICT|WITHOUT\s+ROWID)(?:\s*,\s*(?:STRICT|WITHOUT\s+ROWID))*)\s*;?\s*$", re.IGNORECASE)
+
+# Function to read tables, columns, keys and indexes from the database in one go
+def _build_schema_catalog(conn, schema_version):
+    tables = {}
+    column_sets = {}
+    rows = conn.execute("SELECT name, sql FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%' ORDER BY rowid;").fetchall()
+    for table_name, sql in rows:
+        if table_name in INTERNAL_TABLES:
+            continue
+        quoted = quote_ident(table_name)
+        match = _TABLE_OPTIONS.search(sql or "")
+        options = {" ".join(option.upper().split()) for option in match.group(1).split(",")} if match else set()
+        columns = [
+            {"name": col[1], "type": col[2], "notnull": bool(col[3]), "default": col[4], "pk": col[5]}
+            for col in conn.execute(f"PRAGMA table_info({quoted});")
+        ]
+        indexes = []
+        for index in conn.execute(f"PRAGMA index_list({quoted});").fetchall():
+            index_columns = [info[2] for info in conn.execute(f"PRAGMA index_info({quote_ident(index[1])});")]
+            indexes.append({"name": index[1], "unique": bool(index[2]), "origin": index[3], "partial": bool(index[4]), "columns": index_columns})
+        foreign_keys = [
+            {"column": fk[3], "ref_table": fk[2], "ref_column": fk[4]}
+            for fk in conn.execute(f"PRAGMA foreign_key_list({quoted});")
+        ]
+        tables[table_name] = {
+            "columns": columns,
+            "primary_key": [col["name"] for col in sorted((c for c in columns if c["pk"]), key=lambda c: c["pk"])],
+            "indexes": indexes,
+            "foreign_keys": foreign_keys,
+            "without_rowid": "WITHOUT ROWID" in options,
+            "strict": "STRICT" in options,
+            "sql": sql,
+        }
+        column_sets.setdefault(frozenset(col["name"] for col in columns), []).append(table_name)
+    return {"schema_version": schema_version, "tables": tables, "column_sets": column_sets}
+
+# Function to get the schema catalog of a connection's database, only re-reading it after a schema change
+def get_schema_catalog(conn):
+    schema_version = conn.execute("PRAGMA schema_version;").fetchone()[0]
+    key = get_database_file(conn)
+    if not key:
+        # In-memory databases can't be told apart, so they are never cached
+        return _build_schema_catalog(conn, schema_version)
+    catalog = _schema_catalogs.get(key)
+    if catalog is None or catalog["schema_version"] != schema_version:
+        catalog = _build_schema_catalog(conn, schema_version)
+        with _schema_catalogs_lock:
+            _schema_catalogs[key] = catalog
+    return catalog
+
+# Function to find the tables whose columns are exactly the given set of columns
+def find_tables_with_columns(conn, columns):
+    return list(get_schema_catalog(conn)["column_sets"].get(frozenset(columns), []))
+
+# Function to get the type affinity of a declared column type (INTEGER, TEXT, BLOB, REAL or NUMERIC), following SQLite's rules
+def column_affinity(declared_type):
+    declared_type = (declared_type or "").upper()
+    if "INT" in declared_type:
+        return "INTEGER"
+    if any(word in declared_type for word in ("CHAR", "CLOB", "TEXT")):
+        return "TEXT"
+    if declared_type == "" or "BLOB" in declared_type:
+        return "BLOB"
+    if any(word in declared_type for word in ("REAL", "FLOA", "DOUB")):
+        return "REAL"
+    return "NUMERIC"
+
+# Function to get the affinity of every column of a table (rowid included), {} for views
+def get_column_affinities(conn, table_name):
+    table = get_schema_catalog(conn)["tables"].get(table_name)
+    if table is None:
+        return {}
+    return {"rowid": "INTEGER", **{col["name"]: column_affinity(col["type"]) for col in table["columns"]}}
+
 
 # ============================================= Display functions ==========================================
 
 # Function to connect to the SQLite database and fetch table data
-def load_data_from_db(db_name, table_name):
-    conn = sqlite3.connect(db_name)
-    query = f'SELECT * FROM {table_name}'
-    df = pd.read_sql(query, conn)
-    conn.close()
-    return df
+# With dtype_backend="pyarrow" the rows are read in Arrow batches into Arrow-backed columns (far smaller than
+# object-dtype strings); None gives the classic NumPy/object DataFrame.
+def load_data_from_db(db_name, table_name, dtype_backend="pyarrow"):
+    conn = get_connection(db_name)
+    query = f'SELECT * FROM {quote_ident(table_name)}'
+    return read_dataframe(conn, query, dtype_backend=dtype_backend, table_name=table_name)
+
+# Function to quote a table/column name so it can be used safely inside SQL
+def quote_ident(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+# Function to find the key used to page through a table (rowid, or the primary key for WITHOUT ROWID tables)
+def get_page_key(conn, table_name):
+    table = get_schema_catalog(conn)["tables"].get(table_name)
+    if table is not None:
+        return table["primary_key"] if table["without_rowid"] else ['rowid']
+
+    # Not a plain table (e.g. a view), probe for a rowid instead
+    try:
+        conn.execute(f"SELECT rowid FROM {quote_ident(table_name)} LIMIT 0;")
+        return ['rowid']
+    except sqlite3.OperationalError:
+        return []
+
+# Function to turn page key columns into SQL expressions (rowid stays unquoted so it isn't read as a column name)
+def key_expressions(key_columns):
+    return key_columns if key_columns == ['rowid'] else [quote_ident(col) for col in key_columns]
+
+# Function to estimate the number of rows in a table without scanning it
+def approximate_row_count(conn, table_name):
+    # ANALYZE statistics are the cheapest source when they exist
+    try:
+        stat = conn.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = ? AND idx IS NULL;", (table_name,)).fetchone()
+        if stat is None:
+            stat = conn.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = ?;", (table_name,)).fetchone()
+        if stat:
+            return int(stat[0].split()[0])
+    except sqlite3.OperationalError:
+        pass
+
+    # Otherwise use the rowid range, both ends of which are a single b-tree seek
+    if get_page_key(conn, table_name) == ['rowid']:
+        low, high = conn.execute(f"SELECT min(rowid), max(rowid) FROM {quote_ident(table_name)};").fetchone()
+        return 0 if low is None else high - low + 1
+    return count_rows(conn, table_name)
+
+# Function to count the rows of a table exactly
+def count_rows(conn, table_name):
+    return conn.execute(f"SELECT count(*) FROM {quote_ident(table_name)};").fetchone()[0]
+
+# Function to split rows selected as (key columns..., *) into the list of keys and a DataFrame of the rest
+def _split_keyed_rows(cursor, key_length, reverse=False):
+    rows = cursor.fetchall()
+    if reverse:
+        rows.reverse()
+    names = [col[0] for col in cursor.description][key_length:]
+    keys = [tuple(row[:key_length]) for row in rows]
+    return keys, pd.DataFrame([row[key_length:] for row in rows], columns=names)
+
+# Operators offered by the viewer filters
+FILTER_OPERATORS = ["=", "!=", "<", "<=", ">", ">=", "between", "like", "in", "is null", "is not null"]
+
+# Function to compile column filters into a parameterized WHERE condition
+# Each filter is a dict {"column", "op", "value"}; "between" takes (low, high) and "in" a list of values.
+# Returns the condition, its parameters and the filtered columns (equality filters first, for the index advisor).
+def compile_filters(filters):
+    conditions, params, equality_columns, other_columns = [], [], [], []
+    for spec in filters:
+        col = quote_ident(spec["column"])
+        op = spec["op"].lower()
+        if op in ("is null", "is not null"):
+            conditions.append(f"{col} {op.upper()}")
+        elif op == "between":
+            low, high = spec["value"]
+            conditions.append(f"{col} BETWEEN ? AND ?")
+            params.extend([low, high])
+        elif op == "in":
+            values = list(spec["value"])
+            conditions.append(f"{col} IN ({', '.join('?' for _ in values)})")
+            params.extend(values)
+        elif op in ("=", "!=", "<", "<=", ">", ">=", "like"):
+            conditions.append(f"{col} {op.upper()} ?")
+            params.append(spec["value"])
+        else:
+            raise ValueError(f"Unknown filter operator '{spec['op']}'.")
+        (equality_columns if op in ("=", "in", "is null") else other_columns).append(spec["column"])
+    columns = list(dict.fromkeys(equality_columns + other_columns))
+    return " AND ".join(conditions), params, columns
+
+# Function to build the condition "row comes after `values`" for an ORDER BY of (expression, descending) terms
+# Written out term by term so NULLs (which sort first) are handled; `values` may cover just the first terms.
+def _seek_condition(terms, values, inclusive=False):
+    clauses, params = [], []
+    for i, ((expr, descending), value) in enumerate(zip(terms, values)):
+        parts, part_params = [], []
+        for (prev_expr, _), prev_value in zip(terms[:i], values[:i]):
+            if prev_value is None:
+                parts.append(f"{prev_expr} IS NULL")
+            else:
+                parts.append(f"{prev_expr} = ?")
+                part_params.append(prev_value)
+        if descending and value is None:
+            continue  # nothing comes after NULL when sorting descending
+        if value is None:
+            parts.append(f"{expr} IS NOT NULL")
+        elif descending:
+            parts.append(f"({expr} < ? OR {expr} IS NULL)")
+            part_params.append(value)
+        else:
+            parts.append(f"{expr} > ?")
+            part_params.append(value)
+        clauses.append("(" + " AND ".join(parts) + ")")
+        params.extend(part_params)
+    if inclusive:
+        parts = []
+        for (expr, _), value in zip(terms, values):
+            if value is None:
+                parts.append(f"{expr} IS NULL")
+            else:
+                parts.append(f"{expr} = ?")
+                params.append(value)
+        clauses.append("(" + " AND ".join(parts) + ")")
+    return "(" + (" OR ".join(clauses) or "0") + ")", params
+
+# Keyset seek behind fetch_page: the cost of a page doesn't depend on its position
+# direction is 'first', 'next' (rows after `key_values`), 'prev' (rows before `key_values`),
+# 'at' (rows starting from `key_values`) or 'last'.
+# `where`/`params` filter the rows (see compile_filters) and `order_by` is a list of (column, descending);
+# the key is always added to the sort so the order is total. Without order_by, `key_values` are key values,
+# with it they are the sort values followed by the key values (for 'at', a prefix such as the first sort value is enough).
+# Returns the position (sort + key values) of every row and the page as a DataFrame.
+def _fetch_page(conn, table_name, key_columns, key_values=None, page_size=100, direction='first',
+                where=None, params=(), order_by=(), filter_columns=()):
+    key_exprs = key_expressions(key_columns)
+    keys_descending = bool(order_by) and order_by[0][1]
+    terms = [(quote_ident(col), descending) for col, descending in order_by] + [(expr, keys_descending) for expr in key_exprs]
+    backwards = direction in ('prev', 'last')
+    if backwards:
+        terms = [(expr, not descending) for expr, descending in terms]
+
+    conditions = [f"({where})"] if where else []
+    query_params = list(params)
+    if key_values is not None and direction in ('next', 'prev', 'at'):
+        if order_by:
+            condition, seek_params = _seek_condition(terms, key_values, inclusive=direction == 'at')
+        else:
+            # Plain key order: a row-value comparison is a single index range
+            op = {'next': '>', 'prev': '<', 'at': '>='}[direction]
+            seek_exprs = key_exprs[:len(key_values)]
+            condition = f"({', '.join(seek_exprs)}) {op} ({', '.join('?' for _ in seek_exprs)})"
+            seek_params = list(key_values)
+        conditions.append(condition)
+        query_params.extend(seek_params)
+
+    query = f"SELECT {', '.join(expr for expr, _ in terms)}, * FROM {quote_ident(table_name)}"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY " + ", ".join(f"{expr}{' DESC' if descending else ''}" for expr, descending in terms) + " LIMIT ?;"
+    query_params.append(page_size)
+
+    # Filtered and sorted reads are what an index can speed up, so the advisor gets to see them
+    advisor_columns = list(dict.fromkeys([*filter_columns, *(col for col, _ in order_by)]))
+    if advisor_columns:
+        observe_query(get_database_file(conn), query, query_params, table_name, advisor_columns)
+
+    return _split_keyed_rows(conn.execute(query, query_params), len(terms), reverse=backwards)
+
+# Function to fetch one page like fetch_page, but returning the position of every row (for editing)
+def fetch_page_with_keys(conn, table_name, key_columns, key_values=None, page_size=100, direction='first', **options):
+    return _fetch_page(conn, table_name, key_columns, key_values, page_size, direction, **options)
+
+# Function to fetch one page of a table using a keyset seek, see _fetch_page for the arguments
+def fetch_page(conn, table_name, key_columns, key_values=None, page_size=100, direction='first', **options):
+    page_keys, df = _fetch_page(conn, table_name, key_columns, key_values, page_size, direction, **options)
+    first_key = page_keys[0] if page_keys else None
+    last_key = page_keys[-1] if page_keys else None
+    return df, first_key, last_key
+
+# Function to count the rows matching a filter
+def count_matching_rows(conn, table_name, where=None, params=()):
+    query = f"SELECT count(*) FROM {quote_ident(table_name)}"
+    if where:
+        query += f" WHERE {where}"
+    return conn.execute(query, params).fetchone()[0]
 
 
 
 
 
+# Folder the app writes exports to, override it with SQLITE_GUI_EXPORT_DIR
+EXPORT_DIR = os.environ.get("SQLITE_GUI_EXPORT_DIR", os.path.join(tempfile.gettempdir(), "sqlite_gui_exports"))
+
+# Exports up to this size (SQLITE_GUI_EXPORT_DOWNLOAD_MB) are offered by a download button, Streamlit holds those in
+# memory. Bigger files are linked to SQLITE_GUI_EXPORT_URL when it is set (serve.py serves EXPORT_DIR there from disk).
+EXPORT_DOWNLOAD_BYTES = int(float(os.environ.get("SQLITE_GUI_EXPORT_DOWNLOAD_MB", 200)) * 1024 * 1024)
+EXPORT_URL = os.environ.get("SQLITE_GUI_EXPORT_URL", "").rstrip("/")
+
+# Exports older than SQLITE_GUI_EXPORT_MAX_AGE_HOURS are removed, then the oldest ones until the folder fits in
+# SQLITE_GUI_EXPORT_MAX_MB (0 turns either limit off)
+EXPORT_MAX_AGE = float(os.environ.get("SQLITE_GUI_EXPORT_MAX_AGE_HOURS", 24)) * 3600
+EXPORT_MAX_BYTES = int(float(os.environ.get("SQLITE_GUI_EXPORT_MAX_MB", 10240)) * 1024 * 1024)
+
+# Function to pick a new file in EXPORT_DIR for an export; the name keeps `file_name` after a unique prefix
+def new_export_path(file_name):
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    prune_exports()
+    fd, path = tempfile.mkstemp(prefix=time.strftime("%Y%m%d-%H%M%S-"), suffix="-" + re.sub(r"[^\w.-]", "_", file_name), dir=EXPORT_DIR)
+    os.close(fd)
+    return path
+
+# Function to remove the exports that are over the age limit, then the oldest ones until EXPORT_DIR fits its size limit
+# An export being written keeps a recent modification time, so it goes last.
+def prune_exports():
+    try:
+        entries = sorted((entry for entry in os.scandir(EXPORT_DIR) if entry.is_file()), key=lambda entry: entry.stat().st_mtime)
+    except FileNotFoundError:
+        return
+    total = sum(entry.stat().st_size for entry in entries)
+    for entry in entries:
+        too_old = EXPORT_MAX_AGE > 0 and time.time() - entry.stat().st_mtime > EXPORT_MAX_AGE
+        if not too_old and (EXPORT_MAX_BYTES <= 0 or total <= EXPORT_MAX_BYTES):
+            continue
+        total -= entry.stat().st_size
+        remove_export(entry.path)
+
+# Function to delete an export file (nothing happens if it is already gone)
+def remove_export(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+# Function to find an export by its file name, for serving it from disk; None unless it is a file right in EXPORT_DIR
+def export_file_path(name):
+    if not name or name != os.path.basename(name) or name.startswith("."):
+        return None
+    path = os.path.join(EXPORT_DIR, name)
+    return path if os.path.isfile(path) else None
+
+# Function to stream a table (optionally filtered) as CSV into a binary file object, one chunk of rows at a time
+# Memory use depends on `chunk_size`, not on the size of the table. Returns the number of rows written.
+# `progress` works as in set_progress and can cancel the export.
+def export_table_csv(db_name, table_name, out_file, where=None, params=(), compress=False, chunk_size=10000, progress=None):
+    conn = open_connection(db_name)
+    set_progress(conn, progress)
+    try:
+        query = f"SELECT * FROM {quote_ident(table_name)}"
+        if where:
+            query += f" WHERE {where}"
+        cursor = conn.execute(query, params)
+
+        raw = gzip.GzipFile(fileobj=out_file, mode='wb') if compress else out_file
+        text = io.TextIOWrapper(raw, encoding='utf-8', newline='')
+        writer = csv.writer(text, lineterminator='\n')
+        writer.writerow([col[0] for col in cursor.description])
+
+        rows_written = 0
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            writer.writerows(rows)
+            rows_written += len(rows)
+
+        # Detach so closing the wrappers never closes the caller's file
+        text.flush()
+        text.detach()
+        if compress:
+            raw.close()
+        return rows_written
+    finally:
+        conn.close()
+
+
+# Rows per Arrow record batch when reading or exporting through Arrow
+ARROW_BATCH_ROWS = 65536
+
+# Function to pick the Arrow type of a declared SQLite column type, following SQLite's affinity rules
+def _affinity_arrow_type(declared_type):
+    import pyarrow as pa
+    return {"INTEGER": pa.int64(), "TEXT": pa.string(), "BLOB": None}.get(column_affinity(declared_type), pa.float64())
+
+# Function to turn the values of one column into an Arrow array of the type they fit
+# Columns mixing value types (SQLite allows it) become strings.
+def _arrow_array(values):
+    import pyarrow as pa
+    try:
+        return pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+        return pa.array([None if value is None else str(value) for value in values], type=pa.string())
+
+# Function to find the type that holds the values of two Arrow types: float64 for integers and floats, string otherwise
+def _widen_arrow_type(current, other):
+    import pyarrow as pa
+    if current == other or pa.types.is_null(other):
+        return current
+    if pa.types.is_null(current):
+        return other
+    if all(pa.types.is_integer(t) or pa.types.is_floating(t) for t in (current, other)):
+        return pa.float64()
+    return pa.string()
+
+# Function to convert an Arrow array to a wider type (see _widen_arrow_type)
+def _cast_arrow_array(array, arrow_type, name):
+    import pyarrow as pa
+    try:
+        return array.cast(arrow_type, safe=not pa.types.is_floating(arrow_type))
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        raise ValueError(f"Column '{name}' holds values of several types, export it as CSV instead.")
+
+# Function to convert a record batch to a wider schema of the same columns
+def _cast_record_batch(batch, schema):
+    import pyarrow as pa
+    if batch.schema == schema:
+        return batch
+    return pa.RecordBatch.from_arrays([_cast_arrow_array(column, field.type, field.name) for column, field in zip(batch.columns, schema)],
+                                      schema=schema)
+
+# Function to read a query result as Arrow record batches of `batch_size` rows
+# Only one batch of Python rows exists at a time. The schema is set by the first batch (or given as `schema`);
+# columns that are all NULL there take the declared type of `table_name`'s column (string when there is none).
+# A later batch that doesn't fit widens its columns (integer to float64, mixed values to string) instead of
+# truncating them, so it comes with a wider schema than the batches before it.
+def iter_record_batches(conn, query, params=(), batch_size=ARROW_BATCH_ROWS, table_name=None, schema=None):
+    import pyarrow as pa
+    cursor = conn.execute(query, params)
+    names = [col[0] for col in cursor.description]
+    declared = {}
+    table = get_schema_catalog(conn)["tables"].get(table_name) if table_name else None
+    if table is not None:
+        declared = {col["name"]: col["type"] for col in table["columns"]}
+
+    started = False
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if started and not rows:
+            break
+        columns = list(zip(*rows)) if rows else [()] * len(names)
+        arrays = [_arrow_array(values) for values in columns]
+        if schema is None:
+            for i, array in enumerate(arrays):
+                if pa.types.is_null(array.type):
+                    arrays[i] = array.cast(_affinity_arrow_type(declared.get(names[i])) or pa.string())
+        else:
+            for i, (array, field) in enumerate(zip(arrays, schema)):
+                arrow_type = _widen_arrow_type(field.type, array.type)
+                if array.type != arrow_type:
+                    arrays[i] = _cast_arrow_array(array, arrow_type, names[i])
+        batch = pa.RecordBatch.from_arrays(arrays, names=names)
+        schema = batch.schema
+        started = True
+        yield batch
+        if not rows:
+            break
+
+# Function to read a query into a DataFrame, Arrow-backed by default (falls back to pandas when pyarrow is missing
+# or the values don't fit one Arrow type per column)
+def read_dataframe(conn, query, params=(), dtype_backend="pyarrow", table_name=None):
+    if dtype_backend == "pyarrow":
+        try:
+            import pyarrow as pa
+            batches = list(iter_record_batches(conn, query, params, table_name=table_name))
+            # Schemas only widen, so the last batch has the one every batch fits
+            schema = batches[-1].schema
+            table = pa.Table.from_batches([_cast_record_batch(batch, schema) for batch in batches])
+            return table.to_pandas(types_mapper=pd.ArrowDtype)
+        except (ImportError, ValueError):
+            pass
+    return pd.read_sql_query(query, conn, params=params)
+
+# Function to stream a table (optionally filtered) as Parquet (fmt="parquet") or Arrow IPC (fmt="arrow") into a
+# binary file object, one record batch at a time. Returns the number of rows written.
+# A file's schema can't change once written, so when a later batch widens a column the export starts over
+# with the wider schema (the file object must be seekable for that).
+def export_table_arrow(db_name, table_name, out_file, fmt="parquet", where=None, params=(), batch_size=ARROW_BATCH_ROWS, progress=None):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    conn = open_connection(db_name)
+    set_progress(conn, progress)
+    writer = None
+    try:
+        query = f"SELECT * FROM {quote_ident(table_name)}"
+        if where:
+            query += f" WHERE {where}"
+        schema = None
+        while True:
+            rows_written = 0
+            for batch in iter_record_batches(conn, query, params, batch_size, table_name=table_name, schema=schema):
+                if writer is None:
+                    schema = batch.schema
+                    writer = pq.ParquetWriter(out_file, schema, compression="zstd") if fmt == "parquet" else pa.ipc.new_file(out_file, schema)
+                elif batch.schema != schema:
+                    break
+                writer.write_batch(batch)
+                rows_written += batch.num_rows
+            else:
+                return rows_written
+
+            writer.close()
+            writer = None
+            if not out_file.seekable():
+                raise ValueError(f"A column of '{table_name}' holds values of several types, export it to a file instead.")
+            out_file.seek(0)
+            out_file.truncate()
+            schema = batch.schema
+    finally:
+        if writer is not None:
+            writer.close()
+        conn.close()
+
 
 # ==================================== Table data operations functions ======================================
 
 
-# Function to create a connection to the SQLite database
-def create_connection(db_file):
-    conn = sqlite3.connect(db_file)
-    return conn
+# Function to get the shared connection to the SQLite database
+def create_connection(db_file=None):
+    return get_connection(db_file)
 
 # Function to fetch table names
 def get_table_names_dataops(conn):
-    query = "SELECT name FROM sqlite_master WHERE type='table';"
-    tables = pd.read_sql_query(query, conn)
-    return tables['name'].tolist()
+    return list(get_schema_catalog(conn)["tables"])
 
 # Function to fetch column names and their types for a given table
+# Views aren't in the schema catalog and are read with PRAGMA table_info; no table gives an empty frame.
 def get_columns_and_types(conn, table_name):
-    query = f"PRAGMA table_info({table_name});"
-    columns_info = pd.read_sql_query(query, conn)
-    return columns_info[['name', 'type']]
+    table = get_schema_catalog(conn)["tables"].get(table_name) if table_name else None
+    if table is not None:
+        columns = table["columns"]
+    elif table_name:
+        columns = [{"name": col[1], "type": col[2]} for col in conn.execute(f"PRAGMA table_info({quote_ident(table_name)});")]
+    else:
+        columns = []
+    return pd.DataFrame(columns, columns=['name', 'type'])
 
 # Function to fetch data from a specified table
-def fetch_table_data(conn, table_name):
-    query = f"SELECT * FROM {table_name};"
-    return pd.read_sql_query(query, conn)
+def fetch_table_data(conn, table_name, dtype_backend="pyarrow"):
+    query = f"SELECT * FROM {quote_ident(table_name)};"
+    return read_dataframe(conn, query, dtype_backend=dtype_backend, table_name=table_name)
+
+# Function to fetch the row(s) with the given key, a single index/rowid seek
+def find_rows_by_key(conn, table_name, key_columns, key_values):
+    key_exprs = key_expressions(key_columns)
+    query = (
+        f"SELECT {', '.join(key_exprs)}, * FROM {quote_ident(table_name)} "
+        f"WHERE ({', '.join(key_exprs)}) = ({', '.join('?' for _ in key_columns)});"
+    )
+    return _split_keyed_rows(conn.execute(query, tuple(key_values)), len(key_columns))
+
+# Function to search rows by a column value, either an exact match or a prefix match for type-ahead
+# Prefixes are searched as a range (col >= 'ab' AND col < 'ac') so an index on the column can be used. Only TEXT
+# columns compare to text that way; other columns are matched on their text form, which no index covers.
+def search_rows(conn, table_name, key_columns, column, value, match='equals', limit=50):
+    key_exprs = key_expressions(key_columns)
+    col = quote_ident(column)
+    if match == 'starts with' and isinstance(value, str) and value:
+        text = col if get_column_affinities(conn, table_name).get(column) == "TEXT" else f"CAST({col} AS TEXT)"
+        condition = f"{text} >= ? AND {text} < ?"
+        params = [value, value[:-1] + chr(ord(value[-1]) + 1)]
+    else:
+        condition = f"{col} = ?"
+        params = [value]
+    query = (
+        f"SELECT {', '.join(key_exprs)}, * FROM {quote_ident(table_name)} WHERE {condition} "
+        f"ORDER BY {col}, {', '.join(key_exprs)} LIMIT ?;"
+    )
+    observe_query(get_database_file(conn), query, (*params, limit), table_name, [column])
+    return _split_keyed_rows(conn.execute(query, (*params, limit)), len(key_columns))
+
+# Function to update the row with the given key
+def update_row(conn, table_name, key_columns, key_values, values):
+    key_exprs = key_expressions(key_columns)
+    assignments = ", ".join(f"{quote_ident(col)} = ?" for col in values)
+    query = f"UPDATE {quote_ident(table_name)} SET {assignments} WHERE ({', '.join(key_exprs)}) = ({', '.join('?' for _ in key_columns)});"
+    execute_query(conn, query, (*values.values(), *key_values))
+
+# Function to delete the row with the given key
+def delete_row(conn, table_name, key_columns, key_values):
+    key_exprs = key_expressions(key_columns)
+    query = f"DELETE FROM {quote_ident(table_name)} WHERE ({', '.join(key_exprs)}) = ({', '.join('?' for _ in key_columns)});"
+    execute_query(conn, query, tuple(key_values))
+
+# Raised when rows were changed by someone else after they were loaded into the editor
+class EditConflictError(Exception):
+    pass
+
+# Function to turn a pandas/numpy value into what sqlite3 stores (NaN/NaT become NULL)
+def _plain_value(value):
+    if value is None or (not isinstance(value, (str, bytes)) and pd.isna(value)):
+        return None
+    return value.item() if hasattr(value, 'item') else value
+
+# Function to work out what was inserted, updated and deleted in an edited copy of a page
+# `keys[i]` is the key of `original.iloc[i]`; `edited` has a `row_column` holding that position (empty for new rows).
+def diff_page_edits(keys, original, edited, row_column='_row'):
+    inserted, updated, deleted = [], [], []
+    seen = set()
+    for _, row in edited.iterrows():
+        values = {col: _plain_value(row[col]) for col in original.columns}
+        position = _plain_value(row[row_column])
+        if position is None:
+            if any(value is not None for value in values.values()):
+                inserted.append(values)
+            continue
+        position = int(position)
+        seen.add(position)
+        old = {col: _plain_value(original.iloc[position][col]) for col in original.columns}
+        changed = {col: value for col, value in values.items() if value != old[col]}
+        if changed:
+            updated.append((keys[position], changed, old))
+    for position in range(len(original)):
+        if position not in seen:
+            deleted.append((keys[position], {col: _plain_value(original.iloc[position][col]) for col in original.columns}))
+    return {"inserted": inserted, "updated": updated, "deleted": deleted}
+
+# Function to apply the changes from diff_page_edits in one transaction, with executemany per kind of change
+# Updated and deleted rows must still hold the values they were loaded with, otherwise nothing is written
+# and EditConflictError is raised.
+def apply_page_edits(conn, table_name, key_columns, changes):
+    table = quote_ident(table_name)
+    key_condition = f"({', '.join(key_expressions(key_columns))}) = ({', '.join('?' for _ in key_columns)})"
+
+    # Function to build "key matches AND every loaded column still holds its loaded value"
+    def unchanged_condition(old):
+        return key_condition + "".join(f" AND {quote_ident(col)} IS ?" for col in old)
+
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute("BEGIN IMMEDIATE;")
+    try:
+        # Updates are grouped by the set of columns they change, so each group is one executemany
+        update_groups = {}
+        for key, changed, old in changes["updated"]:
+            update_groups.setdefault((tuple(changed), tuple(old)), []).append((*changed.values(), *key, *old.values()))
+        for (changed_columns, old_columns), rows in update_groups.items():
+            assignments = ", ".join(f"{quote_ident(col)} = ?" for col in changed_columns)
+            cursor = conn.executemany(f"UPDATE {table} SET {assignments} WHERE {unchanged_condition(old_columns)};", rows)
+            if cursor.rowcount != len(rows):
+                raise EditConflictError(f"{len(rows) - cursor.rowcount} edited row(s) were changed or deleted by someone else.")
+
+        delete_groups = {}
+        for key, old in changes["deleted"]:
+            delete_groups.setdefault(tuple(old), []).append((*key, *old.values()))
+        for old_columns, rows in delete_groups.items():
+            cursor = conn.executemany(f"DELETE FROM {table} WHERE {unchanged_condition(old_columns)};", rows)
+            if cursor.rowcount != len(rows):
+                raise EditConflictError(f"{len(rows) - cursor.rowcount} deleted row(s) were changed or deleted by someone else.")
+
+        # Inserts only name the columns that were filled in, so defaults and rowids still apply
+        insert_groups = {}
+        for values in changes["inserted"]:
+            filled = {col: value for col, value in values.items() if value is not None}
+            insert_groups.setdefault(tuple(filled), []).append(tuple(filled.values()))
+        for columns, rows in insert_groups.items():
+            if columns:
+                conn.executemany(f"INSERT INTO {table} ({', '.join(quote_ident(col) for col in columns)}) VALUES ({', '.join('?' for _ in columns)});", rows)
+            else:
+                conn.executemany(f"INSERT INTO {table} DEFAULT VALUES;", rows)
+
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return {kind: len(rows) for kind, rows in changes.items()}
 
 # Function to execute a SQL command with parameters
 def execute_query(conn, query, params=None):
@@ -61,7 +949,7 @@ def execute_query(conn, query, params=None):
 
 # Function to create a SQLite database and table
 def create_table(table_name, columns, primary_keys, foreign_keys):
-    conn = sqlite3.connect('admin.db')
+    conn = get_connection()
     c = conn.cursor()
 
     # Construct column definitions
@@ -88,47 +976,1741 @@ def create_table(table_name, columns, primary_keys, foreign_keys):
     # Execute table creation
     c.execute(create_table_query)
     conn.commit()
-    conn.close()
 
 # Function to delete a table
 def delete_table(table_name):
-    conn = sqlite3.connect('admin.db')
+    conn = get_connection()
     c = conn.cursor()
     c.execute(f"DROP TABLE IF EXISTS {table_name};")
     conn.commit()
-    conn.close()
 
 # Function to insert a column
 def insert_column(table_name, column_name, column_type):
-    conn = sqlite3.connect('admin.db')
+    conn = get_connection()
     c = conn.cursor()
     c.execute(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type};")
     conn.commit()
-    conn.close()
 
-# Function to remove a column (SQLite doesn't support DROP COLUMN directly)
-def remove_column(table_name, column_name):
-    conn = sqlite3.connect('admin.db')
-    c = conn.cursor()
-    
-    # Fetch all columns in the table
-    c.execute(f"PRAGMA table_info({table_name});")
-    columns = c.fetchall()
-    
-    # Create a new table without the column to be removed
-    new_columns = [col[1] for col in columns if col[1] != column_name]
-    
-    # Create new table
-    new_table_name = f"{table_name}_temp"
-    column_definitions = ", ".join([f"{col} TEXT" for col in new_columns])
-    c.execute(f"CREATE TABLE {new_table_name} ({column_definitions});")
-    
-    # Copy data to the new table
-    c.execute(f"INSERT INTO {new_table_name} ({', '.join(new_columns)}) SELECT {', '.join(new_columns)} FROM {table_name};")
-    
-    # Drop the old table and rename the new table
-    c.execute(f"DROP TABLE {table_name};")
-    c.execute(f"ALTER TABLE {new_table_name} RENAME TO {table_name};")
-    
+# Number of SQLite virtual machine steps between two calls of a progress callback
+PROGRESS_STEPS = 100000
+
+# Function to run `progress` every PROGRESS_STEPS steps while the connection works; a truthy return aborts
+def set_progress(conn, progress):
+    if progress is None:
+        conn.set_progress_handler(None, 0)
+    else:
+        conn.set_progress_handler(lambda: 1 if progress() else 0, PROGRESS_STEPS)
+
+# Function to remove a column, keeping the types, constraints, indexes and triggers of the table
+# Uses ALTER TABLE ... DROP COLUMN when SQLite supports it (3.35+) and the column isn't part of a key,
+# index or constraint; otherwise rebuilds the table in a single transaction (see _rebuild_without_column).
+# `progress` is called regularly during the copy and can return True to cancel (everything is rolled back).
+# Returns the names of the indexes and triggers dropped along with the column.
+def remove_column(table_name, column_name, conn=None, progress=None):
+    conn = conn or get_connection()
+    table = get_schema_catalog(conn)["tables"].get(table_name)
+    if table is None:
+        raise ValueError(f"Table '{table_name}' does not exist.")
+    if column_name not in [col["name"] for col in table["columns"]]:
+        raise ValueError(f"Column '{column_name}' does not exist in table '{table_name}'.")
+    if table["without_rowid"] and column_name in table["primary_key"]:
+        raise ValueError(f"'{column_name}' is part of the primary key of the WITHOUT ROWID table '{table_name}', which can't exist without it.")
+
+    if conn.in_transaction:
+        conn.commit()
+    set_progress(conn, progress)
+    try:
+        if sqlite3.sqlite_version_info >= (3, 35, 0):
+            try:
+                conn.execute("BEGIN IMMEDIATE;")
+                conn.execute(f"ALTER TABLE {quote_ident(table_name)} DROP COLUMN {quote_ident(column_name)};")
+                conn.commit()
+                return []
+            except sqlite3.OperationalError:
+                # e.g. the column is in the primary key, a UNIQUE constraint, an index or a foreign key
+                conn.rollback()
+        return _rebuild_without_column(conn, table_name, table, column_name)
+    finally:
+        set_progress(conn, None)
+
+# Tokens of SQL text: string literals, quoted identifiers, comments, words and single characters
+_SQL_TOKEN = re.compile(r"""'(?:[^']|'')*'|"(?:[^"]|"")*"|`(?:[^`]|``)*`|\[[^\]]*\]|--[^\n]*|/\*.*?(?:\*/|$)|\w+|\S""", re.DOTALL)
+
+# Function to turn a (possibly quoted) identifier token into the name it stands for
+def _unquote_ident(token):
+    if token[:1] in ('"', '`'):
+        return token[1:-1].replace(token[0] * 2, token[0])
+    if token[:1] == "[":
+        return token[1:-1]
+    return token
+
+# Function to list the identifiers (and keywords) of a piece of SQL in lower case, leaving out literals and comments
+def _sql_identifiers(sql):
+    return {
+        _unquote_ident(token).lower() for token in _SQL_TOKEN.findall(sql or "")
+        if token[0] not in "'-/" and (token[0] in '"`[' or token[0].isalnum() or token[0] == "_")
+    }
+
+# Function to split a CREATE TABLE statement into the text up to its "(", the column/constraint definitions and the rest
+def _split_create_table(sql):
+    depth = 0
+    items = []
+    for match in _SQL_TOKEN.finditer(sql):
+        token = match.group()
+        if token == "(":
+            depth += 1
+            if depth == 1:
+                head_end = item_start = match.end()
+        elif token == ")":
+            depth -= 1
+            if depth == 0:
+                items.append(sql[item_start:match.start()])
+                return sql[:head_end], items, sql[match.start():]
+        elif token == "," and depth == 1:
+            items.append(sql[item_start:match.start()])
+            item_start = match.end()
+    raise ValueError("Can't parse the CREATE TABLE statement.")
+
+# Function to copy a table without one column into a new table with the same definition, then swap them
+# The new table is created from the original CREATE TABLE text with the column's definition removed, so types,
+# collations, defaults, CHECKs, generated columns, AUTOINCREMENT and table options are kept as written. Table
+# constraints on the removed column go with it, as do indexes and triggers that use it. Rowids are copied as they are.
+# Returns the names of the indexes and triggers that were dropped.
+def _rebuild_without_column(conn, table_name, table, column_name):
+    quoted = quote_ident(table_name)
+    column = column_name.lower()
+    head, items, tail = _split_create_table(table["sql"])
+
+    # The copy gets a name nothing in the schema uses yet, so no existing table is ever touched
+    taken = {name.lower() for name, in conn.execute("SELECT name FROM sqlite_master;")}
+    new_name, n = f"{table_name}_temp", 2
+    while new_name.lower() in taken:
+        new_name, n = f"{table_name}_temp{n}", n + 1
+
+    kept_items = []
+    for item in items:
+        tokens = [token for token in _SQL_TOKEN.findall(item) if not token.startswith(("--", "/*"))]
+        if not tokens:
+            continue
+        if tokens[0].upper() in ("CONSTRAINT", "PRIMARY", "UNIQUE", "CHECK", "FOREIGN"):
+            # A foreign key's REFERENCES part names the parent's columns, not ours
+            own_part = re.split(r"\bREFERENCES\b", item, maxsplit=1, flags=re.IGNORECASE)[0]
+            if column in _sql_identifiers(own_part):
+                continue
+        elif _unquote_ident(tokens[0]).lower() == column:
+            continue
+        kept_items.append(item)
+    if not any(_unquote_ident(col["name"]).lower() != column for col in table["columns"]):
+        raise ValueError(f"'{column_name}' is the only column of '{table_name}'.")
+    create_sql = _CREATE_TABLE_NAME.sub(lambda m: m.group(1) + quote_ident(new_name), head + ",".join(kept_items) + tail, count=1)
+
+    # Generated columns can't be written, so only stored columns are copied (plus the rowid of rowid tables)
+    copied = [
+        quote_ident(col[1]) for col in conn.execute(f"PRAGMA table_xinfo({quoted});")
+        if col[1].lower() != column and col[6] == 0
+    ]
+    if not table["without_rowid"]:
+        copied.insert(0, "rowid")
+    copied_list = ", ".join(copied)
+
+    # Indexes and triggers are recreated after the copy, skipping the ones that use the removed column
+    dropped = []
+    recreated = []
+    for name, sql in conn.execute("SELECT name, sql FROM sqlite_master WHERE type IN ('index', 'trigger') AND tbl_name = ? AND sql IS NOT NULL;", (table_name,)):
+        (dropped if column in _sql_identifiers(sql) else recreated).append((name, sql))
+    # Views on the table are kept as they are, they are checked once the table is back under its name
+    views = [name for name, sql in conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'view';")
+             if table_name.lower() in _sql_identifiers(sql)]
+    sequence = None
+    if check_table_exists(conn, "sqlite_sequence"):
+        sequence = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = ?;", (table_name,)).fetchone()
+
+    foreign_keys_on = conn.execute("PRAGMA foreign_keys;").fetchone()[0]
+    legacy_alter_table = conn.execute("PRAGMA legacy_alter_table;").fetchone()[0]
+    conn.execute("PRAGMA foreign_keys = OFF;")
+    try:
+        conn.execute("BEGIN IMMEDIATE;")
+        try:
+            try:
+                conn.execute(create_sql)
+            except sqlite3.OperationalError as error:
+                # e.g. a CHECK or generated column of another column uses it
+                raise ValueError(f"Can't remove '{column_name}' from '{table_name}': the rest of the table uses it ({error}).") from None
+            conn.execute(f"INSERT INTO {quote_ident(new_name)} ({copied_list}) SELECT {copied_list} FROM {quoted};")
+            conn.execute(f"DROP TABLE {quoted};")
+            # The legacy rename doesn't check the schema's views, which can't see the table while it is renamed
+            conn.execute("PRAGMA legacy_alter_table = ON;")
+            try:
+                conn.execute(f"ALTER TABLE {quote_ident(new_name)} RENAME TO {quoted};")
+            finally:
+                conn.execute(f"PRAGMA legacy_alter_table = {'ON' if legacy_alter_table else 'OFF'};")
+            for name, sql in recreated:
+                conn.execute(sql)
+            for name in views:
+                try:
+                    conn.execute(f"SELECT * FROM {quote_ident(name)} LIMIT 0;")
+                except sqlite3.OperationalError as error:
+                    raise ValueError(f"Can't remove '{column_name}' from '{table_name}': the view '{name}' uses it ({error}).") from None
+            if sequence is not None and "autoincrement" in _sql_identifiers(create_sql):
+                # Keep the AUTOINCREMENT high-water mark, rows deleted at the end included
+                conn.execute("DELETE FROM sqlite_sequence WHERE name = ?;", (table_name,))
+                conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?);", (table_name, sequence[0]))
+            if foreign_keys_on and conn.execute(f"PRAGMA foreign_key_check({quoted});").fetchone():
+                raise sqlite3.IntegrityError(f"Removing '{column_name}' would break foreign keys of '{table_name}'.")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    finally:
+        conn.execute(f"PRAGMA foreign_keys = {'ON' if foreign_keys_on else 'OFF'};")
+    return [name for name, sql in dropped]
+
+
+# ==================================== Index functions ===================================
+
+# Lookups the app has run, kept so the index advisor can check their plans (process-wide, newest last)
+MAX_OBSERVED_QUERIES = 200
+_observed_queries = {}
+_observed_queries_lock = threading.Lock()
+
+# Function to remember a lookup for the index advisor: the SQL, sample parameters and the filtered columns
+def observe_query(db_file, query, params, table_name, columns):
+    with _observed_queries_lock:
+        entry = _observed_queries.pop(query, None) or {"db_file": db_file, "query": query, "table": table_name, "columns": list(columns), "count": 0}
+        entry["params"] = tuple(params)
+        entry["count"] += 1
+        _observed_queries[query] = entry
+        while len(_observed_queries) > MAX_OBSERVED_QUERIES:
+            _observed_queries.pop(next(iter(_observed_queries)))
+
+# Function to list the remembered lookups for one database, most recent first
+def observed_queries(db_file):
+    with _observed_queries_lock:
+        return [dict(entry) for entry in reversed(_observed_queries.values()) if entry["db_file"] == db_file]
+
+# Function to list the indexes of a table with their definitions
+def list_indexes(conn, table_name):
+    indexes = pd.DataFrame(get_schema_catalog(conn)["tables"][table_name]["indexes"], columns=['name', 'unique', 'origin', 'partial', 'columns'])
+    sql = dict(conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ?;", (table_name,)).fetchall())
+    indexes['sql'] = indexes['name'].map(sql)
+    return indexes
+
+# Function to create an index; each entry of `columns` is a column name or an expression such as lower(name)
+# `where` makes it a partial index.
+def create_index(conn, index_name, table_name, columns, unique=False, where=None):
+    table_columns = [col["name"] for col in get_schema_catalog(conn)["tables"][table_name]["columns"]]
+    terms = ", ".join(quote_ident(col) if col in table_columns else col for col in columns)
+    query = f"CREATE {'UNIQUE ' if unique else ''}INDEX {quote_ident(index_name)} ON {quote_ident(table_name)} ({terms})"
+    if where:
+        query += f" WHERE {where}"
+    execute_query(conn, query + ";")
+
+# Function to drop an index
+def drop_index(conn, index_name):
+    execute_query(conn, f"DROP INDEX {quote_ident(index_name)};")
+
+# Function to show how SQLite will run a query
+def explain_query_plan(conn, query, params=()):
+    rows = conn.execute(f"EXPLAIN QUERY PLAN {query}", params).fetchall()
+    return pd.DataFrame(rows, columns=['id', 'parent', 'notused', 'detail'])[['id', 'parent', 'detail']]
+
+# Function to check whether a plan reads a whole table or has to build a throwaway index
+def _plan_scans_table(plan):
+    for detail in plan['detail']:
+        if detail.startswith("SCAN ") and " USING " not in detail:
+            return True
+        if "AUTOMATIC" in detail:
+            return True
+    return False
+
+# Function to suggest indexes for the remembered lookups that currently scan their table
+def suggest_indexes(conn):
+    db_file = get_database_file(conn)
+    catalog = get_schema_catalog(conn)
+    suggestions = {}
+    for entry in observed_queries(db_file):
+        table = catalog["tables"].get(entry["table"])
+        if table is None or not entry["columns"]:
+            continue
+        # Skip when an existing index already starts with the same columns
+        if any(index["columns"][:len(entry["columns"])] == entry["columns"] for index in table["indexes"]):
+            continue
+        try:
+            plan = explain_query_plan(conn, entry["query"], entry["params"])
+        except sqlite3.Error:
+            continue
+        if not _plan_scans_table(plan):
+            continue
+        index_name = "idx_" + "_".join([entry["table"], *entry["columns"]])
+        key = (entry["table"], tuple(entry["columns"]))
+        if key not in suggestions:
+            suggestions[key] = {
+                "table": entry["table"],
+                "columns": entry["columns"],
+                "index_name": index_name,
+                "statement": f"CREATE INDEX {quote_ident(index_name)} ON {quote_ident(entry['table'])} ({', '.join(quote_ident(col) for col in entry['columns'])});",
+                "query": entry["query"],
+                "plan": plan,
+                "count": 0,
+            }
+        suggestions[key]["count"] += entry["count"]
+    return sorted(suggestions.values(), key=lambda suggestion: -suggestion["count"])
+
+
+# ==================================== Profiling functions ===================================
+
+# Tables with more rows than this are sampled by default, using about PROFILE_SAMPLE_ROWS rows
+PROFILE_SAMPLE_THRESHOLD = 1_000_000
+PROFILE_SAMPLE_ROWS = 100_000
+MAX_CACHED_PROFILES = 64
+# Aggregates per query, SQLite allows at most 2000 result columns
+PROFILE_COLUMNS_PER_QUERY = 250
+
+# Profiles computed so far, with the data version of their database at that time (process-wide, newest last)
+_profiles = {}
+_profiles_lock = threading.Lock()
+
+# One idle connection per database file whose PRAGMA data_version changes whenever any other connection commits
+_write_watchers = {}
+_write_watchers_lock = threading.Lock()
+
+# Function to get a number that changes whenever something is committed to a database file
+def data_version(db_file):
+    with _write_watchers_lock:
+        watcher = _write_watchers.get(db_file)
+        if watcher is None:
+            watcher = _write_watchers[db_file] = sqlite3.connect(db_file, check_same_thread=False)
+        return watcher.execute("PRAGMA data_version;").fetchone()[0]
+
+# Approximate count(DISTINCT) aggregate: a HyperLogLog sketch that uses 4 KB whatever the number of values
+class HyperLogLog:
+    PRECISION = 12
+
+    def __init__(self):
+        self.registers = bytearray(1 << self.PRECISION)
+
+    def step(self, value):
+        if value is None:
+            return
+        # splitmix64 finaliser, Python's hash of small ints is the int itself
+        h = (hash(value) + 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+        h = ((h ^ (h >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+        h = ((h ^ (h >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+        h ^= h >> 31
+        rest_bits = 64 - self.PRECISION
+        index = h >> rest_bits
+        rank = rest_bits - (h & ((1 << rest_bits) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def finalize(self):
+        m = len(self.registers)
+        estimate = 0.7213 / (1 + 1.079 / m) * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+# Function to build the CTE naming the rows to profile `src`: the whole table or, for large tables, a sample
+# Rowid tables are sampled with rowid probes (one b-tree seek each): one per stretch of `step` rowids, at a random
+# offset inside it, so data that repeats with the stride isn't sampled at the same phase every time. The offsets are
+# seeded with the rowid range, so the same rows are picked until the table changes. Other tables keep a random
+# subset of a scan.
+def _profile_source(conn, table_name, sample_rows=None):
+    quoted = quote_ident(table_name)
+    if sample_rows and get_page_key(conn, table_name) == ['rowid']:
+        low, high = conn.execute(f"SELECT min(rowid), max(rowid) FROM {quoted};").fetchone()
+        if low is not None and high - low + 1 > sample_rows:
+            step = (high - low + 1) / sample_rows
+            rng = random.Random(f"{table_name}:{low}:{high}:{sample_rows}")
+            probes = [low + int((n + rng.random()) * step) for n in range(sample_rows)]
+            # Passed as one JSON array, there are more probes than SQLite allows bound parameters
+            return (f"WITH src AS (SELECT * FROM {quoted} WHERE rowid IN (SELECT value FROM json_each(?)))",
+                    (json.dumps(probes),), True)
+    elif sample_rows:
+        total = approximate_row_count(conn, table_name)
+        if total > sample_rows:
+            return f"WITH src AS (SELECT * FROM {quoted} WHERE abs(random() % ?) < ?)", (total, sample_rows), True
+    return f"WITH src AS (SELECT * FROM {quoted})", (), False
+
+# Function to return a cached result for a database while nothing has been committed to it, computing it otherwise
+def _cached_profile(conn, key, compute, refresh=False):
+    db_file = get_database_file(conn)
+    if not db_file:
+        return dict(compute(), cached=False)
+    # Read the version first, so a write during the computation invalidates the result
+    version = data_version(db_file)
+    key = (db_file, *key)
+    with _profiles_lock:
+        entry = _profiles.get(key)
+    if entry is not None and entry["version"] == version and not refresh:
+        return dict(entry["result"], cached=True)
+
+    result = compute()
+    with _profiles_lock:
+        _profiles.pop(key, None)
+        _profiles[key] = {"version": version, "result": result}
+        while len(_profiles) > MAX_CACHED_PROFILES:
+            _profiles.pop(next(iter(_profiles)))
+    return dict(result, cached=False)
+
+# Function to compute row, null and distinct counts, min, max and mean of every column in one pass over the table
+# `approximate` counts distinct values with a HyperLogLog sketch instead of exactly.
+def profile_table(conn, table_name, sample_rows=None, approximate=False, refresh=False):
+    def compute():
+        start = time.perf_counter()
+        columns = get_columns_and_types(conn, table_name)
+        source, params, sampled = _profile_source(conn, table_name, sample_rows)
+        conn.create_aggregate("approx_distinct", 1, HyperLogLog)
+        distinct = "approx_distinct({})" if approximate else "count(DISTINCT {})"
+
+        rows = 0
+        stats = []
+        names = columns['name'].tolist()
+        for begin in range(0, max(len(names), 1), PROFILE_COLUMNS_PER_QUERY):
+            chunk = names[begin:begin + PROFILE_COLUMNS_PER_QUERY]
+            terms = ["count(*)"]
+            for name in chunk:
+                col = quote_ident(name)
+                terms += [f"count({col})", distinct.format(col), f"min({col})", f"max({col})",
+                          f"avg(CASE WHEN typeof({col}) IN ('integer', 'real') THEN {col} END)"]
+            values = conn.execute(f"{source} SELECT {', '.join(terms)} FROM src;", params).fetchone()
+            rows = values[0]
+            for i, name in enumerate(chunk):
+                non_null, distinct_count, low, high, mean = values[1 + 5 * i:6 + 5 * i]
+                stats.append({"column": name, "nulls": rows - non_null, "null %": round(100 * (rows - non_null) / rows, 2) if rows else 0.0,
+                              "distinct": distinct_count, "min": low, "max": high, "mean": mean})
+
+        profile = pd.DataFrame(stats, columns=['column', 'nulls', 'null %', 'distinct', 'min', 'max', 'mean'])
+        profile.insert(1, 'type', columns['type'].tolist())
+        # min/max mix numbers and text, show them as text so the column has one type
+        profile[['min', 'max']] = profile[['min', 'max']].astype(str).where(profile[['min', 'max']].notna(), None)
+        return {"rows": rows, "sampled": sampled, "approximate": approximate, "columns": profile,
+                "seconds": time.perf_counter() - start}
+
+    return _cached_profile(conn, ("table", table_name, sample_rows, approximate), compute, refresh)
+
+# Function to get the most frequent values of a column and, for numeric values, a histogram
+def profile_column(conn, table_name, column_name, sample_rows=None, top_n=10, bins=10, refresh=False):
+    def compute():
+        source, params, sampled = _profile_source(conn, table_name, sample_rows)
+        col = quote_ident(column_name)
+        top_values = pd.read_sql(f"{source} SELECT {col} AS value, count(*) AS count FROM src GROUP BY {col} ORDER BY count DESC LIMIT ?;",
+                                 conn, params=(*params, top_n))
+
+        histogram = None
+        numeric = f"FROM src WHERE typeof({col}) IN ('integer', 'real')"
+        low, high = conn.execute(f"{source} SELECT min({col}), max({col}) {numeric};", params).fetchone()
+        if low is not None:
+            # Random samples differ between the two queries, so buckets are clamped to the range found above
+            bucket = f"CASE WHEN ? = ? THEN 0 ELSE max(0, min(? - 1, CAST(({col} - ?) * ? / (? - ?) AS INTEGER))) END"
+            counts = dict(conn.execute(f"{source} SELECT {bucket} AS bucket, count(*) {numeric} GROUP BY bucket;",
+                                       (*params, high, low, bins, low, float(bins), high, low)).fetchall())
+            width = (high - low) / bins
+            histogram = pd.DataFrame({
+                "from": [low + i * width for i in range(bins)],
+                "to": [low + (i + 1) * width for i in range(bins)],
+                "count": [counts.get(i, 0) for i in range(bins)],
+            })
+        return {"top_values": top_values, "histogram": histogram, "sampled": sampled}
+
+    return _cached_profile(conn, ("column", table_name, column_name, sample_rows, top_n, bins), compute, refresh)
+
+
+# ==================================== Background jobs ===================================
+
+# Long operations (imports, column removals, exports, maintenance) run on a small worker pool so the
+# script thread stays responsive; the pool size can be set with SQLITE_GUI_JOB_WORKERS
+JOB_WORKERS = int(os.environ.get("SQLITE_GUI_JOB_WORKERS", 2))
+MAX_FINISHED_JOBS = 50
+
+# Every job of the process by id, oldest first
+_jobs = {}
+_jobs_lock = threading.Lock()
+_job_ids = itertools.count(1)
+_job_pool = None
+
+# Jobs on the same database file run one after another, SQLite only has one writer at a time
+_job_db_locks = collections.defaultdict(threading.Lock)
+
+# Raised inside a job once it has been cancelled
+class JobCancelled(Exception):
+    pass
+
+# A background job: `func(job)` runs on a worker thread with its own connection in `job.conn`
+# status is one of 'queued', 'running', 'done', 'failed' and 'cancelled'.
+class Job:
+    def __init__(self, name, func, db_file, owner, page, exclusive=True):
+        self.id = next(_job_ids)
+        self.name = name
+        self.func = func
+        self.exclusive = exclusive
+        self.db_file = db_file
+        self.owner = owner
+        self.page = page
+        self.status = "queued"
+        self.fraction = None
+        self.message = ""
+        self.steps = 0
+        self.result = None
+        self.error = None
+        self.download = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.conn = None
+        self.future = None
+        self.cancel_requested = False
+
+    # Function for the job to report the fraction done (0 to 1) and a message; raises JobCancelled once cancelled
+    def progress(self, fraction=None, message=None):
+        if fraction is not None:
+            self.fraction = min(max(fraction, 0.0), 1.0)
+        if message is not None:
+            self.message = message
+        if self.cancel_requested:
+            raise JobCancelled()
+
+    # SQLite progress handler of the job's connections (see set_progress): returns True to abort once cancelled
+    def tick(self):
+        self.steps += PROGRESS_STEPS
+        return self.cancel_requested
+
+    # Function to cancel the job: queued jobs never start, running statements are interrupted
+    def cancel(self):
+        self.cancel_requested = True
+        if self.future is not None and self.future.cancel():
+            self.status = "cancelled"
+            self.finished = time.time()
+        conn = self.conn
+        if conn is not None:
+            try:
+                conn.interrupt()
+            except sqlite3.ProgrammingError:
+                pass
+
+    @property
+    def active(self):
+        return self.status in ("queued", "running")
+
+# Function run on a worker thread for each job
+def _run_job(job):
+    with _job_db_locks[os.path.abspath(job.db_file)] if job.exclusive else contextlib.nullcontext():
+        if job.cancel_requested:
+            job.status = "cancelled"
+            job.finished = time.time()
+            return
+        set_query_page(job.page)
+        job.status = "running"
+        job.started = time.time()
+        try:
+            job.conn = open_connection(job.db_file)
+            set_progress(job.conn, job.tick)
+            job.result = job.func(job)
+            job.fraction = 1.0
+            job.status = "done"
+        except Exception as e:
+            # An interrupted statement surfaces as OperationalError('interrupted')
+            if job.cancel_requested and isinstance(e, (JobCancelled, sqlite3.OperationalError)):
+                job.status = "cancelled"
+            else:
+                job.status = "failed"
+                job.error = f"{type(e).__name__}: {e}"
+            if job.conn is not None and job.conn.in_transaction:
+                job.conn.rollback()
+        finally:
+            if job.conn is not None:
+                job.conn.close()
+                job.conn = None
+            job.finished = time.time()
+
+# Function to queue `func(job)` to run in the background on `db_file`; returns the Job
+# Jobs that only read can pass exclusive=False to run alongside the other jobs of the database.
+def submit_job(name, func, db_file=None, exclusive=True):
+    global _job_pool
+    job = Job(name, func, db_file or get_active_database(), _connection_owner(), getattr(_query_context, "page", ""), exclusive)
+    with _jobs_lock:
+        if _job_pool is None:
+            _job_pool = concurrent.futures.ThreadPoolExecutor(JOB_WORKERS, thread_name_prefix="sqlite-gui-job")
+        _jobs[job.id] = job
+        finished = [old for old in _jobs.values() if not old.active]
+        for old in finished[:max(len(finished) - MAX_FINISHED_JOBS, 0)]:
+            _forget_job(old)
+    job.future = _job_pool.submit(_run_job, job)
+    return job
+
+# Function to drop a finished job (call with _jobs_lock held); a file it produced stays until prune_exports removes it
+def _forget_job(job):
+    _jobs.pop(job.id, None)
+
+# Function to list the caller's jobs (everyone's with all_owners=True), oldest first
+def list_jobs(all_owners=False):
+    owner = _connection_owner()
+    with _jobs_lock:
+        return [job for job in _jobs.values() if all_owners or job.owner == owner]
+
+# Function to get a job by id
+def get_job(job_id):
+    with _jobs_lock:
+        return _jobs.get(job_id)
+
+# Function to remove the caller's finished jobs, with the export files they produced
+def clear_finished_jobs():
+    owner = _connection_owner()
+    with _jobs_lock:
+        for job in [job for job in _jobs.values() if job.owner == owner and not job.active]:
+            _forget_job(job)
+            if job.download:
+                remove_export(job.download["path"])
+
+
+# ==================================== Query governor ===================================
+
+# Limits of the queries users type (SQL console, assistant), override them with SQLITE_GUI_QUERY_TIMEOUT (seconds)
+# and SQLITE_GUI_QUERY_MAX_ROWS
+QUERY_TIME_BUDGET = float(os.environ.get("SQLITE_GUI_QUERY_TIMEOUT", 10))
+QUERY_MAX_ROWS = int(os.environ.get("SQLITE_GUI_QUERY_MAX_ROWS", 10000))
+QUERY_CHUNK_ROWS = 500
+
+# Virtual machine steps between two checks of the budget, a query is stopped within a few milliseconds
+GOVERNOR_STEPS = 1000
+
+# Raised when the governor stops a query, because it ran over its time budget or was cancelled
+class QueryStoppedError(sqlite3.OperationalError):
+    pass
+
+# Authorizer actions allowed in read-only mode, the PRAGMAs that only read (with or without an argument) and the ones
+# that only report a setting when called without an argument. Other PRAGMAs (optimize, incremental_vacuum,
+# wal_checkpoint, shrink_memory, ...) act even without an argument, so they are denied.
+_READ_ONLY_ACTIONS = {sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION, getattr(sqlite3, "SQLITE_RECURSIVE", 33)}
+_READ_ONLY_PRAGMAS = {"table_info", "table_xinfo", "table_list", "index_list", "index_info", "index_xinfo",
+                      "foreign_key_list", "foreign_key_check", "integrity_check", "quick_check"}
+_SETTING_PRAGMAS = {"application_id", "auto_vacuum", "automatic_index", "busy_timeout", "cache_size", "cache_spill",
+                    "cell_size_check", "collation_list", "compile_options", "data_version", "database_list",
+                    "defer_foreign_keys", "encoding", "foreign_keys", "freelist_count", "function_list",
+                    "journal_mode", "journal_size_limit", "legacy_alter_table", "locking_mode", "max_page_count",
+                    "mmap_size", "module_list", "page_count", "page_size", "pragma_list", "query_only",
+                    "recursive_triggers", "schema_version", "secure_delete", "synchronous", "temp_store",
+                    "trusted_schema", "user_version", "wal_autocheckpoint"}
+
+# Authorizer of read-only queries: anything that could write (including changing PRAGMAs or ATTACH) is denied
+def _read_only_authorizer(action, arg1, arg2, db_name, trigger):
+    if action in _READ_ONLY_ACTIONS:
+        return sqlite3.SQLITE_OK
+    if action == sqlite3.SQLITE_PRAGMA and (arg1.lower() in _READ_ONLY_PRAGMAS
+                                            or (arg2 is None and arg1.lower() in _SETTING_PRAGMAS)):
+        return sqlite3.SQLITE_OK
+    # SQLite itself asks for these while reading the schema; nobody can write there without PRAGMA writable_schema
+    if action == sqlite3.SQLITE_UPDATE and arg1 in ("sqlite_master", "sqlite_temp_master"):
+        return sqlite3.SQLITE_OK
+    return sqlite3.SQLITE_DENY
+
+# Function to run one statement under limits, yielding its rows as DataFrames of `chunk_rows` rows
+# - timeout: seconds for the whole run, checked by the progress handler, so even a runaway join stops
+# - max_rows: rows returned at most (None for no limit), stats["truncated"] tells whether some were left out
+# - read_only: statements that would write are refused by an authorizer
+# - cancel: a function returning True once the query should stop
+# `stats` (a dict) receives columns, rows, rows_affected (for statements that return no rows) and seconds.
+# A statement that runs to the end is committed (rows left out by max_rows were still written, e.g. INSERT ... RETURNING);
+# one that is stopped, cancelled, fails or whose rows stop being read is rolled back.
+def run_governed(conn, query, params=(), timeout=QUERY_TIME_BUDGET, max_rows=QUERY_MAX_ROWS, read_only=True,
+                 chunk_rows=QUERY_CHUNK_ROWS, cancel=None, stats=None):
+    stats = stats if stats is not None else {}
+    stats.update(columns=[], rows=0, truncated=False, rows_affected=None, seconds=0.0)
+    start = time.monotonic()
+    stopped = []
+
+    def check():
+        if cancel is not None and cancel():
+            stopped.append("was cancelled")
+        elif timeout and time.monotonic() - start > timeout:
+            stopped.append(f"ran over its {timeout:g}s time budget")
+        return 1 if stopped else 0
+
+    if conn.in_transaction:
+        conn.commit()
+    conn.set_progress_handler(check, GOVERNOR_STEPS)
+    if read_only:
+        conn.set_authorizer(_read_only_authorizer)
+    try:
+        cursor = conn.execute(query, params)
+        if cursor.description is None:
+            stats["rows_affected"] = cursor.rowcount
+            if conn.in_transaction:
+                conn.commit()
+            return
+        stats["columns"] = [col[0] for col in cursor.description]
+        while not max_rows or stats["rows"] < max_rows:
+            rows = cursor.fetchmany(min(chunk_rows, max_rows - stats["rows"]) if max_rows else chunk_rows)
+            if not rows:
+                break
+            stats["rows"] += len(rows)
+            yield pd.DataFrame(rows, columns=stats["columns"])
+        else:
+            stats["truncated"] = cursor.fetchone() is not None
+        # A write with RETURNING is still a statement in progress until its cursor is closed, COMMIT would fail
+        cursor.close()
+        if conn.in_transaction:
+            conn.commit()
+    except sqlite3.DatabaseError as e:
+        if stopped:
+            raise QueryStoppedError(f"The query {stopped[0]}.") from e
+        if read_only and "not authorized" in str(e):
+            raise sqlite3.DatabaseError("Read-only mode: this statement would change the database.") from e
+        raise
+    finally:
+        stats["seconds"] = time.monotonic() - start
+        if conn.in_transaction:
+            conn.rollback()
+        conn.set_progress_handler(None, 0)
+        if read_only:
+            conn.set_authorizer(None)
+
+
+# ==================================== Import functions ===================================
+
+# Number of rows shown in the preview of an upload
+PREVIEW_ROWS = 100
+
+# Number of rows read and written per batch while importing
+BATCH_ROWS = 50000
+
+# Parsed uploads are kept as Parquet files named after their content hash, so the same file is only parsed once.
+# The least recently used ones are removed once the cache is over its size (SQLITE_GUI_UPLOAD_CACHE_MB, 0 turns it off).
+UPLOAD_CACHE_DIR = os.environ.get("SQLITE_GUI_UPLOAD_CACHE", os.path.join(tempfile.gettempdir(), "sqlite_gui_uploads"))
+UPLOAD_CACHE_BYTES = int(float(os.environ.get("SQLITE_GUI_UPLOAD_CACHE_MB", 1024)) * 1024 * 1024)
+
+# Internal tables of the incremental import: a content hash per imported row and a fingerprint per imported file/sheet
+ROW_FINGERPRINTS_TABLE = "_row_fingerprints"
+FILE_FINGERPRINTS_TABLE = "_import_fingerprints"
+
+# The app's own bookkeeping tables, left out of the schema catalog so they aren't listed as user tables
+INTERNAL_TABLES = (ROW_FINGERPRINTS_TABLE, FILE_FINGERPRINTS_TABLE)
+
+# How dates are stored: ISO-8601 text (readable, works with date()) or Unix epoch seconds (8 bytes at most)
+DATE_STORAGE = {"iso": "ISO-8601 text", "epoch": "Unix epoch seconds (INTEGER)"}
+
+# Table layouts offered when creating a table; "auto" picks WITHOUT ROWID for narrow tables with a non-integer key
+TABLE_LAYOUTS = {"auto": "Automatic", "rowid": "Rowid table", "without_rowid": "WITHOUT ROWID"}
+
+# Average row size (bytes) up to which "auto" picks WITHOUT ROWID, about 1/20 of a 4 KiB page as the SQLite docs advise
+WITHOUT_ROWID_MAX_ROW_BYTES = 200
+
+# Text columns with at most this many distinct values (and under this share of the rows) are reported as low-cardinality
+CATEGORY_MAX_DISTINCT = 256
+CATEGORY_MAX_RATIO = 0.05
+
+# STRICT tables need SQLite 3.37+
+STRICT_TABLES_SUPPORTED = sqlite3.sqlite_version_info >= (3, 37, 0)
+
+# Dates written the way SQLite's own date functions do, with an optional time and UTC offset
+_ISO_DATE = r"^\d{4}-\d{2}-\d{2}(?:[T ]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?(?:Z|[+-]\d{2}:?\d{2})?)?$"
+
+# Function to parse a column as dates, returning None when it doesn't hold only dates (or ISO date strings)
+def _date_values(series):
+    if pd.api.types.is_datetime64_any_dtype(series):
+        values = series
+    elif pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series):
+        present = series.dropna()
+        kind = pd.api.types.infer_dtype(present, skipna=True)
+        if present.empty or kind not in ("datetime", "datetime64", "date", "string"):
+            return None
+        if kind == "string" and not present.astype(str).str.match(_ISO_DATE).all():
+            return None
+        try:
+            values = pd.to_datetime(series, format="ISO8601" if kind == "string" else None, utc=kind == "string")
+        except (ValueError, TypeError, OverflowError):
+            return None
+    else:
+        return None
+    if getattr(values.dt, "tz", None) is not None:
+        values = values.dt.tz_convert("UTC").dt.tz_localize(None)
+    return values
+
+# Function to work out what a column holds: integer, real, boolean, date, datetime, category (low-cardinality text) or text
+def infer_column_kind(series):
+    present = series.dropna()
+    if present.empty:
+        return "text"
+    if pd.api.types.is_bool_dtype(series) or pd.api.types.infer_dtype(present, skipna=True) == "boolean":
+        return "boolean"
+    if pd.api.types.is_integer_dtype(series):
+        return "integer"
+    if pd.api.types.is_float_dtype(series):
+        # Integer columns with missing values are read as floats
+        values = present.astype(float)
+        return "integer" if (values % 1 == 0).all() and values.abs().max() < 2 ** 63 else "real"
+    if pd.api.types.is_numeric_dtype(series):
+        return "real"
+    dates = _date_values(series)
+    if dates is not None:
+        dates = dates.dropna()
+        return "date" if (dates == dates.dt.normalize()).all() else "datetime"
+    kind = pd.api.types.infer_dtype(present, skipna=True)
+    if kind == "integer":
+        return "integer"
+    if kind in ("floating", "mixed-integer-float", "decimal"):
+        return "real"
+    distinct = present.astype(str).nunique()
+    if distinct <= CATEGORY_MAX_DISTINCT and distinct <= CATEGORY_MAX_RATIO * len(present):
+        return "category"
+    return "text"
+
+# Function to infer the SQLite type of every column of a dataframe
+# Returns {column: {"kind": ..., "type": INTEGER/REAL/TEXT}}; `dates` is a key of DATE_STORAGE.
+def infer_column_types(df, dates="iso"):
+    types = {}
+    for col in df.columns:
+        kind = infer_column_kind(df[col])
+        if kind in ("integer", "boolean"):
+            sqlite_type = "INTEGER"
+        elif kind == "real":
+            sqlite_type = "REAL"
+        elif kind in ("date", "datetime"):
+            sqlite_type = "INTEGER" if dates == "epoch" else "TEXT"
+        else:
+            sqlite_type = "TEXT"
+        types[str(col)] = {"kind": kind, "type": sqlite_type}
+    return types
+
+# Function to estimate the average stored size of a row, used to decide whether WITHOUT ROWID pays off
+def _estimated_row_bytes(df, types):
+    total = 0
+    for col, info in types.items():
+        if info["type"] == "TEXT":
+            lengths = df[col].dropna().astype(str).str.len()
+            total += lengths.mean() if len(lengths) else 0
+        else:
+            total += 8
+    return total + len(types)
+
+# Function to convert a batch to the storage of an existing table: dates become ISO text or epoch seconds,
+# booleans 0/1 and whole-number floats integers, following each column's declared type
+def coerce_frame(conn, df, table_name):
+    declared = {col["name"]: col["type"].upper() for col in get_schema_catalog(conn)["tables"][table_name]["columns"]}
+    converted = {}
+    for col in df.columns:
+        series = df[col]
+        sqlite_type = declared.get(str(col), "")
+        if "INT" in sqlite_type:
+            if pd.api.types.is_bool_dtype(series):
+                converted[col] = series.astype("Int64")
+                continue
+            if pd.api.types.is_float_dtype(series):
+                present = series.dropna()
+                if (present % 1 == 0).all() and (present.abs() < 2 ** 63).all():
+                    converted[col] = series.astype("Int64")
+                continue
+        if pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+            continue
+        if sqlite_type in ("TEXT", "") and not pd.api.types.is_datetime64_any_dtype(series) and pd.api.types.infer_dtype(series, skipna=True) == "string":
+            # Text stays as it is, ISO date strings included
+            continue
+        dates = _date_values(series)
+        if dates is None:
+            continue
+        if "INT" in sqlite_type:
+            converted[col] = ((dates - pd.Timestamp(0)) // pd.Timedelta(seconds=1)).astype("Int64")
+        else:
+            date_only = (dates.dropna() == dates.dropna().dt.normalize()).all()
+            converted[col] = dates.dt.strftime("%Y-%m-%d" if date_only else "%Y-%m-%d %H:%M:%S").where(dates.notna(), None)
+    return df.assign(**converted) if converted else df
+
+# Function to check if a table exists in SQLite
+def check_table_exists(conn, table_name):
+    query = "SELECT name FROM sqlite_master WHERE type='table' AND name=?;"
+    result = conn.execute(query, (table_name,)).fetchone()
+    return result is not None
+
+# Function to turn a dataframe into plain python rows that sqlite3 can bind (NaN/NaT become NULL)
+def dataframe_rows(df):
+    columns = []
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_datetime64_any_dtype(series):
+            series = series.astype(str).where(series.notna(), None)
+        columns.append(series.astype(object).where(series.notna(), None).tolist())
+    return zip(*columns)
+
+# Function to check whether a column is backed by a PRIMARY KEY/UNIQUE constraint (needed for ON CONFLICT)
+def has_unique_key(conn, table_name, column):
+    table = get_schema_catalog(conn)["tables"][table_name]
+    if table["primary_key"] == [column]:
+        return True
+    return any(index["unique"] and not index["partial"] and index["columns"] == [column] for index in table["indexes"])
+
+# Function to update existing rows or insert new rows based on the primary key
+# The upload is staged into a temp table and applied with set-based SQL in a single transaction.
+# Returns a summary dict with the number of inserted, updated and unchanged keys (a repeated key counts once).
+def upsert_data(conn, df, table_name, primary_key):
+    df = coerce_frame(conn, df, table_name)
+    columns = [str(col) for col in df.columns]
+    table = quote_ident(table_name)
+    pk = quote_ident(primary_key)
+    column_list = ", ".join(quote_ident(col) for col in columns)
+    other_columns = [quote_ident(col) for col in columns if col != primary_key]
+    changed = " OR ".join(f"t.{col} IS NOT s.{col}" for col in other_columns) or "0"
+
+    # Each staged row is matched on the key, so let the index advisor know about that lookup
+    observe_query(get_database_file(conn), f"SELECT * FROM main.{table} WHERE {pk} = ?;", (None,), table_name, [primary_key])
+
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute("BEGIN IMMEDIATE;")
+    try:
+        # Stage the upload; CREATE TABLE AS keeps the target's column affinities so comparisons match
+        conn.execute("DROP TABLE IF EXISTS temp._upsert_stage;")
+        conn.execute(f"CREATE TEMP TABLE _upsert_stage AS SELECT {column_list} FROM main.{table} WHERE 0;")
+        conn.executemany(
+            f"INSERT INTO temp._upsert_stage ({column_list}) VALUES ({', '.join('?' * len(columns))});",
+            dataframe_rows(df),
+        )
+        # A key that appears more than once keeps only its last row, so every key is counted and applied once.
+        # The pass over the stage only runs when pandas sees a repeated key (comparing text too, as SQLite's affinity would).
+        keys = df[primary_key].dropna()
+        if keys.duplicated().any() or (keys.dtype == object and keys.astype(str).duplicated().any()):
+            conn.execute(
+                f"DELETE FROM temp._upsert_stage WHERE {pk} IS NOT NULL AND rowid NOT IN "
+                f"(SELECT max(rowid) FROM temp._upsert_stage WHERE {pk} IS NOT NULL GROUP BY {pk});"
+            )
+
+        # Work out the change set before applying it
+        total = conn.execute("SELECT count(*) FROM temp._upsert_stage;").fetchone()[0]
+        # Anti-joins are written as LEFT JOINs so SQLite can build an automatic index when the key isn't indexed
+        inserted = conn.execute(
+            f"SELECT count(*) FROM temp._upsert_stage s LEFT JOIN main.{table} t ON t.{pk} = s.{pk} WHERE t.{pk} IS NULL;"
+        ).fetchone()[0]
+        updated = conn.execute(
+            f"SELECT count(*) FROM temp._upsert_stage s JOIN main.{table} t ON t.{pk} = s.{pk} WHERE {changed};"
+        ).fetchone()[0]
+
+        if has_unique_key(conn, table_name, primary_key):
+            if other_columns:
+                assignments = ", ".join(f"{col} = excluded.{col}" for col in other_columns)
+                changed_excluded = " OR ".join(f"{table}.{col} IS NOT excluded.{col}" for col in other_columns)
+                conflict = f"DO UPDATE SET {assignments} WHERE {changed_excluded}"
+            else:
+                conflict = "DO NOTHING"
+            # "WHERE true" is required so the parser doesn't read ON CONFLICT as a join constraint
+            conn.execute(
+                f"INSERT INTO main.{table} ({column_list}) SELECT {column_list} FROM temp._upsert_stage WHERE true "
+                f"ON CONFLICT({pk}) {conflict};"
+            )
+        else:
+            # No unique constraint on the key column, so ON CONFLICT can't fire: update then insert
+            if other_columns:
+                assignments = ", ".join(f"{col} = s.{col}" for col in other_columns)
+                conn.execute(
+                    f"UPDATE main.{table} AS t SET {assignments} FROM temp._upsert_stage AS s WHERE t.{pk} = s.{pk} AND ({changed});"
+                )
+            staged_columns = ", ".join(f"s.{quote_ident(col)}" for col in columns)
+            conn.execute(
+                f"INSERT INTO main.{table} ({column_list}) SELECT {staged_columns} FROM temp._upsert_stage s "
+                f"LEFT JOIN main.{table} t ON t.{pk} = s.{pk} WHERE t.{pk} IS NULL;"
+            )
+
+        conn.execute("DROP TABLE temp._upsert_stage;")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    return {"inserted": inserted, "updated": updated, "unchanged": total - inserted - updated}
+
+# Function to create a new table based on the dataframe and primary key selection
+# Column types are inferred from the data (see infer_column_types). `strict` makes a STRICT table, `layout` is a key
+# of TABLE_LAYOUTS and `dates` a key of DATE_STORAGE. Returns the inferred column types.
+def create_table_from_df(conn, df, table_name, primary_key, strict=False, layout="auto", dates="iso"):
+    types = infer_column_types(df, dates=dates)
+    has_key = primary_key in df.columns
+    if layout == "auto":
+        # An INTEGER PRIMARY KEY already is the rowid, so WITHOUT ROWID only helps other keys on narrow rows
+        layout = "rowid"
+        if has_key and types[str(primary_key)]["type"] != "INTEGER" and df[primary_key].notna().all() and df[primary_key].is_unique:
+            if _estimated_row_bytes(df, types) <= WITHOUT_ROWID_MAX_ROW_BYTES:
+                layout = "without_rowid"
+    if layout == "without_rowid" and not has_key:
+        raise ValueError("A WITHOUT ROWID table needs a primary key.")
+    if strict and not STRICT_TABLES_SUPPORTED:
+        raise ValueError(f"STRICT tables need SQLite 3.37 or newer, this is {sqlite3.sqlite_version}.")
+
+    # Build the SQL column definitions, with the primary key inline
+    columns = []
+    for col, info in types.items():
+        definition = f"{quote_ident(col)} {info['type']}"
+        if has_key and col == str(primary_key):
+            definition += " NOT NULL PRIMARY KEY" if layout == "without_rowid" else " PRIMARY KEY"
+        columns.append(definition)
+
+    options = [option for option, enabled in (("STRICT", strict), ("WITHOUT ROWID", layout == "without_rowid")) if enabled]
+
+    # Join the column definitions into a CREATE TABLE statement
+    columns_def = ", ".join(columns)
+    create_table_query = f"CREATE TABLE {quote_ident(table_name)} ({columns_def}){' ' + ', '.join(options) if options else ''};"
+
+    # Execute the query
+    conn.execute(create_table_query)
+    return types
+
+# Function to read an uploaded Excel/CSV/Parquet file as a stream of dataframes
+# Yields (batch, fraction_done) pairs; fraction_done is None when the total size is unknown.
+# `sheet` picks a worksheet of a workbook (the active one by default).
+def iter_upload_batches(uploaded_file, batch_size=BATCH_ROWS, sheet=None):
+    name = uploaded_file.name.lower()
+    uploaded_file.seek(0)
+
+    if name.endswith(".csv"):
+        size = uploaded_file.size or None
+        # Our own text wrapper, so pandas doesn't close the upload when the reader is closed
+        text = io.TextIOWrapper(uploaded_file, encoding="utf-8", newline="")
+        try:
+            for batch in pd.read_csv(text, chunksize=batch_size):
+                yield batch, min(uploaded_file.tell() / size, 1.0) if size else None
+        finally:
+            text.detach()
+
+    elif name.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        parquet_file = pq.ParquetFile(uploaded_file)
+        total_rows = parquet_file.metadata.num_rows
+        rows_read = 0
+        for batch in parquet_file.iter_batches(batch_size=batch_size):
+            rows_read += batch.num_rows
+            yield batch.to_pandas(), rows_read / total_rows if total_rows else None
+
+    else:
+        # Read-only mode streams the sheet XML instead of building the whole workbook in memory
+        from openpyxl import load_workbook
+        workbook = load_workbook(uploaded_file, read_only=True, data_only=True)
+        try:
+            worksheet = workbook[sheet] if sheet else workbook.active
+            total_rows = (worksheet.max_row - 1) if worksheet.max_row else None
+            rows = worksheet.iter_rows(values_only=True)
+            header = [str(value) if value is not None else f"Unnamed: {i}" for i, value in enumerate(next(rows, ()))]
+            batch = []
+            rows_read = 0
+            for row in rows:
+                if all(value is None for value in row):
+                    continue
+                batch.append(row[:len(header)])
+                if len(batch) == batch_size:
+                    rows_read += len(batch)
+                    yield pd.DataFrame(batch, columns=header), min(rows_read / total_rows, 1.0) if total_rows else None
+                    batch = []
+            if batch:
+                yield pd.DataFrame(batch, columns=header), 1.0
+        finally:
+            workbook.close()
+
+# Function to find the cache file of a parsed upload
+def upload_cache_path(file_sha256, sheet=None):
+    name = file_sha256 + (f"-{hashlib.sha256(sheet.encode()).hexdigest()[:16]}" if sheet else "")
+    return os.path.join(UPLOAD_CACHE_DIR, f"{name}.parquet")
+
+# Function to remove the least recently used cache files until the cache fits its size limit (`keep` is never removed)
+def evict_upload_cache(keep=None):
+    try:
+        entries = [entry for entry in os.scandir(UPLOAD_CACHE_DIR) if entry.name.endswith(".parquet")]
+    except FileNotFoundError:
+        return
+    entries.sort(key=lambda entry: entry.stat().st_mtime)
+    total = sum(entry.stat().st_size for entry in entries)
+    for entry in entries:
+        if total <= UPLOAD_CACHE_BYTES:
+            break
+        if entry.path == keep:
+            continue
+        total -= entry.stat().st_size
+        try:
+            os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+
+# Function to read an upload as a stream of dataframes like iter_upload_batches, parsing it only once:
+# the first full read spills the batches to a Parquet file in the upload cache, later reads stream that file instead.
+# Batches that Parquet can't hold (e.g. a column mixing numbers and text) just turn the spilling off.
+def iter_cached_upload_batches(uploaded_file, batch_size=BATCH_ROWS, sheet=None, file_sha256=None):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        pa = None
+    if pa is None or UPLOAD_CACHE_BYTES <= 0:
+        yield from iter_upload_batches(uploaded_file, batch_size=batch_size, sheet=sheet)
+        return
+
+    path = upload_cache_path(file_sha256 or upload_sha256(uploaded_file), sheet)
+    if os.path.exists(path):
+        # Touching the file keeps it at the young end of the LRU order
+        os.utime(path)
+        parquet_file = pq.ParquetFile(path)
+        total_rows = parquet_file.metadata.num_rows
+        rows_read = 0
+        for batch in parquet_file.iter_batches(batch_size=batch_size):
+            rows_read += batch.num_rows
+            yield batch.to_pandas(), rows_read / total_rows if total_rows else None
+        return
+
+    os.makedirs(UPLOAD_CACHE_DIR, exist_ok=True)
+    spill_path = f"{path}.{os.getpid()}.{id(uploaded_file)}.tmp"
+    writer = None
+    spilling = True
+    try:
+        for batch, fraction_done in iter_upload_batches(uploaded_file, batch_size=batch_size, sheet=sheet):
+            if spilling:
+                try:
+                    table = pa.Table.from_pandas(batch, preserve_index=False)
+                    if writer is None:
+                        writer = pq.ParquetWriter(spill_path, table.schema)
+                    elif not table.schema.equals(writer.schema):
+                        table = table.cast(writer.schema)
+                    writer.write_table(table)
+                except (pa.ArrowException, ValueError, TypeError):
+                    spilling = False
+            yield batch, fraction_done
+        if spilling and writer is not None:
+            writer.close()
+            writer = None
+            os.replace(spill_path, path)
+            evict_upload_cache(keep=path)
+    finally:
+        if writer is not None:
+            writer.close()
+        if os.path.exists(spill_path):
+            os.remove(spill_path)
+
+# Function to read only the first rows of an upload for the preview and column matching
+# A file that is already in the upload cache is previewed from there.
+def read_upload_preview(uploaded_file, rows=PREVIEW_ROWS, file_sha256=None):
+    if file_sha256 and os.path.exists(upload_cache_path(file_sha256)):
+        batches = iter_cached_upload_batches(uploaded_file, batch_size=rows, file_sha256=file_sha256)
+    else:
+        batches = iter_upload_batches(uploaded_file, batch_size=rows)
+    try:
+        preview, _ = next(batches, (pd.DataFrame(), None))
+    finally:
+        batches.close()
+    return preview
+
+# Function to hash the content of an upload, used as its file fingerprint
+def upload_sha256(uploaded_file):
+    uploaded_file.seek(0)
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: uploaded_file.read(1 << 20), b""):
+        digest.update(chunk)
+    uploaded_file.seek(0)
+    return digest.hexdigest()
+
+# Function to create the fingerprint tables of the incremental import when they don't exist yet
+def ensure_fingerprint_tables(conn):
+    conn.execute(
+        f"CREATE TABLE IF NOT EXISTS {ROW_FINGERPRINTS_TABLE} (table_name TEXT NOT NULL, key NOT NULL, hash INTEGER NOT NULL, "
+        "PRIMARY KEY (table_name, key)) WITHOUT ROWID;"
+    )
+    conn.execute(
+        f"CREATE TABLE IF NOT EXISTS {FILE_FINGERPRINTS_TABLE} (table_name TEXT NOT NULL, source TEXT NOT NULL, sheet TEXT NOT NULL, "
+        "file_sha256 TEXT NOT NULL, rows INTEGER, table_rows INTEGER, imported_at TEXT DEFAULT CURRENT_TIMESTAMP, "
+        "PRIMARY KEY (table_name, source, sheet));"
+    )
+
+# Function to hash every row of a dataframe in one vectorized pass (signed 64-bit, so SQLite can store it)
+# categorize=False gives the same hashes and is faster on the mostly distinct values of a data file
+def row_hashes(df):
+    return pd.util.hash_pandas_object(df, index=False, categorize=False).to_numpy().view("int64")
+
+# Function to load the row hashes stored for a table by earlier imports, as a Series indexed by key
+# Only the hashes of keys the table still has are used, so a row deleted elsewhere is written again; rows inserted
+# elsewhere have no hash and are compared like new ones. Hashes of deleted keys are dropped once the counts differ.
+def stored_row_hashes(conn, table_name, primary_key):
+    table = quote_ident(table_name)
+    key_match = f"main.{table}.{quote_ident(primary_key)} = {ROW_FINGERPRINTS_TABLE}.key"
+    stored = conn.execute(f"SELECT count(*) FROM {ROW_FINGERPRINTS_TABLE} WHERE table_name = ?;", (table_name,)).fetchone()[0]
+    if stored != conn.execute(f"SELECT count(*) FROM main.{table};").fetchone()[0]:
+        conn.execute(
+            f"DELETE FROM {ROW_FINGERPRINTS_TABLE} WHERE table_name = ? AND NOT EXISTS (SELECT 1 FROM main.{table} WHERE {key_match});",
+            (table_name,),
+        )
+        conn.commit()
+    rows = conn.execute(
+        f"SELECT key, hash FROM {ROW_FINGERPRINTS_TABLE} JOIN main.{table} ON {key_match} WHERE table_name = ?;", (table_name,)
+    ).fetchall()
+    frame = pd.DataFrame.from_records(rows, columns=["key", "hash"])
+    return pd.Series(frame["hash"].to_numpy(dtype="int64"), index=pd.Index(frame["key"]))
+
+# Function to write only the rows of a batch whose content hash differs from the stored one (see stored_row_hashes)
+# Returns the upsert summary, with the skipped rows counted as unchanged.
+def upsert_changed_rows(conn, df, table_name, primary_key, stored):
+    df = coerce_frame(conn, df, table_name)
+    hashes = row_hashes(df)
+    positions = stored.index.get_indexer(df[primary_key])
+    changed = positions < 0
+    if len(stored):
+        changed |= stored.to_numpy()[positions] != hashes
+
+    summary = {"inserted": 0, "updated": 0, "unchanged": int((~changed).sum())}
+    if changed.any():
+        batch_summary = upsert_data(conn, df[changed], table_name, primary_key)
+        for key in summary:
+            summary[key] += batch_summary[key]
+
+        # The hashes are stored after the rows were written, so a failed write is simply retried by the next import
+        keys = df.loc[changed, [primary_key]].assign(_hash=hashes[changed]).dropna()
+        conn.executemany(
+            f"INSERT OR REPLACE INTO {ROW_FINGERPRINTS_TABLE} (table_name, key, hash) VALUES (?, ?, ?);",
+            ((table_name, key, row_hash) for key, row_hash in dataframe_rows(keys)),
+        )
+        conn.commit()
+    return summary
+
+# Function to remember the keys of a batch, so rows missing from the whole upload can be deleted afterwards
+# NULL keys are skipped: a single NULL in the NOT IN list of delete_missing_rows would make it match no row at all.
+def remember_keys(conn, df, table_name, primary_key):
+    keys = coerce_frame(conn, df[[primary_key]], table_name).dropna()
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS _import_seen (key PRIMARY KEY);")
+    conn.executemany("INSERT OR IGNORE INTO temp._import_seen (key) VALUES (?);", dataframe_rows(keys))
     conn.commit()
-    conn.close()
+
+# Function to delete the rows (and their stored hashes) whose key wasn't in the upload; returns the number deleted
+def delete_missing_rows(conn, table_name, primary_key):
+    table = quote_ident(table_name)
+    pk = quote_ident(primary_key)
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute("BEGIN IMMEDIATE;")
+    try:
+        deleted = conn.execute(f"DELETE FROM main.{table} WHERE {pk} NOT IN (SELECT key FROM temp._import_seen);").rowcount
+        if check_table_exists(conn, ROW_FINGERPRINTS_TABLE):
+            conn.execute(
+                f"DELETE FROM main.{ROW_FINGERPRINTS_TABLE} WHERE table_name = ? AND key NOT IN (SELECT key FROM temp._import_seen);",
+                (table_name,),
+            )
+        conn.execute("DROP TABLE temp._import_seen;")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return deleted
+
+# Function to check whether this exact file/sheet was the last one imported into the table and the table still holds its rows
+def is_unchanged_upload(conn, table_name, source, sheet, file_sha256):
+    previous = conn.execute(
+        f"SELECT file_sha256, table_rows FROM {FILE_FINGERPRINTS_TABLE} WHERE table_name = ? AND source = ? AND sheet = ?;",
+        (table_name, source, sheet),
+    ).fetchone()
+    if previous is None or previous[0] != file_sha256 or not check_table_exists(conn, table_name):
+        return None
+    table_rows = conn.execute(f"SELECT count(*) FROM {quote_ident(table_name)};").fetchone()[0]
+    return table_rows if table_rows == previous[1] else None
+
+# Function to import an upload batch by batch, writing each one to SQLite as soon as it is parsed
+# `progress` is called with the fraction done after every batch. Returns the summed upsert summary.
+# When creating the table, its types are inferred from the first batch and `table_options` go to create_table_from_df.
+# `incremental` only writes rows whose content hash changed since the last import (and skips a file imported
+# unchanged), `delete_missing` deletes the rows whose key isn't in the upload once all of it was imported.
+# The upload is read through the upload cache; pass `file_sha256` when its hash is already known.
+def import_upload(conn, uploaded_file, table_name, primary_key, create_table=False, progress=None, table_options=None,
+                  incremental=False, delete_missing=False, sheet=None, file_sha256=None):
+    summary = {"inserted": 0, "updated": 0, "unchanged": 0, "deleted": 0}
+    source = uploaded_file.name
+    file_sha256 = file_sha256 or upload_sha256(uploaded_file)
+    if incremental:
+        ensure_fingerprint_tables(conn)
+        if not create_table:
+            table_rows = is_unchanged_upload(conn, table_name, source, sheet or "", file_sha256)
+            if table_rows is not None:
+                summary["unchanged"] = table_rows
+                return summary
+    conn.execute("DROP TABLE IF EXISTS temp._import_seen;")
+
+    stored = stored_row_hashes(conn, table_name, primary_key) if incremental and not create_table else pd.Series([], dtype="int64")
+    rows = 0
+    for batch, fraction_done in iter_cached_upload_batches(uploaded_file, sheet=sheet, file_sha256=file_sha256):
+        if create_table:
+            create_table_from_df(conn, batch, table_name, primary_key, **(table_options or {}))
+            if incremental:
+                # Hashes left behind by an earlier table of the same name don't describe this one
+                conn.execute(f"DELETE FROM {ROW_FINGERPRINTS_TABLE} WHERE table_name = ?;", (table_name,))
+                conn.commit()
+            create_table = False
+        if incremental:
+            batch_summary = upsert_changed_rows(conn, batch, table_name, primary_key, stored)
+        else:
+            batch_summary = upsert_data(conn, batch, table_name, primary_key)
+        if delete_missing:
+            remember_keys(conn, batch, table_name, primary_key)
+        rows += len(batch)
+        for key in batch_summary:
+            summary[key] += batch_summary[key]
+        if progress and fraction_done is not None:
+            progress(fraction_done)
+
+    if delete_missing:
+        summary["deleted"] = delete_missing_rows(conn, table_name, primary_key)
+    if incremental:
+        table_rows = conn.execute(f"SELECT count(*) FROM {quote_ident(table_name)};").fetchone()[0]
+        conn.execute(
+            f"INSERT OR REPLACE INTO {FILE_FINGERPRINTS_TABLE} (table_name, source, sheet, file_sha256, rows, table_rows) "
+            "VALUES (?, ?, ?, ?, ?, ?);",
+            (table_name, source, sheet or "", file_sha256, rows, table_rows),
+        )
+        conn.commit()
+    return summary
+
+# A file on disk with the attributes of a Streamlit upload (name, size), so scripts can use the import functions
+class LocalUpload:
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        self.path = path
+        self.name = os.path.basename(path)
+        self.size = os.path.getsize(path)
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self._file.close()
+
+# Function to list the worksheets of a workbook ([None] for CSV and Parquet files, which have no sheets)
+def upload_sheet_names(path):
+    if not path.lower().endswith(".xlsx"):
+        return [None]
+    from openpyxl import load_workbook
+    workbook = load_workbook(path, read_only=True)
+    try:
+        return list(workbook.sheetnames)
+    finally:
+        workbook.close()
+
+# Function run in the worker processes of import_files: parses one file/sheet into the upload cache and returns its hash
+def _parse_upload(path, sheet, cache_dir, cache_bytes):
+    global UPLOAD_CACHE_DIR, UPLOAD_CACHE_BYTES
+    UPLOAD_CACHE_DIR, UPLOAD_CACHE_BYTES = cache_dir, cache_bytes
+    with LocalUpload(path) as upload:
+        file_sha256 = upload_sha256(upload)
+        for _ in iter_cached_upload_batches(upload, sheet=sheet, file_sha256=file_sha256):
+            pass
+    return file_sha256
+
+# Function to import files into a database without Streamlit, e.g. from a script or the command line (cli.py)
+# `sheets` is None for the active sheet of each workbook, "all" for every sheet or a list of sheet names. Each file/sheet
+# goes into `table_name`, or by default into a table named after the sheet (or the file, for CSV and Parquet files),
+# created from its first batch when it doesn't exist and `create_table` is set.
+# The files are parsed in parallel by `workers` processes (one per core by default) into the upload cache, while this
+# process writes them one after another, in the given order, as soon as each is parsed. The other options go to
+# import_upload. Returns a list of (path, sheet, table, summary) where summary is the exception when a file failed;
+# `progress` is called with the fraction of files done and that entry.
+def import_files(db_file, paths, primary_key, table_name=None, sheets=None, workers=None, create_table=True, progress=None, **options):
+    jobs = []
+    for path in paths:
+        if sheets == "all":
+            names = upload_sheet_names(path)
+        elif sheets and path.lower().endswith(".xlsx"):
+            names = list(sheets)
+        else:
+            names = [None]
+        jobs.extend((path, sheet) for sheet in names)
+
+    results = []
+    conn = open_connection(db_file)
+    pool = None
+    try:
+        parsing = None
+        if UPLOAD_CACHE_BYTES > 0 and len(jobs) > 1:
+            # Spawned workers start clean instead of inheriting this process' connections and threads
+            pool = concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            parsing = [pool.submit(_parse_upload, path, sheet, UPLOAD_CACHE_DIR, UPLOAD_CACHE_BYTES) for path, sheet in jobs]
+        for i, (path, sheet) in enumerate(jobs):
+            target = table_name or sheet or os.path.splitext(os.path.basename(path))[0]
+            try:
+                # A file the workers couldn't spill to the cache is simply parsed again here
+                file_sha256 = parsing[i].result() if parsing else None
+                exists = check_table_exists(conn, target)
+                if not exists and not create_table:
+                    raise ValueError(f"Table '{target}' does not exist.")
+                with LocalUpload(path) as upload:
+                    summary = import_upload(conn, upload, target, primary_key, create_table=not exists, sheet=sheet,
+                                            file_sha256=file_sha256, **options)
+            except Exception as error:
+                summary = error
+            results.append((path, sheet, target, summary))
+            if progress:
+                progress(len(results) / len(jobs), results[-1])
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        conn.close()
+    return results
+
+
+# ==================================== Workspace functions ===================================
+
+# Databases registered in the workspace, by alias, stored as JSON (path set with SQLITE_GUI_WORKSPACE)
+WORKSPACE_FILE = os.environ.get("SQLITE_GUI_WORKSPACE", "workspace.json")
+_workspace_lock = threading.Lock()
+
+# Function to read the registered databases ({alias: path}); the default database is always there
+def load_workspace():
+    databases = {}
+    if os.path.exists(WORKSPACE_FILE):
+        with open(WORKSPACE_FILE) as workspace_file:
+            databases = json.load(workspace_file).get("databases", {})
+    if os.path.abspath(DB_PATH) not in map(os.path.abspath, databases.values()):
+        databases = {_database_alias(DB_PATH, databases): DB_PATH, **databases}
+    return databases
+
+# Function to store the registered databases
+def save_workspace(databases):
+    with _workspace_lock:
+        with open(WORKSPACE_FILE, "w") as workspace_file:
+            json.dump({"databases": databases}, workspace_file, indent=2)
+
+# Function to make a schema name for ATTACH out of a file name, unique among the given aliases
+def _database_alias(db_file, databases=()):
+    base = re.sub(r"\W", "_", os.path.splitext(os.path.basename(db_file))[0]) or "db"
+    if base[0].isdigit() or base.lower() in ("main", "temp"):
+        base = "db_" + base
+    alias, n = base, 2
+    while alias in databases:
+        alias, n = f"{base}_{n}", n + 1
+    return alias
+
+# Function to add a database file to the workspace; `create` makes an empty database when the file doesn't exist
+def register_database(db_file, alias=None, create=False):
+    databases = load_workspace()
+    alias = alias or _database_alias(db_file, databases)
+    if not re.fullmatch(r"[A-Za-z_]\w*", alias) or alias.lower() in ("main", "temp"):
+        raise ValueError(f"'{alias}' can't be used as a database alias, use letters, digits and underscores.")
+    if alias in databases:
+        raise ValueError(f"The alias '{alias}' is already used by {databases[alias]}.")
+    if not os.path.exists(db_file):
+        if not create:
+            raise ValueError(f"The file '{db_file}' does not exist.")
+        sqlite3.connect(db_file).close()
+    databases[alias] = db_file
+    save_workspace(databases)
+    return alias
+
+# Function to remove a database from the workspace (the file itself is kept)
+def unregister_database(alias):
+    databases = load_workspace()
+    databases.pop(alias, None)
+    save_workspace(databases)
+
+# Function to attach the workspace's other databases to a connection under their aliases
+def attach_workspace(conn, databases=None):
+    main_file = os.path.abspath(get_database_file(conn))
+    attached = {row[1] for row in conn.execute("PRAGMA database_list;")}
+    for alias, db_file in (databases or load_workspace()).items():
+        if alias not in attached and os.path.abspath(db_file) != main_file:
+            conn.execute("ATTACH DATABASE ? AS " + quote_ident(alias) + ";", (db_file,))
+    return conn
+
+# Function to run a read-only query across the workspace: `db_file` is `main`, the others are attached
+# The query is governed (see run_governed): at most `max_rows` rows and `timeout` seconds.
+def query_workspace(db_file, query, params=(), max_rows=QUERY_MAX_ROWS, timeout=QUERY_TIME_BUDGET):
+    conn = open_connection(db_file)
+    try:
+        attach_workspace(conn)
+        stats = {}
+        frames = list(run_governed(conn, query, params, timeout=timeout, max_rows=max_rows, stats=stats))
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=stats.get("columns", []))
+    finally:
+        conn.close()
+
+# Matches the name after CREATE TABLE/INDEX (and the table after ON for indexes) in schema SQL
+_IDENT = r'(?:"(?:[^"]|"")*"|\[[^\]]*\]|`[^`]*`|[^\s(]+)'
+_CREATE_TABLE_NAME = re.compile(r"^(\s*CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?)" + _IDENT, re.IGNORECASE)
+_CREATE_INDEX_NAMES = re.compile(r"^(\s*CREATE\s+(?:UNIQUE\s+)?INDEX\s+(?:IF\s+NOT\s+EXISTS\s+)?)" + _IDENT + r"(\s+ON\s+)" + _IDENT, re.IGNORECASE)
+
+# Function to copy a table, or the rows matching `where`, from one database file to another inside SQLite
+# The source is ATTACHed to `conn` (a connection to the target) and copied with one INSERT ... SELECT.
+# mode: 'create' a new table with the source's definition and indexes, 'append' to an existing table
+# (matching columns by name) or 'replace' an existing table. Returns the number of rows copied.
+def copy_table_between(conn, source_db, table_name, target_table=None, where=None, params=(), mode="create", progress=None):
+    target_table = target_table or table_name
+    same_file = os.path.abspath(get_database_file(conn)) == os.path.abspath(source_db)
+    source = "main" if same_file else "copy_source"
+    if same_file and target_table == table_name:
+        raise ValueError("The source and target tables are the same table.")
+
+    if conn.in_transaction:
+        conn.commit()
+    if not same_file:
+        conn.execute("ATTACH DATABASE ? AS copy_source;", (source_db,))
+    set_progress(conn, progress)
+    try:
+        table_sql = conn.execute(f"SELECT sql FROM {source}.sqlite_master WHERE type = 'table' AND name = ?;", (table_name,)).fetchone()
+        if table_sql is None:
+            raise ValueError(f"Table '{table_name}' does not exist in {source_db}.")
+        source_columns = [row[1] for row in conn.execute(f"PRAGMA {source}.table_info({quote_ident(table_name)});")]
+        target_exists = conn.execute("SELECT 1 FROM main.sqlite_master WHERE type = 'table' AND name = ?;", (target_table,)).fetchone()
+        if mode == "create" and target_exists:
+            raise ValueError(f"Table '{target_table}' already exists in the target database.")
+        if mode == "append" and not target_exists:
+            raise ValueError(f"Table '{target_table}' does not exist in the target database.")
+
+        conn.execute("BEGIN IMMEDIATE;")
+        try:
+            indexes = []
+            if mode in ("create", "replace"):
+                if target_exists:
+                    conn.execute(f"DROP TABLE main.{quote_ident(target_table)};")
+                conn.execute(_CREATE_TABLE_NAME.sub(lambda m: m.group(1) + "main." + quote_ident(target_table), table_sql[0], count=1))
+                columns = source_columns
+                # Indexes are built after the copy, which is faster than updating them row by row
+                taken = {row[0] for row in conn.execute("SELECT name FROM main.sqlite_master;")}
+                for index_name, index_sql in conn.execute(f"SELECT name, sql FROM {source}.sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL;", (table_name,)).fetchall():
+                    new_name = index_name if index_name not in taken else f"{index_name}_{target_table}"
+                    taken.add(new_name)
+                    indexes.append(_CREATE_INDEX_NAMES.sub(lambda m: m.group(1) + "main." + quote_ident(new_name) + m.group(2) + quote_ident(target_table), index_sql, count=1))
+            else:
+                target_columns = [row[1] for row in conn.execute(f"PRAGMA main.table_info({quote_ident(target_table)});")]
+                columns = [col for col in source_columns if col in target_columns]
+                if not columns:
+                    raise ValueError(f"Tables '{table_name}' and '{target_table}' have no column in common.")
+
+            column_list = ", ".join(quote_ident(col) for col in columns)
+            query = f"INSERT INTO main.{quote_ident(target_table)} ({column_list}) SELECT {column_list} FROM {source}.{quote_ident(table_name)}"
+            if where:
+                query += f" WHERE {where}"
+            rows_copied = conn.execute(query + ";", params).rowcount
+            for index_sql in indexes:
+                conn.execute(index_sql)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    finally:
+        set_progress(conn, None)
+        if not same_file:
+            conn.execute("DETACH DATABASE copy_source;")
+    return rows_copied
+
+
+# ==================================== Maintenance functions ===================================
+
+# Operations of the Maintenance page, by key: label shown in the app
+MAINTENANCE_OPERATIONS = {
+    "analyze": "ANALYZE (refresh the statistics used by the query planner)",
+    "optimize": "PRAGMA optimize (ANALYZE only where it is likely to help)",
+    "vacuum": "VACUUM (rebuild the file, removing free pages and fragmentation)",
+    "vacuum_into": "VACUUM INTO (write a compacted copy to another file)",
+    "incremental_vacuum": "Incremental vacuum (return free pages to the OS)",
+    "enable_incremental_vacuum": "Enable incremental vacuum (sets auto_vacuum = INCREMENTAL, then VACUUM)",
+    "checkpoint": "WAL checkpoint (copy the WAL into the database and truncate it)",
+}
+
+# Function to get the file sizes and page counts of a database
+def storage_summary(conn):
+    db_file = get_database_file(conn)
+    page_size = conn.execute("PRAGMA page_size;").fetchone()[0]
+    page_count = conn.execute("PRAGMA page_count;").fetchone()[0]
+    freelist_count = conn.execute("PRAGMA freelist_count;").fetchone()[0]
+    wal_file = db_file + "-wal"
+    return {
+        "file_bytes": os.path.getsize(db_file) if db_file and os.path.exists(db_file) else page_size * page_count,
+        "wal_bytes": os.path.getsize(wal_file) if db_file and os.path.exists(wal_file) else 0,
+        "page_size": page_size,
+        "page_count": page_count,
+        "freelist_count": freelist_count,
+        "auto_vacuum": {0: "NONE", 1: "FULL", 2: "INCREMENTAL"}[conn.execute("PRAGMA auto_vacuum;").fetchone()[0]],
+        "journal_mode": conn.execute("PRAGMA journal_mode;").fetchone()[0],
+    }
+
+# Function to measure the size of every table and index with the dbstat virtual table
+# Fragmentation is the share of pages that don't directly follow the previous page of the same b-tree.
+def storage_by_object(conn, progress=None):
+    set_progress(conn, progress)
+    try:
+        rows = conn.execute("""
+            WITH pages AS (
+                SELECT name, pageno, pgsize, unused, lag(pageno) OVER (PARTITION BY name ORDER BY path) AS previous
+                FROM dbstat WHERE aggregate = 0
+            )
+            SELECT pages.name, coalesce(master.type, 'table'), coalesce(master.tbl_name, pages.name), count(*), sum(pgsize), sum(unused),
+                   sum(previous IS NOT NULL AND pageno != previous + 1), sum(previous IS NOT NULL)
+            FROM pages LEFT JOIN sqlite_master AS master ON master.name = pages.name
+            GROUP BY pages.name;
+        """).fetchall()
+    finally:
+        set_progress(conn, None)
+    storage = pd.DataFrame([
+        {"name": name, "type": kind, "table": table_name, "pages": pages, "size (MB)": round(size / 1e6, 3),
+         "unused %": round(100 * unused / size, 1) if size else 0.0,
+         "fragmentation %": round(100 * jumps / steps, 1) if steps else 0.0}
+        for name, kind, table_name, pages, size, unused, jumps, steps in rows
+    ], columns=["name", "type", "table", "pages", "size (MB)", "unused %", "fragmentation %"])
+    return storage.sort_values("pages", ascending=False, ignore_index=True)
+
+# Function to run one of MAINTENANCE_OPERATIONS and report the database size before and after and how long it took
+# `target` is the output file of vacuum_into, `pages` the number of pages for incremental_vacuum (all free pages by default).
+def run_maintenance(conn, operation, target=None, pages=None, progress=None):
+    if operation not in MAINTENANCE_OPERATIONS:
+        raise ValueError(f"Unknown maintenance operation '{operation}'.")
+    if operation == "vacuum_into" and (not target or os.path.exists(target)):
+        raise ValueError("VACUUM INTO needs the path of a file that doesn't exist yet.")
+    if conn.in_transaction:
+        conn.commit()
+
+    before = storage_summary(conn)
+    detail = ""
+    set_progress(conn, progress)
+    start = time.perf_counter()
+    try:
+        if operation == "analyze":
+            conn.execute("ANALYZE;")
+        elif operation == "optimize":
+            conn.execute("PRAGMA optimize;")
+        elif operation == "vacuum":
+            conn.execute("VACUUM;")
+        elif operation == "vacuum_into":
+            conn.execute("VACUUM INTO ?;", (target,))
+            detail = f"{os.path.getsize(target) / 1e6:.2f} MB written to {target}"
+        elif operation == "incremental_vacuum":
+            if before["auto_vacuum"] != "INCREMENTAL":
+                raise ValueError("Incremental vacuum needs auto_vacuum = INCREMENTAL, enable it first.")
+            conn.execute(f"PRAGMA incremental_vacuum({int(pages or 0)});").fetchall()
+        elif operation == "enable_incremental_vacuum":
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL;")
+            conn.execute("VACUUM;")
+        elif operation == "checkpoint":
+            busy, wal_pages, checkpointed = conn.execute("PRAGMA wal_checkpoint(TRUNCATE);").fetchone()
+            detail = f"{checkpointed} of {wal_pages} WAL pages checkpointed" + (" (blocked by readers)" if busy else "")
+        if conn.in_transaction:
+            conn.commit()
+    finally:
+        set_progress(conn, None)
+    seconds = time.perf_counter() - start
+    return {"operation": operation, "before": before, "after": storage_summary(conn), "seconds": seconds, "detail": detail}
+
+
+# ==================================== Assistant functions ===================================
+
+# Longest schema description sent to the model, in characters
+SCHEMA_CONTEXT_CHARS = 8000
+MAX_CACHED_ANSWERS = 256
+
+# Answers by (backend, model, database, schema version, normalized question), newest last
+_answers = {}
+_answers_lock = threading.Lock()
+
+# Gemini clients by (model, api key, temperature, top_p, max tokens), shared by every session of the process, newest last
+MAX_GEMINI_CLIENTS = 8
+_gemini_clients = {}
+_gemini_clients_lock = threading.Lock()
+
+# Model backends of the assistant by name: each one is a function (prompt, options) -> iterator of text chunks
+ASSISTANT_BACKENDS = {}
+
+# Function to make a backend available to the assistant
+def register_assistant_backend(name, backend):
+    ASSISTANT_BACKENDS[name] = backend
+
+# Function to describe the schema compactly, one line per table: name(column TYPE, ...) plus keys
+# Kept on the schema catalog, so it is only rebuilt when the schema version changes.
+def schema_context(conn, max_chars=SCHEMA_CONTEXT_CHARS):
+    catalog = get_schema_catalog(conn)
+    if "context" not in catalog:
+        lines = []
+        for table_name, table in catalog["tables"].items():
+            columns = ", ".join(f"{col['name']} {col['type']}".strip() + (" PK" if col["pk"] else "") for col in table["columns"])
+            line = f"{table_name}({columns})"
+            if table["foreign_keys"]:
+                line += " FK " + ", ".join(f"{fk['column']}->{fk['ref_table']}.{fk['ref_column']}" for fk in table["foreign_keys"])
+            lines.append(line)
+        catalog["context"] = "\n".join(lines)
+    context = catalog["context"]
+    return context if len(context) <= max_chars else context[:max_chars].rsplit("\n", 1)[0] + "\n..."
+
+# Function to normalize a question for the answer cache: case, whitespace and trailing punctuation don't matter
+def normalize_question(question):
+    return " ".join(question.lower().split()).rstrip(" ?!.")
+
+# Function to build the prompt sent to the model
+def assistant_prompt(question, context):
+    return (
+        "You are a SQLite assistant. The database has these tables:\n"
+        f"{context}\n\n"
+        "Answer the question. When a query helps, give one SQLite query in a ```sql code block.\n\n"
+        f"Question: {question}"
+    )
+
+# Function to pull the SQL code blocks out of an answer
+def extract_sql(answer):
+    return [block.strip() for block in re.findall(r"```sql\s*(.*?)```", answer, re.DOTALL | re.IGNORECASE) if block.strip()]
+
+# Function to stream the assistant's answer to a question, chunk by chunk
+# Answers are cached per backend, model, database and schema version; a cached answer comes back as one chunk.
+# `stats` (a dict) receives whether the answer was cached, the time to the first chunk and the SQL it contains.
+def stream_answer(conn, question, backend="local", options=None, stats=None):
+    options = options or {}
+    stats = stats if stats is not None else {}
+    catalog = get_schema_catalog(conn)
+    key = (backend, options.get("model"), get_database_file(conn), catalog["schema_version"], normalize_question(question))
+    start = time.perf_counter()
+    with _answers_lock:
+        cached = _answers.get(key)
+    if cached is not None:
+        stats.update(cached=True, first_chunk_seconds=time.perf_counter() - start, sql=extract_sql(cached))
+        yield cached
+        return
+
+    stats.update(cached=False)
+    chunks = []
+    for chunk in ASSISTANT_BACKENDS[backend](assistant_prompt(question, schema_context(conn)), options):
+        if not chunks:
+            stats["first_chunk_seconds"] = time.perf_counter() - start
+        chunks.append(chunk)
+        yield chunk
+    answer = "".join(chunks)
+    stats["sql"] = extract_sql(answer)
+    with _answers_lock:
+        _answers.pop(key, None)
+        _answers[key] = answer
+        while len(_answers) > MAX_CACHED_ANSWERS:
+            _answers.pop(next(iter(_answers)))
+
+# Function to build a Gemini chat model through langchain (imported on first use)
+def _new_gemini_client(model, api_key, temperature, top_p, max_tokens):
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(model=model, google_api_key=api_key, temperature=temperature, top_p=top_p,
+                                  max_output_tokens=max_tokens)
+
+# Function to get the Gemini client of a model and its settings, built once per process like the agent of the
+# assistant page, so a question doesn't pay for a new client (and its connection setup)
+def gemini_client(options):
+    key = (options.get("model", "gemini-pro"), options.get("api_key"), options.get("temperature"), options.get("top_p"),
+           options.get("max_tokens"))
+    with _gemini_clients_lock:
+        client = _gemini_clients.get(key)
+        if client is None:
+            client = _gemini_clients[key] = _new_gemini_client(*key)
+            while len(_gemini_clients) > MAX_GEMINI_CLIENTS:
+                _gemini_clients.pop(next(iter(_gemini_clients)))
+    return client
+
+# Gemini through langchain, streamed token by token
+def _gemini_backend(prompt, options):
+    for chunk in gemini_client(options).stream(prompt):
+        if isinstance(chunk.content, str) and chunk.content:
+            yield chunk.content
+
+# Local stand-in model for trying the assistant and testing without an API: answers from the schema alone
+def _local_backend(prompt, options):
+    context = prompt.split("tables:\n", 1)[1].split("\n\n", 1)[0]
+    question = prompt.rsplit("Question: ", 1)[1].lower()
+    tables = [line.split("(", 1)[0] for line in context.splitlines() if "(" in line]
+    mentioned = [table for table in tables if re.search(r"\b" + re.escape(table.lower()) + r"\b", question)]
+    if mentioned:
+        answer = f"Here is a query on `{mentioned[0]}`:\n\n```sql\nSELECT * FROM {quote_ident(mentioned[0])} LIMIT 10;\n```"
+    else:
+        answer = "The database has these tables: " + (", ".join(tables) or "none yet") + "."
+    for token in re.findall(r"\S+\s*|\s+", answer):
+        yield token
+
+register_assistant_backend("gemini", _gemini_backend)
+register_assistant_backend("local", _local_backend)
+